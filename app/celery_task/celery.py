@@ -1,5 +1,17 @@
+import time
+
 from celery import Celery
+from celery.signals import before_task_publish
+from kombu import Queue
 from app.core.config import settings
+from app.celery_task import queues
+from app.celery_task.queues import INTERACTIVE, BULK, MAINTENANCE
+
+# Task names, for enqueueing with celery.send_task() from the web process without
+# importing app.celery_task.tasks (and with it jieba/openai) there.
+EXTRACT_TASK = "app.celery_task.tasks.extract_and_update"
+EXTRACT_MANY_TASK = "app.celery_task.tasks.extract_many"
+BULK_TICK_TASK = "app.celery_task.tasks.bulk_tick"
 
 # Ensure the tasks module is imported/registered by worker by including it here.
 celery = Celery(
@@ -18,4 +30,51 @@ celery.conf.update(
     result_serializer='json',
     timezone='Asia/Shanghai',
     enable_utc=True,
-)
\ No newline at end of file
+    # 按用途分队列，各自用独立的 worker 池消费（见 app/celery_task/queues.py）
+    task_queues=[Queue(INTERACTIVE), Queue(BULK), Queue(MAINTENANCE)],
+    task_default_queue=INTERACTIVE,
+    task_routes={
+        EXTRACT_TASK: {"queue": INTERACTIVE},
+        EXTRACT_MANY_TASK: {"queue": BULK},
+        BULK_TICK_TASK: {"queue": BULK},
+        "app.celery_task.tasks.reconcile_counters": {"queue": MAINTENANCE},
+        "app.celery_task.tasks.reclaim_stale_items": {"queue": MAINTENANCE},
+    },
+    # priorities 0 (first) .. 9 within a queue; prefetch 1 so they take effect
+    broker_transport_options={"priority_steps": list(range(10)), "queue_order_strategy": "priority"},
+    worker_prefetch_multiplier=1,
+    # run with `celery -A app.celery_task.celery beat` alongside the workers
+    beat_schedule={
+        "reconcile-counters": {
+            "task": "app.celery_task.tasks.reconcile_counters",
+            "schedule": settings.COUNTER_RECONCILE_INTERVAL,
+        },
+        "reclaim-stale-items": {
+            "task": "app.celery_task.tasks.reclaim_stale_items",
+            "schedule": settings.PROCESSING_SWEEP_INTERVAL,
+        },
+    },
+)
+
+
+def dispatch_bulk(user_id: int, item_ids: list, fair_name: str, priority: int, chunk_size: int):
+    """Queue item ids for extraction in the bulk queue, fairly across users (see queues.py).
+
+    Blocking (Redis + broker round trips); call from a thread in async code.
+    """
+    size = max(1, chunk_size)
+    chunks = [item_ids[i:i + size] for i in range(0, len(item_ids), size)]
+    if not chunks:
+        return 0
+    queues.fair_push(queues.get_client(), fair_name, user_id, chunks)
+    # fire and forget: nothing waits on the ticks, so don't store or subscribe to their results
+    for _ in chunks:
+        celery.send_task(BULK_TICK_TASK, args=[fair_name], priority=priority, ignore_result=True)
+    return len(chunks)
+
+
+@before_task_publish.connect
+def _stamp_enqueued_at(headers=None, **kwargs):
+    # read by the worker to record queue wait per queue (see worker._on_task_prerun)
+    if headers is not None:
+        headers.setdefault("enqueued_at", time.time())
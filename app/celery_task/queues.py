@@ -0,0 +1,219 @@
+"""Queue classes, per-user fair scheduling for bulk work, and queue-wait metrics.
+
+Three Celery queues, each consumed by its own worker pool:
+
+* interactive -- extraction of items created one at a time in the UI
+* bulk        -- imports and reprocessing, see below
+* maintenance -- periodic jobs (counter reconciliation)
+
+    celery -A app.celery_task.celery worker -Q interactive -c 8 -n interactive@%h
+    celery -A app.celery_task.celery worker -Q bulk -c 2 -n bulk@%h
+    celery -A app.celery_task.celery worker -Q maintenance -c 1 -n maintenance@%h
+
+Fairness inside the bulk queue: bulk work is not enqueued per item. Chunks
+of item ids go to a per-user Redis list and the user joins a ring; for every
+chunk one generic bulk_tick task is queued. A tick takes the next user from
+the ring (rotating it) and processes one chunk of theirs, so a user with
+100k queued items and a user with 10 are served alternately instead of
+first-come-first-served. Imports and reprocess sweeps use separate fair
+queues; reprocess ticks are published at the lowest priority.
+
+A popped chunk is recorded in the fair queue's in-flight set until the tick
+acknowledges it (fair_ack). A tick that raised or whose worker died leaves
+it there; fair_requeue_stale() (the periodic reclaim_stale_items task) puts
+chunks in flight for longer than FAIR_INFLIGHT_TIMEOUT back at the front of
+their user's list and a new tick is queued for each. Re-running a chunk that
+was partly done is harmless: items are claimed with a guarded transition.
+
+Queue wait (publish -> task start) is recorded per queue by the workers in
+Redis hashes; ``python -m app.celery_task.queues stats`` prints them with the
+current queue depths.
+"""
+import argparse
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import redis
+
+from app.core.config import settings
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+MAINTENANCE = "maintenance"
+QUEUES = (INTERACTIVE, BULK, MAINTENANCE)
+
+# Redis transport: 0 is served first
+PRIORITY_IMPORT = 3
+PRIORITY_REPROCESS = 9
+
+FAIR_IMPORT = "import"
+FAIR_REPROCESS = "reprocess"
+FAIR_PRIORITY = {FAIR_IMPORT: PRIORITY_IMPORT, FAIR_REPROCESS: PRIORITY_REPROCESS}
+
+WAIT_BUCKETS = (1, 5, 30, 120, 600)  # seconds, upper bounds of the wait histogram
+WAIT_KEY = "queue_wait:"
+
+# KEYS: ring, active set, user list prefix. ARGV: user_id, chunks (JSON strings)...
+_PUSH_LUA = """
+local list = KEYS[3] .. ARGV[1]
+for i = 2, #ARGV do
+  redis.call('RPUSH', list, ARGV[i])
+end
+if redis.call('SADD', KEYS[2], ARGV[1]) == 1 then
+  redis.call('LPUSH', KEYS[1], ARGV[1])
+end
+return #ARGV - 1
+"""
+
+# KEYS: ring, active set, user list prefix, in-flight zset. ARGV: now.
+# Returns {user_id, chunk} or nil; the chunk stays in flight as "<user_id>|<chunk>".
+_POP_LUA = """
+local n = redis.call('LLEN', KEYS[1])
+for _ = 1, n do
+  local uid = redis.call('RPOPLPUSH', KEYS[1], KEYS[1])
+  if not uid then return nil end
+  local list = KEYS[3] .. uid
+  local chunk = redis.call('LPOP', list)
+  if redis.call('LLEN', list) == 0 then
+    redis.call('LREM', KEYS[1], 0, uid)
+    redis.call('SREM', KEYS[2], uid)
+  end
+  if chunk then
+    redis.call('ZADD', KEYS[4], ARGV[1], uid .. '|' .. chunk)
+    return {uid, chunk}
+  end
+end
+return nil
+"""
+
+# KEYS: ring, active set, user list prefix, in-flight zset. ARGV: cutoff.
+# Moves chunks in flight since before the cutoff back to the front of their user's list.
+_REQUEUE_LUA = """
+local stale = redis.call('ZRANGEBYSCORE', KEYS[4], '-inf', ARGV[1])
+for _, member in ipairs(stale) do
+  local sep = string.find(member, '|', 1, true)
+  local uid = string.sub(member, 1, sep - 1)
+  redis.call('LPUSH', KEYS[3] .. uid, string.sub(member, sep + 1))
+  if redis.call('SADD', KEYS[2], uid) == 1 then
+    redis.call('LPUSH', KEYS[1], uid)
+  end
+  redis.call('ZREM', KEYS[4], member)
+end
+return #stale
+"""
+
+
+_client = None
+
+
+def get_client() -> redis.Redis:
+    """Sync Redis client on the broker, for the web process (workers use worker.get_redis())."""
+    global _client
+    if _client is None:
+        _client = redis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+    return _client
+
+
+def _keys(name: str) -> List[str]:
+    return [f"fairq:{name}:ring", f"fairq:{name}:active", f"fairq:{name}:user:", f"fairq:{name}:inflight"]
+
+
+def fair_push(client: redis.Redis, name: str, user_id: int, chunks: List[List[int]]) -> int:
+    """Append chunks of item ids to the user's list in fair queue `name`. Returns chunks added."""
+    if not chunks:
+        return 0
+    return client.eval(_PUSH_LUA, 3, *_keys(name)[:3], user_id, *(json.dumps(c) for c in chunks))
+
+
+def fair_pop(client: redis.Redis, name: str) -> Optional[Tuple[int, List[int]]]:
+    """Take one chunk from the next user in the ring; None when the fair queue is empty.
+
+    The chunk stays in flight until fair_ack().
+    """
+    popped = client.eval(_POP_LUA, 4, *_keys(name), time.time())
+    if not popped:
+        return None
+    user_id, chunk = popped
+    return int(user_id), json.loads(chunk)
+
+
+def fair_ack(client: redis.Redis, name: str, user_id: int, item_ids: List[int]):
+    """Mark a popped chunk as done."""
+    client.zrem(_keys(name)[3], f"{user_id}|{json.dumps(item_ids)}")
+
+
+def fair_requeue_stale(client: redis.Redis, name: str, older_than: float) -> int:
+    """Put chunks popped more than older_than seconds ago and never acknowledged back in the queue.
+
+    Returns the number of chunks requeued; the caller queues one tick per chunk.
+    """
+    return client.eval(_REQUEUE_LUA, 4, *_keys(name), time.time() - older_than)
+
+
+def fair_depth(client: redis.Redis, name: str) -> Dict[str, int]:
+    ring, _, prefix, _ = _keys(name)
+    users = client.lrange(ring, 0, -1)
+    return {u: client.llen(prefix + u) for u in users}
+
+
+def record_wait(client: redis.Redis, queue: str, seconds: float):
+    bucket = next((f"le_{b}" for b in WAIT_BUCKETS if seconds <= b), "le_inf")
+    pipe = client.pipeline(transaction=False)
+    pipe.hincrby(WAIT_KEY + queue, "count", 1)
+    pipe.hincrbyfloat(WAIT_KEY + queue, "sum_seconds", seconds)
+    pipe.hincrby(WAIT_KEY + queue, bucket, 1)
+    pipe.execute()
+
+
+def wait_stats(client: redis.Redis) -> Dict[str, Dict[str, float]]:
+    """Cumulative queue-wait counters per queue: count, sum_seconds and le_<bucket> counts."""
+    return {q: {k: float(v) for k, v in client.hgetall(WAIT_KEY + q).items()} for q in QUEUES}
+
+
+def prometheus_lines(client: redis.Redis) -> List[str]:
+    """celery_queue_wait_seconds histogram and celery_queue_depth gauge in Prometheus text format."""
+    lines = [
+        "# HELP celery_queue_wait_seconds Time from publish to task start, per queue",
+        "# TYPE celery_queue_wait_seconds histogram",
+    ]
+    for queue, values in wait_stats(client).items():
+        cumulative = 0
+        for b in WAIT_BUCKETS:
+            cumulative += values.get(f"le_{b}", 0)
+            lines.append(f'celery_queue_wait_seconds_bucket{{queue="{queue}",le="{float(b)}"}} {int(cumulative)}')
+        cumulative += values.get("le_inf", 0)
+        lines.append(f'celery_queue_wait_seconds_bucket{{queue="{queue}",le="+Inf"}} {int(cumulative)}')
+        lines.append(f'celery_queue_wait_seconds_sum{{queue="{queue}"}} {values.get("sum_seconds", 0.0)}')
+        lines.append(f'celery_queue_wait_seconds_count{{queue="{queue}"}} {int(values.get("count", 0))}')
+    lines += ["# HELP celery_queue_depth Messages waiting in each queue", "# TYPE celery_queue_depth gauge"]
+    lines += [f'celery_queue_depth{{queue="{q}"}} {n}' for q, n in queue_depths(client).items()]
+    return lines
+
+
+def queue_depths(client: redis.Redis) -> Dict[str, int]:
+    # the Redis transport keeps one list per priority step: "<queue>" and "<queue>\x06\x16<n>"
+    depths = {}
+    for q in QUEUES:
+        keys = [q] + [f"{q}\x06\x16{p}" for p in range(1, 10)]
+        depths[q] = sum(client.llen(k) for k in keys)
+    return depths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the Celery queues")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="queue depths, fair-queue backlog per user and queue-wait counters")
+    parser.parse_args()
+    client = get_client()
+    print(json.dumps({
+        "depth": queue_depths(client),
+        "fair": {name: fair_depth(client, name) for name in FAIR_PRIORITY},
+        "in_flight": {name: client.zcard(_keys(name)[3]) for name in FAIR_PRIORITY},
+        "wait": wait_stats(client),
+        "at": time.time(),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
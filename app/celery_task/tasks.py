@@ -2,73 +2,217 @@
 import asyncio
 import json
 from celery.utils.log import get_task_logger
-from app.celery_task.celery import celery
+from app.celery_task.celery import celery, dispatch_bulk, BULK_TICK_TASK
+from app.celery_task import queues, worker
 from app.core.config import settings
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
-from app import models
-from app.utils.extractor_async import extract_from_text_async
-import redis  # 同步 redis 用于在 Celery worker（同步）中发布通知
+from app import crud, counters, data_version
+from app.utils import extraction_cache
+from app.utils.extractor_async import extract_from_text_async, extract_batch_async
 
 logger = get_task_logger(__name__)
 
 # Note: do NOT create async engine/session at module import time when using
 # a prefork worker (Celery). Creating asyncio-based engines before forking
 # can bind internals to the parent's event loop and cause "Future attached
-# to a different loop" errors in worker processes. We'll create the engine
-# lazily inside the task so it's created in the worker process and its
-# event loop.
-
-# 使用同步 redis client (worker process is sync) 来 publish 通知
-redis_client = redis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+# to a different loop" errors in worker processes. The engine, event loop
+# and redis client live in app.celery_task.worker and are created once per
+# worker process (after fork) and reused across tasks.
 
 @celery.task(bind=True)
-def extract_and_update(self, item_id: int):
+def extract_and_update(self, item_id: int, user_id: int | None = None):
     try:
-        # Run the async workflow in a fresh event loop for this task.
-        asyncio.run(_run_extraction_and_update(item_id))
+        # Run the async workflow on this worker process's persistent event loop.
+        if settings.EXTRACT_BATCH_SIZE > 1:
+            # interactive batches never pull in the user's bulk-import backlog
+            worker.run(_run_batch_extraction_and_update(item_id, include_imports=False))
+        else:
+            worker.run(_run_extraction_and_update(item_id, user_id))
         return {"ok": True}
     except Exception as e:
         logger.exception("Task failed: %s", e)
         return {"ok": False, "error": str(e)}
 
-async def _run_extraction_and_update(item_id: int):
-    # Create async engine and sessionmaker inside the worker process / task.
-    engine = create_async_engine(settings.DATABASE_URL, future=True, echo=False, pool_pre_ping=True)
-    AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+@celery.task(bind=True)
+def extract_many(self, item_ids: list, user_id: int | None = None):
+    """Extract a chunk of items (dispatched in groups by the bulk importer)."""
+    try:
+        worker.run(_run_many(item_ids, user_id))
+        return {"ok": True, "count": len(item_ids)}
+    except Exception as e:
+        logger.exception("Task failed: %s", e)
+        return {"ok": False, "error": str(e)}
+
+@celery.task
+def bulk_tick(fair_name: str):
+    """Process one chunk from the bulk fair queue `fair_name`, taken from the next user in turn."""
+    popped = queues.fair_pop(worker.get_redis(), fair_name)
+    if popped is None:
+        return {"ok": True, "count": 0}
+    user_id, item_ids = popped
     try:
-        async with AsyncSessionLocal() as db:
-            q = await db.execute(__import__('sqlalchemy').select(models.KnowledgeItem).filter(models.KnowledgeItem.id == item_id))
-            item = q.scalars().first()
-            if not item:
-                logger.error("Item %s not found", item_id)
+        worker.run(_run_many(item_ids, user_id))
+    except Exception as e:
+        # left in flight: reclaim_stale_items queues the chunk again after FAIR_INFLIGHT_TIMEOUT
+        logger.exception("Task failed: %s", e)
+        return {"ok": False, "error": str(e)}
+    queues.fair_ack(worker.get_redis(), fair_name, user_id, item_ids)
+    return {"ok": True, "user_id": user_id, "count": len(item_ids)}
+
+async def _run_many(item_ids: list, user_id: int | None = None):
+    if settings.EXTRACT_BATCH_SIZE > 1:
+        # each call claims a whole batch; ids already claimed are skipped cheaply
+        for item_id in item_ids:
+            await _run_batch_extraction_and_update(item_id)
+        return
+    # bounded by the worker's DB pool; the LLM scheduler limits model concurrency
+    sem = asyncio.Semaphore(settings.WORKER_DB_POOL_SIZE)
+
+    async def _one(item_id):
+        async with sem:
+            try:
+                await _run_extraction_and_update(item_id, user_id)
+            except Exception:
+                logger.exception("Extraction of item %s failed", item_id)
+
+    await asyncio.gather(*(_one(i) for i in item_ids))
+
+def _publish(redis_client, item_id: int, user_id: int, status: str, error: str | None = None):
+    # user_id routes the event to the owner's sockets only (see app/ws_hub.py)
+    payload = {"id": item_id, "user_id": user_id, "status": status}
+    if error is not None:
+        payload["error"] = error
+    # bump before the event goes out: the client refetches when it sees it
+    data_version.bump_sync(redis_client, user_id)
+    # 使用同步 redis client 发布消息
+    redis_client.publish(settings.REDIS_PUBSUB_CHANNEL, json.dumps(payload))
+
+async def _run_extraction_and_update(item_id: int, user_id: int | None = None):
+    AsyncSessionLocal = worker.get_session_factory()
+    redis_client = worker.get_redis()
+    async with AsyncSessionLocal() as db:
+        # guarded pending -> processing: a duplicate delivery (or a missing item) loses here
+        claimed = await crud.mark_processing(db, item_id, user_id=user_id)
+        if claimed is None:
+            logger.info("Item %s is not pending (missing or already taken), skipping", item_id)
+            return
+        user_id = claimed.user_id
+        # original_text is a deferred column: fetch just that column
+        original_text = await crud.get_original_text(db, item_id)
+        try:
+            extracted = extraction_cache.get(original_text)
+            if extracted is None:
+                extracted = await extract_from_text_async(original_text)
+                extraction_cache.put(original_text, extracted)
+            item = await crud.update_after_extraction(db, item_id, extracted, from_statuses=["processing"], user_id=user_id)
+            if item is None:
+                logger.info("Item %s changed during extraction (edited, deleted or reprocessed), result dropped", item_id)
                 return
-                # mark processing and commit; afterwards re-load a fresh instance attached to this session
-            item.status = "processing"
-            print(item)
-            await db.commit()
-            # re-fetch attached instance to avoid 'not persistent within this Session' on refresh/update
-            item = await db.get(models.KnowledgeItem, item_id)
+            _publish(redis_client, item_id, user_id, "done")
+        except Exception as e:
+            logger.exception("Extraction failed for item %s: %s", item_id, e)
+            # roll back whatever the failed update left in the session
+            await db.rollback()
+            if await crud.mark_failed(db, item_id, reason=f"TASK_ERROR: {e}", from_statuses=["processing"], user_id=user_id):
+                _publish(redis_client, item_id, user_id, "failed", str(e))
+
+
+async def _run_batch_extraction_and_update(item_id: int, include_imports: bool = True):
+    """Batch mode: claim this item plus other pending items and extract them with one model call.
+
+    Items claimed by another worker's batch are skipped here, so each item's own
+    task becomes a no-op once a batch has picked it up.
+    """
+    AsyncSessionLocal = worker.get_session_factory()
+    redis_client = worker.get_redis()
+    size = settings.EXTRACT_BATCH_SIZE
+    max_chars = settings.EXTRACT_BATCH_MAX_CHARS
+    async with AsyncSessionLocal() as db:
+        claimed = await crud.claim_pending_items(db, size, max_chars, item_id=item_id, include_imports=include_imports)
+        if not claimed:
+            logger.info("Item %s already claimed by another batch, skipping", item_id)
+            return
+        user_id = claimed[0][1]
+        used = sum(len(text or "") for _, _, text in claimed)
+        if len(claimed) < size and used < max_chars and settings.EXTRACT_BATCH_WINDOW > 0:
+            # give the same user's concurrent submissions a short window to join this batch
+            await asyncio.sleep(settings.EXTRACT_BATCH_WINDOW)
+            claimed += await crud.claim_pending_items(
+                db, size - len(claimed), max_chars - used, user_id=user_id, include_imports=include_imports
+            )
+
+        texts = {claimed_id: text for claimed_id, _, text in claimed}
+        results = {i: extraction_cache.get(text) for i, text in texts.items()}
+        to_extract = {i: texts[i] for i, r in results.items() if r is None}
+        if to_extract:
             try:
-                extracted = await extract_from_text_async(item.original_text)
-                from app.crud import update_after_extraction
-                await update_after_extraction(db, item_id, extracted)
-                payload = json.dumps({"id": item_id, "status": "done"})
-                # 使用同步 redis client 发布消息
-                redis_client.publish(settings.REDIS_PUBSUB_CHANNEL, payload)
+                fresh = await extract_batch_async(to_extract)
             except Exception as e:
-                logger.exception("Extraction failed for item %s: %s", item_id, e)
-                # re-fetch to ensure we have a session-bound instance
-                item = await db.get(models.KnowledgeItem, item_id)
+                # don't leave the claimed items in processing until the lease expires
+                logger.exception("Batch extraction of %s items failed: %s", len(to_extract), e)
+                for failed_id in to_extract:
+                    results.pop(failed_id)
+                    if await crud.mark_failed(
+                        db, failed_id, reason=f"TASK_ERROR: {e}", from_statuses=["processing"], user_id=user_id
+                    ):
+                        _publish(redis_client, failed_id, user_id, "failed", str(e))
+            else:
+                for i, extracted in fresh.items():
+                    extraction_cache.put(texts[i], extracted)
+                results.update(fresh)
+        for claimed_id, extracted in results.items():
+            try:
+                item = await crud.update_after_extraction(
+                    db, claimed_id, extracted, from_statuses=["processing"], user_id=user_id
+                )
                 if item:
-                    item.status = "failed"
-                    item.llm_raw = (item.llm_raw or "") + f"\n\nTASK_ERROR: {e}"
-                    await db.commit()
-                payload = json.dumps({"id": item_id, "status": "failed", "error": str(e)})
-                redis_client.publish(settings.REDIS_PUBSUB_CHANNEL, payload)
-    finally:
-        # Dispose engine to close all connections and free resources
-        try:
-            await engine.dispose()
-        except Exception:
-            pass
\ No newline at end of file
+                    _publish(redis_client, claimed_id, user_id, "done")
+            except Exception as e:
+                logger.exception("Extraction failed for item %s: %s", claimed_id, e)
+                await db.rollback()
+                failed = await crud.mark_failed(
+                    db, claimed_id, reason=f"TASK_ERROR: {e}", from_statuses=["processing"], user_id=user_id
+                )
+                if failed:
+                    _publish(redis_client, claimed_id, user_id, "failed", str(e))
+
+
+@celery.task
+def reconcile_counters():
+    """Periodic job: recompute per-user item counters to correct any drift."""
+    async def _run():
+        async with worker.get_session_factory()() as db:
+            return await counters.reconcile(db)
+    rows = worker.run(_run())
+    logger.info("Reconciled item counters (%s rows corrected)", rows)
+    return {"ok": True, "rows": rows}
+
+
+@celery.task
+def reclaim_stale_items():
+    """Periodic job: requeue work whose worker died.
+
+    Items left in processing past PROCESSING_TIMEOUT go back to pending and are
+    queued again; bulk chunks popped but never acknowledged within
+    FAIR_INFLIGHT_TIMEOUT go back to their fair queue.
+    """
+    async def _run():
+        async with worker.get_session_factory()() as db:
+            return await crud.reclaim_stale_processing(db)
+    reclaimed = worker.run(_run())
+    redis_client = worker.get_redis()
+    for user_id, item_ids in reclaimed.items():
+        data_version.bump_sync(redis_client, user_id)
+        dispatch_bulk(user_id, item_ids, queues.FAIR_REPROCESS, queues.PRIORITY_REPROCESS, settings.IMPORT_TASK_CHUNK)
+    count = sum(len(ids) for ids in reclaimed.values())
+    if count:
+        logger.warning("Requeued %s items stuck in processing", count)
+
+    chunks = 0
+    for fair_name, priority in queues.FAIR_PRIORITY.items():
+        requeued = queues.fair_requeue_stale(redis_client, fair_name, settings.FAIR_INFLIGHT_TIMEOUT)
+        for _ in range(requeued):
+            celery.send_task(BULK_TICK_TASK, args=[fair_name], priority=priority, ignore_result=True)
+        chunks += requeued
+    if chunks:
+        logger.warning("Requeued %s unacknowledged bulk chunks", chunks)
+    return {"ok": True, "count": count, "chunks": chunks}
@@ -0,0 +1,207 @@
+"""Per-worker-process resources for Celery tasks.
+
+Each prefork child owns one asyncio event loop, one async SQLAlchemy engine
+(with its connection pool), one sync redis client and one OpenAI client.
+They are created in ``worker_process_init`` (i.e. after fork, inside the
+child) and torn down in ``worker_process_shutdown``, so tasks reuse pooled
+MySQL/HTTP connections instead of paying a new handshake per item.
+
+For ``-P solo`` (no fork) or scripts that call the task body directly,
+resources are created lazily on first use. Pools that run several tasks in
+one process (``-P threads``, ``-P eventlet``, ``-P gevent``) are refused at
+startup: they would share the one event loop and engine of the process.
+
+The jieba dictionary and TF-IDF model are loaded once in the parent process
+(``worker_init``, before the pool forks) so children share them copy-on-write;
+each child records its first-task latency and RSS (see process_stats()).
+Queue wait of every task is recorded per queue in Redis (see queues.py); task
+run times, SQL and extraction timings are flushed to Redis after each task
+(see app/metrics.py).
+"""
+import asyncio
+import os
+import resource
+import socket
+import time
+
+import redis  # 同步 redis 用于在 Celery worker（同步）中发布通知
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, task_prerun, task_postrun
+from celery.utils.log import get_task_logger
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import metrics
+from app.celery_task import queues
+from app.core.config import settings
+from app.utils import extraction_cache, extractor_async, jieba_preload, llm_scheduler, local_engine
+
+logger = get_task_logger(__name__)
+
+_loop = None
+_engine = None
+_session_factory = None
+_redis_client = None
+
+# per-process stats
+_stats = {"pid": None, "started_at": None, "first_task_seconds": None, "tasks": 0}
+_task_started = {}
+
+
+def _init_resources():
+    global _loop, _engine, _session_factory, _redis_client
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+    _engine = create_async_engine(
+        settings.DATABASE_URL,
+        future=True,
+        echo=False,
+        pool_pre_ping=True,
+        pool_size=settings.WORKER_DB_POOL_SIZE,
+        pool_recycle=settings.WORKER_DB_POOL_RECYCLE,
+    )
+    metrics.instrument_engine(_engine)
+    _session_factory = sessionmaker(_engine, class_=AsyncSession, expire_on_commit=False)
+    _redis_client = redis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+    logger.info("Worker resources initialized")
+
+
+def _ensure_initialized():
+    if _loop is None or _loop.is_closed():
+        _init_resources()
+
+
+def run(coro):
+    """Run a coroutine to completion on this process's persistent event loop."""
+    _ensure_initialized()
+    return _loop.run_until_complete(coro)
+
+
+def get_session_factory():
+    _ensure_initialized()
+    return _session_factory
+
+
+def get_redis():
+    _ensure_initialized()
+    return _redis_client
+
+
+async def _aclose():
+    try:
+        await extractor_async.close_async_client()
+    except Exception:
+        pass
+    if _engine is not None:
+        try:
+            await _engine.dispose()
+        except Exception:
+            pass
+
+
+def shutdown():
+    """Dispose the engine, close clients and the event loop of this process."""
+    global _loop, _engine, _session_factory, _redis_client
+    local_engine.shutdown_engine()
+    if _loop is not None and not _loop.is_closed():
+        try:
+            _loop.run_until_complete(_aclose())
+        finally:
+            _loop.close()
+    if _redis_client is not None:
+        try:
+            _redis_client.close()
+        except Exception:
+            pass
+    _loop = _engine = _session_factory = _redis_client = None
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def process_stats() -> dict:
+    """First-task latency, task count and current/peak RSS of this worker process."""
+    return dict(_stats, rss_bytes=_rss_bytes(), max_rss_bytes=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+# pools running several tasks in one process: run() drives the process's single event
+# loop (concurrent run_until_complete calls fail with "This event loop is already
+# running") and the aiomysql engine is not thread-safe; green pools also block on it
+_UNSUPPORTED_POOLS = ("thread", "eventlet", "gevent")
+
+
+@worker_init.connect
+def _on_worker_init(sender=None, **kwargs):
+    # parent process, before the pool forks
+    pool = getattr(sender, "pool_cls", None)
+    if pool is not None:
+        from celery.concurrency import get_implementation
+        module = getattr(get_implementation(pool), "__module__", "")
+        if module.rsplit(".", 1)[-1] in _UNSUPPORTED_POOLS:
+            # SystemExit, not an Exception: Celery logs and ignores those raised by signal handlers
+            raise SystemExit(f"Unsupported worker pool {pool!r}: use -P prefork (default) or solo")
+    if settings.JIEBA_PRELOAD:
+        jieba_preload.preload()
+
+
+@task_prerun.connect
+def _on_task_prerun(task_id=None, task=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+    # queue wait per queue, from the enqueued_at header stamped at publish time
+    request = getattr(task, "request", None)
+    enqueued_at = getattr(request, "enqueued_at", None) or (getattr(request, "headers", None) or {}).get("enqueued_at")
+    if enqueued_at:
+        queue = (request.delivery_info or {}).get("routing_key") or "unknown"
+        try:
+            queues.record_wait(get_redis(), queue, max(0.0, time.time() - float(enqueued_at)))
+        except Exception as e:
+            logger.warning("Failed to record queue wait: %s", e)
+
+
+def _gauges() -> dict:
+    gauges = {f"worker_{k}": v for k, v in process_stats().items() if isinstance(v, (int, float)) and k != "pid"}
+    gauges.update({f"llm_scheduler_{k}": v for k, v in llm_scheduler.get_scheduler().stats().items()})
+    gauges.update({f"extraction_cache_{k}_total": v for k, v in extraction_cache.local_stats.items()})
+    return gauges
+
+
+@task_postrun.connect
+def _on_task_postrun(task_id=None, task=None, retval=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    _stats["tasks"] += 1
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        failed = state != "SUCCESS" or (isinstance(retval, dict) and retval.get("ok") is False)
+        name = getattr(task, "name", "unknown").rsplit(".", 1)[-1]
+        metrics.task_run_seconds.observe(elapsed, task=name, outcome="error" if failed else "ok")
+        if _stats["first_task_seconds"] is None:
+            _stats["first_task_seconds"] = elapsed
+            logger.info("First task in pid %s took %.3fs; %s", os.getpid(), elapsed, process_stats())
+    # hand this process's metric increments to the web process's /api/metrics
+    try:
+        metrics.flush(get_redis(), gauges=_gauges(), source=f"{socket.gethostname()}-{os.getpid()}")
+    except Exception as e:
+        logger.warning("Failed to flush metrics: %s", e)
+
+
+@worker_process_init.connect
+def _on_worker_process_init(**kwargs):
+    # Anything inherited from the parent across fork belongs to the parent's
+    # loop/sockets: drop the references (don't close them) and start fresh.
+    global _loop, _engine, _session_factory, _redis_client
+    _loop = _engine = _session_factory = _redis_client = None
+    extractor_async.reset_async_client()
+    llm_scheduler.reset_scheduler()
+    local_engine.reset_engine()
+    _stats.update(pid=os.getpid(), started_at=time.time(), first_task_seconds=None, tasks=0)
+    _init_resources()
+
+
+@worker_process_shutdown.connect
+def _on_worker_process_shutdown(**kwargs):
+    logger.info("Worker process stats: %s", process_stats())
+    shutdown()
@@ -0,0 +1,292 @@
+"""Response compression: precompressed static files and streaming gzip/brotli for the API.
+
+* PrecompressedStaticFiles serves the frontend bundle. For a file with a
+  build-time ``.br`` / ``.gz`` sibling (written by ``python -m
+  app.compression precompress``) it sends the variant the client accepts,
+  with Content-Encoding and Vary set. Fingerprinted files (Vite's
+  ``assets/name-<hash>.js``, STATIC_IMMUTABLE_PATTERN) are cached for a year
+  as immutable; everything else (index.html) is revalidated on every load.
+* CompressionMiddleware compresses other responses on the fly when they are
+  of a compressible type and larger than COMPRESSION_MIN_SIZE, or streamed.
+  Streams are compressed chunk by chunk with a sync flush, so the client
+  receives data as soon as it is produced and memory stays flat. Brotli is
+  used when the client accepts it, otherwise gzip.
+
+    python -m app.compression precompress [frontend_dist]
+"""
+import argparse
+import gzip
+import os
+import re
+import stat
+import time
+import zlib
+from mimetypes import guess_type
+from typing import Dict, Optional, Tuple
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from .core.config import settings
+
+COMPRESSIBLE_TYPES = {
+    "application/json", "application/javascript", "application/x-ndjson", "application/xml",
+    "application/manifest+json", "image/svg+xml",
+}
+COMPRESSIBLE_EXTENSIONS = {".js", ".mjs", ".css", ".html", ".json", ".svg", ".map", ".txt", ".xml", ".wasm"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+_VARIANTS = (("br", ".br"), ("gzip", ".gz"))
+
+_stats = {"responses": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0}
+
+
+def stats() -> Dict[str, float]:
+    return dict(_stats)
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Parse Accept-Encoding into {coding: q}."""
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def negotiate(header: str, available) -> Optional[str]:
+    """The first of `available` (in order of preference) the client accepts, or None."""
+    accepted = accepted_encodings(header)
+    for coding in available:
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+def _compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return (
+        media_type.startswith("text/")
+        or media_type in COMPRESSIBLE_TYPES
+        or media_type.endswith("+json")
+        or media_type.endswith("+xml")
+    )
+
+
+# ---- on-the-fly ------------------------------------------------------------------
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._z.compress(data) + self._z.flush()
+
+
+class _Brotli:
+    def __init__(self, quality: int):
+        self._c = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._c.process(data) + self._c.finish()
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware: gzip/brotli for compressible responses above minimum_size (and all streams)."""
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.available = ("br", "gzip")
+
+    def _compressor(self, coding: str):
+        return _Brotli(self.brotli_quality) if coding == "br" else _Gzip(self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.available)
+        if coding is None:
+            return await self.app(scope, receive, send)
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def _send(message):
+            nonlocal start_message, compressor, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                # hold the headers back until the first body chunk shows whether to compress
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                compressible = _compressible(headers.get("content-type", ""))
+                if compressible:
+                    headers.add_vary_header("Accept-Encoding")
+                if (
+                    not compressible
+                    or "content-encoding" in headers
+                    or start_message["status"] in (204, 206, 304)
+                    or "content-range" in headers
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    passthrough = True
+                    await send(start_message)
+                    return await send(message)
+                compressor = self._compressor(coding)
+                headers["Content-Encoding"] = coding
+                for name in ("content-length", "accept-ranges"):
+                    if name in headers:
+                        del headers[name]
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # a strong ETag names the identity bytes
+                    headers["ETag"] = "W/" + etag
+                data = self._run(compressor, body, more_body)
+                if not more_body:
+                    headers["Content-Length"] = str(len(data))
+                await send(start_message)
+                return await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+            data = self._run(compressor, body, more_body)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, _send)
+
+    def _run(self, compressor, body: bytes, more_body: bool) -> bytes:
+        started = time.perf_counter()
+        data = compressor.compress(body) if more_body else compressor.finish(body)
+        _stats["seconds"] += time.perf_counter() - started
+        _stats["bytes_in"] += len(body)
+        _stats["bytes_out"] += len(data)
+        if not more_body:
+            _stats["responses"] += 1
+        return data
+
+
+# ---- static files ------------------------------------------------------------------
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves .br/.gz siblings by Accept-Encoding and long-caches fingerprinted files."""
+
+    def __init__(self, *args, immutable_pattern: Optional[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutable = re.compile(immutable_pattern) if immutable_pattern else None
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        path = os.fspath(full_path)
+        immutable = self.immutable is not None and self.immutable.search(path.replace(os.sep, "/"))
+        headers = {"Cache-Control": IMMUTABLE if immutable else "no-cache", "Vary": "Accept-Encoding"}
+        media_type = guess_type(path)[0] or "text/plain"
+
+        response = None
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        for coding, suffix in _VARIANTS:
+            if accepted.get(coding, accepted.get("*", 0.0)) <= 0:
+                continue
+            variant = _variant_stat(path + suffix, stat_result)
+            if variant is not None:
+                response = FileResponse(
+                    path + suffix, status_code=status_code, media_type=media_type, stat_result=variant,
+                    headers=dict(headers, **{"Content-Encoding": coding}),
+                )
+                break
+        if response is None:
+            response = FileResponse(
+                path, status_code=status_code, media_type=media_type, stat_result=stat_result, headers=headers
+            )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def _variant_stat(path: str, original) -> Optional[os.stat_result]:
+    # a variant older than its original is stale (rebuilt bundle, not re-compressed)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode) or st.st_mtime < original.st_mtime:
+        return None
+    return st
+
+
+def precompress(directory: str, min_size: int = 256) -> Tuple[int, int, Dict[str, int]]:
+    """Write .gz and .br next to every compressible file of the bundle.
+
+    Variants that would not be smaller are removed. Returns (files, original bytes, {coding: bytes}).
+    """
+    files, original = 0, 0
+    written = {"gzip": 0, "br": 0}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS or os.path.getsize(path) < min_size:
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            files += 1
+            original += len(data)
+            encoded = {
+                "gzip": gzip.compress(data, compresslevel=9, mtime=0),
+                "br": brotli.compress(data, quality=11),
+            }
+            st = os.stat(path)
+            for coding, suffix in _VARIANTS:
+                target = path + suffix
+                if coding in encoded and len(encoded[coding]) < len(data):
+                    with open(target, "wb") as f:
+                        f.write(encoded[coding])
+                    os.utime(target, (st.st_atime, st.st_mtime))
+                    written[coding] += len(encoded[coding])
+                elif os.path.exists(target):
+                    os.remove(target)
+    return files, original, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Static asset compression")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_pre = sub.add_parser("precompress", help="write .br/.gz variants of the built frontend")
+    p_pre.add_argument("directory", nargs="?", default=settings.FRONTEND_DIST_DIR)
+    p_pre.add_argument("--min-size", type=int, default=256, help="skip files smaller than this (bytes)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"{args.directory} does not exist, nothing to compress.")
+        return
+    files, original, written = precompress(args.directory, args.min_size)
+    print(f"Compressed {files} files ({original} bytes): gzip {written['gzip']} bytes, br {written['br']} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Password hashing off the event loop.
+
+bcrypt verification costs tens of milliseconds of CPU; run inline it stalls
+every other coroutine of the uvicorn worker. PasswordHasher runs
+security.verify_password / get_password_hash in a small thread pool (bcrypt
+releases the GIL while hashing) and caps the number of running + queued jobs,
+rejecting the overflow with 503 instead of building an unbounded backlog.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from .config import settings
+from . import security
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pwhash") if workers > 0 else None
+        self.pending = 0  # submitted and not finished (queued + running)
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0  # seconds spent waiting for a worker thread
+        self.queue_wait_max = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "running": self.running,
+            "queued": self.pending - self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_seconds_total": self.queue_wait_total,
+            "queue_wait_seconds_max": self.queue_wait_max,
+        }
+
+    def _call(self, submitted_at: float, fn, *args):
+        wait = time.perf_counter() - submitted_at
+        self.queue_wait_total += wait
+        self.queue_wait_max = max(self.queue_wait_max, wait)
+        self.running += 1
+        try:
+            return fn(*args)
+        finally:
+            self.running -= 1
+
+    async def _run(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent authentication requests, please retry",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._call, time.perf_counter(), fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(security.verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(security.get_password_hash, password)
+
+
+hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
@@ -3,6 +3,7 @@ from typing import Optional
 
 import hashlib
 import hmac
+import logging
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
@@ -10,15 +11,22 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .config import settings
-from .. import crud, schemas
+from .. import crud, metrics, schemas
 from ..database import get_db
+from ..utils.cache import LRUCache
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
 
+def _bcrypt_secret(password: str) -> bytes:
+    # bcrypt only uses the first 72 bytes (not characters) and newer versions reject longer input
+    return password.encode("utf-8")[:72]
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    print(plain_password, hashed_password)
     """Verify password using MD5 hex digest comparison (development only).
 
     NOTE: MD5 is cryptographically broken and should NOT be used in production.
@@ -27,11 +35,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     # If the stored hash looks like bcrypt (starts with $2), use passlib to verify
     try:
         if isinstance(hashed_password, str) and hashed_password.startswith("$2"):
-            try:
-                return pwd_context.verify(plain_password, hashed_password)
-            except ValueError:
-                # bcrypt has a 72-byte input limit; try truncating and verify again
-                return pwd_context.verify(plain_password[:72], hashed_password)
+            return pwd_context.verify(_bcrypt_secret(plain_password), hashed_password)
     except Exception:
         # fall back to MD5 verification below on any unexpected error
         pass
@@ -43,14 +47,26 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 
 def get_password_hash(password: str) -> str:
-    """Return MD5 hex digest of the password string.
+    """Return the hash for a new password.
 
-    NOTE: Insecure for production. Use bcrypt/argon2 in real deployments.
+    MD5 hex digest by default (PASSWORD_HASH_SCHEME="md5"), bcrypt at
+    PASSWORD_BCRYPT_ROUNDS when PASSWORD_HASH_SCHEME="bcrypt".
+    NOTE: MD5 is insecure for production. Use bcrypt/argon2 in real deployments.
     """
+    if settings.PASSWORD_HASH_SCHEME == "bcrypt":
+        return pwd_context.hash(_bcrypt_secret(password))
     # We use MD5 for new hashes per current project decision (insecure).
     return hashlib.md5(password.encode('utf-8')).hexdigest()
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True if a stored hash doesn't match the configured scheme/cost (checked after a successful login)."""
+    is_bcrypt = isinstance(hashed_password, str) and hashed_password.startswith("$2")
+    if settings.PASSWORD_HASH_SCHEME != "bcrypt":
+        return False
+    return not is_bcrypt or pwd_context.needs_update(hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -62,20 +78,100 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+# Authenticated-user cache: token -> user snapshot without a users-table lookup.
+# L1 is per process; with AUTH_USER_CACHE_REDIS the snapshot is shared through
+# Redis too. Entries expire after AUTH_USER_CACHE_TTL and are dropped by
+# invalidate_cached_user() when the user changes.
+_user_cache = LRUCache(maxsize=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_TTL)
+_user_cache_redis = None
+USER_CACHE_PREFIX = "auth_user:"
+
+
+def _user_cache_key(user_id: Optional[int], username: str) -> str:
+    return f"uid:{user_id}" if user_id is not None else f"name:{username}"
+
+
+def _redis():
+    global _user_cache_redis
+    if _user_cache_redis is None:
+        import redis.asyncio as aioredis
+        _user_cache_redis = aioredis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+    return _user_cache_redis
+
+
+async def _cache_lookup(key: str):
+    user = _user_cache.get(key)
+    if user is not None or not settings.AUTH_USER_CACHE_REDIS:
+        return user
+    try:
+        raw = await _redis().get(USER_CACHE_PREFIX + key)
+    except Exception as e:
+        logger.warning("User cache read failed: %s", e)
+        return None
+    if raw is None:
+        return None
+    user = schemas.UserRead.model_validate_json(raw)
+    _user_cache.set(key, user)
+    return user
+
+
+async def _cache_store(key: str, user: schemas.UserRead):
+    _user_cache.set(key, user)
+    if settings.AUTH_USER_CACHE_REDIS:
+        try:
+            await _redis().set(USER_CACHE_PREFIX + key, user.model_dump_json(), ex=settings.AUTH_USER_CACHE_TTL)
+        except Exception as e:
+            logger.warning("User cache write failed: %s", e)
+
+
+async def invalidate_cached_user(user_id: int, username: str):
+    """Drop a user's cached snapshot; call after changing the user's row."""
+    keys = [_user_cache_key(user_id, username), _user_cache_key(None, username)]
+    for key in keys:
+        _user_cache.pop(key)
+    if settings.AUTH_USER_CACHE_REDIS:
+        try:
+            await _redis().delete(*(USER_CACHE_PREFIX + k for k in keys))
+        except Exception as e:
+            logger.warning("User cache invalidation failed: %s", e)
+
+
+async def get_user_from_token(db: AsyncSession, token: str):
+    """Resolve a bearer token to its user, or None if the token is invalid.
+
+    Returns a schemas.UserRead snapshot (id, username, ...) rather than an ORM object;
+    it comes from the user cache when possible, so the database is only hit on a miss.
+    """
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        username: str = payload.get("sub")
+        if username is None:
+            return None
+    except JWTError:
+        return None
+    # tokens issued before "uid" was added are cached by username
+    key = _user_cache_key(payload.get("uid"), username)
+    if settings.AUTH_USER_CACHE_ENABLED:
+        user = await _cache_lookup(key)
+        if user is not None and user.username == username:
+            return user
+    db_user = await crud.get_user_by_username(db, username=username)
+    if db_user is None:
+        return None
+    user = schemas.UserRead.model_validate(db_user)
+    if settings.AUTH_USER_CACHE_ENABLED:
+        await _cache_store(key, user)
+    return user
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = await crud.get_user_by_username(db, username=username)
+    with metrics.timer("auth"):
+        user = await get_user_from_token(db, token)
     if user is None:
         raise credentials_exception
     return user
@@ -0,0 +1,118 @@
+"""Maintained per-user item counters, overall and by status.
+
+item_counters holds one row per (user, status). Writers adjust it in the same
+transaction as the change they count (create_knowledge, delete_knowledge and
+every status transition) with a single INSERT ... ON DUPLICATE KEY UPDATE, so
+reading the totals is a primary-key lookup of at most four rows. Drift (e.g.
+rows changed outside the app) is corrected by reconcile(), run periodically by
+the reconcile_counters Celery task (Celery beat) or by hand:
+
+    python -m app.counters reconcile [--user-id ID]
+"""
+import argparse
+import asyncio
+from typing import Dict, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .database import upsert_increment
+
+STATUSES = ("pending", "processing", "done", "failed")
+
+
+async def adjust(db: AsyncSession, user_id: int, status: str, delta: int):
+    """Add delta to the user's counter for status. Does not commit."""
+    if not delta:
+        return
+    table = models.ItemCounter.__table__
+    await db.execute(upsert_increment(db, table, [{"user_id": user_id, "status": status, "item_count": delta}], ["item_count"]))
+
+
+async def move(db: AsyncSession, user_id: int, old_status: Optional[str], new_status: str, n: int = 1):
+    """Record n items of the user going from old_status to new_status. Does not commit.
+
+    Both rows change in one statement, in status order, so concurrent moves of the
+    same user lock the rows in the same order.
+    """
+    if old_status == new_status or not n:
+        return
+    rows = [{"user_id": user_id, "status": new_status, "item_count": n}]
+    if old_status is not None:
+        rows.append({"user_id": user_id, "status": old_status, "item_count": -n})
+    rows.sort(key=lambda r: r["status"])
+    await db.execute(upsert_increment(db, models.ItemCounter.__table__, rows, ["item_count"]))
+
+
+async def get_counts(db: AsyncSession, user_id: int) -> Dict:
+    rows = (await db.execute(
+        select(models.ItemCounter.status, models.ItemCounter.item_count).where(models.ItemCounter.user_id == user_id)
+    )).all()
+    by_status = {s: 0 for s in STATUSES}
+    by_status.update({r.status: max(r.item_count, 0) for r in rows})
+    return {"count": sum(by_status.values()), "by_status": by_status}
+
+
+async def _reconcile_user(db: AsyncSession, user_id: int) -> int:
+    C, K = models.ItemCounter, models.KnowledgeItem
+    # lock the user's counter rows (and the gaps between them) first: writers adjusting
+    # them wait for us, and a writer that got there first has committed before we count
+    current = dict((await db.execute(
+        select(C.status, C.item_count).where(C.user_id == user_id).order_by(C.status).with_for_update()
+    )).all())
+    actual = dict((await db.execute(
+        select(K.status, func.count()).where(K.user_id == user_id).group_by(K.status)
+    )).all())
+    deltas = [
+        {"user_id": user_id, "status": status, "item_count": actual.get(status, 0) - current.get(status, 0)}
+        for status in sorted(set(current) | set(actual))
+    ]
+    deltas = [d for d in deltas if d["item_count"]]
+    if deltas:
+        await db.execute(upsert_increment(db, C.__table__, deltas, ["item_count"]))
+    await db.commit()
+    return len(deltas)
+
+
+async def reconcile(db: AsyncSession, user_id: Optional[int] = None) -> int:
+    """Correct counters from knowledge_items (all users, or one). Returns the number of rows corrected.
+
+    One short transaction per user; the correction is applied as deltas through
+    the same upsert as adjust(), so concurrent writers are never overwritten.
+    """
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = (await db.execute(
+            select(models.KnowledgeItem.user_id).union(select(models.ItemCounter.user_id))
+        )).scalars().all()
+        await db.commit()
+    corrected = 0
+    for uid in sorted(user_ids):
+        corrected += await _reconcile_user(db, uid)
+    return corrected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain per-user item counters")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_reconcile = sub.add_parser("reconcile", help="recompute counters from knowledge_items")
+    p_reconcile.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+
+    from .database import AsyncSessionLocal, Base, engine
+
+    async def _run():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with AsyncSessionLocal() as db:
+            count = await reconcile(db, user_id=args.user_id)
+        await engine.dispose()
+        print(f"Corrected {count} counter rows.")
+
+    asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    main()
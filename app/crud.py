@@ -1,8 +1,32 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, or_
-from sqlalchemy.orm import selectinload
-from typing import List, Optional
-from . import models, schemas
+from sqlalchemy import event, select, insert, update, delete, func, and_, or_
+from sqlalchemy.orm import Session, selectinload, undefer_group
+import base64
+import json
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from . import metrics, models, schemas, search, counters, status as item_status
+from .core.config import settings
+from .database import insert_ignore
+from .utils.cache import LRUCache
+
+# tag name -> id, per process. Tags are never deleted, so entries don't go stale.
+# Ids resolved in a transaction are only cached once it commits: a tag created
+# by a transaction that is rolled back doesn't exist.
+_tag_id_cache = LRUCache(maxsize=settings.TAG_CACHE_SIZE)
+_PENDING_TAG_IDS = "pending_tag_ids"
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed_tag_ids(session):
+    for name, tag_id in session.info.pop(_PENDING_TAG_IDS, {}).items():
+        _tag_id_cache.set(name, tag_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_pending_tag_ids(session, previous_transaction):
+    session.info.pop(_PENDING_TAG_IDS, None)
 
 async def get_or_create_tag(db: AsyncSession, tag_name: str):
     q = await db.execute(select(models.Tag).filter(models.Tag.name == tag_name))
@@ -14,6 +38,38 @@ async def get_or_create_tag(db: AsyncSession, tag_name: str):
     return tag
 
 
+async def resolve_tag_ids(db: AsyncSession, tag_names: List[str]) -> Dict[str, int]:
+    """Map tag names to ids, creating missing tags.
+
+    Uses the process-wide name->id cache first; the misses are resolved with one
+    bulk INSERT IGNORE plus one SELECT ... WHERE name IN (...), regardless of count,
+    and enter the cache when the session commits. Names differing only in case
+    may map to the same id (case-insensitive collation).
+    """
+    names = list(dict.fromkeys(str(t).strip() for t in tag_names if str(t).strip()))
+    ids: Dict[str, int] = {}
+    missing = []
+    pending = db.info.setdefault(_PENDING_TAG_IDS, {})
+    for name in names:
+        tag_id = _tag_id_cache.get(name) or pending.get(name)
+        if tag_id is None:
+            missing.append(name)
+        else:
+            ids[name] = tag_id
+    if missing:
+        await db.execute(insert_ignore(db, models.Tag.__table__), [{"name": n} for n in missing])
+        rows = (await db.execute(select(models.Tag.id, models.Tag.name).where(models.Tag.name.in_(missing)))).all()
+        by_name = {r.name: r.id for r in rows}
+        # MySQL's default collation is case-insensitive: "AI" may resolve to an existing "ai"
+        by_lower = {r.name.lower(): r.id for r in rows}
+        for name in missing:
+            tag_id = by_name.get(name) or by_lower.get(name.lower())
+            if tag_id is not None:
+                ids[name] = tag_id
+                pending[name] = tag_id
+    return ids
+
+
 async def get_user_by_username(db: AsyncSession, username: str):
     q = await db.execute(select(models.User).filter(models.User.username == username))
     return q.scalars().first()
@@ -49,23 +105,54 @@ async def create_knowledge(db: AsyncSession, text: str, user_id: int):
     )
     item.user_id = user_id
     db.add(item)
+    await counters.adjust(db, user_id, "pending", 1)
     await db.commit()
     await db.refresh(item)
     # 返回刚创建的 id（避免在这里直接返回 ORM 对象导致后续懒加载）
     return item
 
-async def list_knowledge(db: AsyncSession, skip: int = 0, limit: int = 10, q: str | None = None, user_id: Optional[int] = None) -> List[models.KnowledgeItem]:
+def encode_cursor(item: models.KnowledgeItem) -> str:
+    """Opaque keyset cursor pointing just after `item` in the newest-first listing."""
+    raw = json.dumps([item.created_at.isoformat(), item.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor. Raises ValueError on malformed input."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, item_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(item_id)
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+
+
+async def list_knowledge(db: AsyncSession, skip: int = 0, limit: int = 10, q: str | None = None, user_id: Optional[int] = None, after: Optional[Tuple[datetime, int]] = None) -> List[models.KnowledgeItem]:
     """List knowledge items with optional search across title, description, summary and tag names.
 
+    Searches go through the per-user inverted index (BM25 ranked) unless
+    SEARCH_BACKEND is "like", which keeps the original ILIKE scan.
+
     Args:
         db: AsyncSession
         skip: offset
         limit: page size
         q: optional search string
+        after: decoded cursor (created_at, id); when given, seek past it instead of using skip.
+            Ignored for index-ranked searches, which are ordered by score.
 
     Returns:
         list of KnowledgeItem
     """
+    if q and user_id is not None and settings.SEARCH_BACKEND == "index":
+        with metrics.timer("search"):
+            ids = await search.search(db, user_id, q, skip=skip, limit=limit)
+        if not ids:
+            return []
+        stmt = select(models.KnowledgeItem).options(selectinload(models.KnowledgeItem.tags)).filter(models.KnowledgeItem.id.in_(ids))
+        by_id = {item.id: item for item in (await db.execute(stmt)).scalars().all()}
+        return [by_id[i] for i in ids if i in by_id]
+
     stmt = select(models.KnowledgeItem).options(selectinload(models.KnowledgeItem.tags))
 
     # always scope to the given user if provided
@@ -89,65 +176,257 @@ async def list_knowledge(db: AsyncSession, skip: int = 0, limit: int = 10, q: st
             .distinct()
         )
 
-    stmt = stmt.order_by(models.KnowledgeItem.created_at.desc()).offset(skip).limit(limit)
+    if after is not None:
+        created_at, item_id = after
+        # expanded form of (created_at, id) < (:c, :i): MySQL only uses the index range for this one
+        stmt = stmt.where(or_(
+            models.KnowledgeItem.created_at < created_at,
+            and_(models.KnowledgeItem.created_at == created_at, models.KnowledgeItem.id < item_id),
+        ))
+        skip = 0
+
+    stmt = stmt.order_by(models.KnowledgeItem.created_at.desc(), models.KnowledgeItem.id.desc()).offset(skip).limit(limit)
 
     res = await db.execute(stmt)
     return res.scalars().unique().all()
 
-async def get_knowledge(db: AsyncSession, item_id: int, user_id: Optional[int] = None) -> Optional[models.KnowledgeItem]:
+async def get_knowledge(db: AsyncSession, item_id: int, user_id: Optional[int] = None, refresh: bool = False, detail: bool = False) -> Optional[models.KnowledgeItem]:
+    """Load one item with its tags. original_text/llm_raw are only loaded when detail=True."""
     stmt = select(models.KnowledgeItem).options(selectinload(models.KnowledgeItem.tags)).filter(models.KnowledgeItem.id == item_id)
+    if detail:
+        stmt = stmt.options(undefer_group(models.HEAVY_COLUMNS))
     if user_id is not None:
         stmt = stmt.filter(models.KnowledgeItem.user_id == user_id)
+    if refresh:
+        # overwrite attributes/collections of an instance already in the session
+        stmt = stmt.execution_options(populate_existing=True)
     q = await db.execute(stmt)
     return q.scalars().first()
 
+async def knowledge_exists(db: AsyncSession, item_id: int, user_id: Optional[int] = None) -> bool:
+    """Primary-key lookup: does the item exist (and belong to the user)?"""
+    stmt = select(models.KnowledgeItem.id).filter(models.KnowledgeItem.id == item_id)
+    if user_id is not None:
+        stmt = stmt.filter(models.KnowledgeItem.user_id == user_id)
+    return (await db.execute(stmt)).first() is not None
+
+async def get_original_text(db: AsyncSession, item_id: int, user_id: Optional[int] = None) -> Optional[str]:
+    """Fetch only original_text of an item (None if it doesn't exist / isn't the user's)."""
+    stmt = select(models.KnowledgeItem.original_text).filter(models.KnowledgeItem.id == item_id)
+    if user_id is not None:
+        stmt = stmt.filter(models.KnowledgeItem.user_id == user_id)
+    return (await db.execute(stmt)).scalar_one_or_none()
+
 async def delete_knowledge(db: AsyncSession, item_id: int, user_id: Optional[int] = None) -> bool:
     item = await get_knowledge(db, item_id, user_id=user_id)
     if item:
+        await search.remove_item(db, item_id)
+        await counters.adjust(db, item.user_id, item.status, -1)
         await db.delete(item)
         await db.commit()
         return True
     return False
 
-async def update_after_extraction(db: AsyncSession, item_id: int, extracted: dict):
-    item = await get_knowledge(db, item_id)
-    if not item:
+async def update_after_extraction(
+    db: AsyncSession,
+    item_id: int,
+    extracted: dict,
+    from_statuses: Optional[List[str]] = None,
+    version: Optional[int] = None,
+    user_id: Optional[int] = None,
+):
+    """Write extraction results (or user edits) and move the item to extracted["status"] (default done).
+
+    The fields and the status change are one guarded UPDATE (see app/status.py):
+    the worker passes from_statuses=("processing",), user edits the status and
+    version they read. Returns the refreshed item, or None if the transition lost.
+    """
+    values = {f: extracted[f] for f in ("title", "description", "summary") if extracted.get(f)}
+    values.update(
+        llm_raw=extracted.get("llm_raw"),
+        confidence=extracted.get("confidence"),
+        source=extracted.get("source", "llm"),
+    )
+    won = await item_status.transition(
+        db, item_id, extracted.get("status", "done"), from_statuses, user_id=user_id, version=version, values=values
+    )
+    if won is None:
+        await db.rollback()
         return None
-    # update fields
-    item.title = extracted.get("title") or item.title
-    item.description = extracted.get("description") or item.description
-    item.summary = extracted.get("summary") or item.summary
-    item.llm_raw = extracted.get("llm_raw")
-    item.confidence = extracted.get("confidence")
-    item.source = extracted.get("source", "llm")
-    item.status = extracted.get("status", "done")
-
-    # tags: reset
-    tags = extracted.get("tags", [])
-    item.tags = []
-    for t in tags:
-        tag_obj = await get_or_create_tag(db, t)
-        item.tags.append(tag_obj)
 
+    # tags: reset, written set-based (one DELETE + one executemany INSERT)
+    tag_ids = await resolve_tag_ids(db, extracted.get("tags") or [])
+    assoc = models.knowledge_tag_table
+    await db.execute(delete(assoc).where(assoc.c.knowledge_id == item_id))
+    if tag_ids:
+        # "AI" and "ai" can resolve to one id
+        await db.execute(insert(assoc), [{"knowledge_id": item_id, "tag_id": tag_id} for tag_id in set(tag_ids.values())])
+
+    item = await get_knowledge(db, item_id, refresh=True, detail=True)
+    await search.index_item(db, item_id, won.user_id, search.document_text(item.title, item.description, item.summary, tag_ids))
     await db.commit()
-    await db.refresh(item)
     return item
 
-async def mark_processing(db: AsyncSession, item_id: int):
-    item = await get_knowledge(db, item_id)
-    if not item:
-        return None
-    item.status = "processing"
+async def mark_processing(db: AsyncSession, item_id: int, user_id: Optional[int] = None) -> Optional[item_status.Transition]:
+    """pending -> processing; None if the item is not pending (e.g. a duplicate delivery)."""
+    won = await item_status.transition(db, item_id, "processing", user_id=user_id)
     await db.commit()
-    await db.refresh(item)
-    return item
+    return won
 
-async def mark_failed(db: AsyncSession, item_id: int, reason: str = ""):
-    item = await get_knowledge(db, item_id)
-    if not item:
-        return None
-    item.status = "failed"
-    item.llm_raw = (item.llm_raw or "") + f"\n\nFAILED_REASON: {reason}"
+async def mark_failed(
+    db: AsyncSession,
+    item_id: int,
+    reason: str = "",
+    from_statuses: Optional[List[str]] = None,
+    user_id: Optional[int] = None,
+) -> Optional[item_status.Transition]:
+    table = models.KnowledgeItem.__table__
+    won = await item_status.transition(
+        db, item_id, "failed", from_statuses, user_id=user_id,
+        values={"llm_raw": func.coalesce(table.c.llm_raw, "") + f"\n\nFAILED_REASON: {reason}"},
+    )
     await db.commit()
-    await db.refresh(item)
-    return item
\ No newline at end of file
+    return won
+
+def _stale_processing():
+    """Items whose worker has held them in processing longer than PROCESSING_TIMEOUT."""
+    K = models.KnowledgeItem
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.PROCESSING_TIMEOUT)
+    # rows claimed before the lease column existed have no start time
+    return and_(K.status == "processing", or_(K.processing_started_at.is_(None), K.processing_started_at < cutoff))
+
+async def _reset_to_pending(db: AsyncSession, rows) -> List[int]:
+    """Move the locked rows (id, user_id, status) back to pending and commit."""
+    ids = [r.id for r in rows]
+    for i in range(0, len(ids), 1000):
+        await db.execute(
+            update(models.KnowledgeItem)
+            .where(models.KnowledgeItem.id.in_(ids[i:i + 1000]))
+            .values(status="pending", version=models.KnowledgeItem.version + 1)
+        )
+    for (owner_id, status), n in sorted(Counter((r.user_id, r.status) for r in rows).items()):
+        await counters.move(db, owner_id, status, "pending", n)
+    await db.commit()
+    return ids
+
+async def reset_for_reprocess(db: AsyncSession, user_id: int, item_ids: Optional[List[int]] = None, statuses=("failed",)) -> List[int]:
+    """Move the user's items (the given ids, or all with one of `statuses`) back to pending.
+
+    Items already pending, or processing within their lease, are left alone;
+    "processing" in `statuses` selects only stale ones. Returns the ids that were reset.
+    """
+    K = models.KnowledgeItem
+    stmt = (
+        select(K.id, K.user_id, K.status)
+        .filter(K.user_id == user_id, or_(K.status.in_(["done", "failed"]), _stale_processing()))
+        .order_by(K.id)
+        .with_for_update()
+    )
+    if item_ids is not None:
+        stmt = stmt.filter(K.id.in_(item_ids))
+    else:
+        stmt = stmt.filter(K.status.in_(list(statuses)))
+    rows = (await db.execute(stmt)).all()
+    if not rows:
+        await db.rollback()
+        return []
+    return await _reset_to_pending(db, rows)
+
+async def reclaim_stale_processing(db: AsyncSession, limit: int = 1000) -> Dict[int, List[int]]:
+    """Move items stuck in processing past their lease (all users) back to pending.
+
+    Returns {user_id: [item ids]} for the caller to queue again.
+    """
+    K = models.KnowledgeItem
+    rows = (await db.execute(
+        select(K.id, K.user_id, K.status)
+        .where(_stale_processing())
+        .order_by(K.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )).all()
+    if not rows:
+        await db.rollback()
+        return {}
+    await _reset_to_pending(db, rows)
+    reclaimed: Dict[int, List[int]] = {}
+    for r in rows:
+        reclaimed.setdefault(r.user_id, []).append(r.id)
+    return reclaimed
+
+async def claim_pending_items(
+    db: AsyncSession,
+    limit: int,
+    max_chars: int,
+    item_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    include_imports: bool = True,
+) -> List[tuple]:
+    """Atomically move up to `limit` pending items to processing for batch extraction.
+
+    If item_id is given it is claimed first by primary key and must still be pending
+    (it is claimed even if it alone exceeds max_chars); otherwise nothing is claimed.
+    The rest of the batch is filled with the oldest pending items of the same user
+    (item_id's owner, or user_id), so one user's backlog never rides in another's
+    batch; include_imports=False (interactive batches) leaves out bulk-imported
+    items. Rows locked by another worker are skipped. Returns a list of
+    (id, user_id, original_text).
+    """
+    K = models.KnowledgeItem
+    rows = []
+    if item_id is not None:
+        first = (await db.execute(
+            select(K.id, K.user_id, K.original_text)
+            .where(K.id == item_id, K.status == "pending")
+            .with_for_update(skip_locked=True)
+        )).first()
+        if first is None:
+            await db.rollback()
+            return []
+        rows.append(first)
+        user_id = first.user_id
+        limit -= 1
+    if limit > 0:
+        # index-backed: (user_id, status, id), or (status, id) without a user
+        stmt = (
+            select(K.id, K.user_id, K.original_text)
+            .where(K.status == "pending")
+            .order_by(K.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        if user_id is not None:
+            stmt = stmt.where(K.user_id == user_id)
+        if item_id is not None:
+            stmt = stmt.where(K.id != item_id)
+        if not include_imports:
+            stmt = stmt.where(K.import_job_id.is_(None))
+        rows += (await db.execute(stmt)).all()
+
+    claimed = []
+    per_user = Counter()
+    used = 0
+    for row in rows:
+        size = len(row.original_text or "")
+        if claimed and used + size > max_chars:
+            continue
+        if not claimed and item_id is None and size > max_chars:
+            continue
+        claimed.append((row.id, row.user_id, row.original_text))
+        per_user[row.user_id] += 1
+        used += size
+    if claimed:
+        await db.execute(
+            update(K)
+            .where(K.id.in_([c[0] for c in claimed]))
+            .values(status="processing", version=K.version + 1, processing_started_at=datetime.now(timezone.utc))
+        )
+        for owner_id, n in per_user.items():
+            await counters.move(db, owner_id, "pending", "processing", n)
+    await db.commit()
+    return claimed
+
+
+async def count_knowledge(db: AsyncSession, user_id: int) -> dict:
+    """Totals for the user's items, overall ("count") and per status ("by_status")."""
+    return await counters.get_counts(db, user_id)
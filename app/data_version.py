@@ -0,0 +1,177 @@
+"""Per-user data version: conditional GETs and a rendered-response cache.
+
+Every change to a user's items (create, import, edit, delete, reprocess and
+extraction results, done or failed) bumps a counter in Redis,
+``data_version:<user_id>``, after the change is committed. The workers' claim
+(pending -> processing) is deliberately not a change: the item keeps being
+served as pending until its result lands. GET /items and GET /items/{id} read
+the counter first:
+
+* the ETag is derived from (user, version), so ``If-None-Match`` with the
+  current tag is answered 304 from Redis alone, without touching MySQL
+* otherwise the rendered JSON body is looked up under (user, version, path
+  and query) and only rendered from the database on a miss
+
+Reading the version before the data and bumping only after the commit means a
+cached body is never older than the version it is stored under. Entries of
+old versions are not deleted; they expire after RESPONSE_CACHE_TTL.
+
+A missing counter (new user, or Redis lost its data) starts at the current
+time in milliseconds rather than at 1, so ETags handed out before can never
+match again. When Redis is unavailable both features are skipped and requests
+are served from the database as before.
+"""
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, Optional
+
+import redis.asyncio as aioredis
+from fastapi import Request, Response
+
+from .core.config import settings
+
+logger = logging.getLogger(__name__)
+
+VERSION_PREFIX = "data_version:"
+RESPONSE_PREFIX = "response_cache:"
+
+# ARGV[1]: start value for a missing counter, ARGV[2]: increment (0 to only read)
+_BUMP_LUA = """
+local v = redis.call('GET', KEYS[1])
+if not v then
+  redis.call('SET', KEYS[1], ARGV[1])
+  return tonumber(ARGV[1])
+end
+if ARGV[2] == '0' then
+  return tonumber(v)
+end
+return redis.call('INCRBY', KEYS[1], ARGV[2])
+"""
+
+_redis = None
+_stats = {"not_modified": 0, "hits": 0, "misses": 0, "errors": 0}
+
+
+def _client():
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+    return _redis
+
+
+def _key(user_id: int) -> str:
+    return f"{VERSION_PREFIX}{user_id}"
+
+
+def _start() -> int:
+    return int(time.time() * 1000)
+
+
+def stats() -> Dict[str, int]:
+    return dict(_stats)
+
+
+async def current(user_id: int) -> Optional[int]:
+    """The user's data version, or None when Redis is unavailable."""
+    try:
+        client = _client()
+        value = await client.get(_key(user_id))
+        if value is None:
+            value = await client.eval(_BUMP_LUA, 1, _key(user_id), _start(), 0)
+        return int(value)
+    except Exception as e:
+        _stats["errors"] += 1
+        logger.warning("Data version read failed: %s", e)
+        return None
+
+
+async def bump(user_id: int):
+    """Record a committed change to the user's items (web process)."""
+    try:
+        await _client().eval(_BUMP_LUA, 1, _key(user_id), _start(), 1)
+    except Exception as e:
+        _stats["errors"] += 1
+        logger.warning("Data version bump failed: %s", e)
+
+
+def bump_sync(client, user_id: int):
+    """Same as bump() with a sync redis client (Celery workers)."""
+    try:
+        client.eval(_BUMP_LUA, 1, _key(user_id), _start(), 1)
+    except Exception as e:
+        logger.warning("Data version bump failed: %s", e)
+
+
+def etag(user_id: int, version: int) -> str:
+    return f'W/"{user_id}.{version}"'
+
+
+def not_modified(request: Request, tag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # weak comparison, as for GET
+    candidates = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in candidates or tag.removeprefix("W/") in candidates
+
+
+def _response_key(user_id: int, version: int, request: Request) -> str:
+    variant = hashlib.sha1(f"{request.url.path}?{request.url.query}".encode()).hexdigest()
+    return f"{RESPONSE_PREFIX}{user_id}:{version}:{variant}"
+
+
+def _headers(tag: str, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    # no-cache: the browser keeps the body but revalidates (If-None-Match) on every request
+    return {"ETag": tag, "Cache-Control": "private, no-cache", **(extra or {})}
+
+
+class Conditional:
+    """One conditional GET: check(), then either return its response or render and store()."""
+
+    def __init__(self, request: Request, user_id: int):
+        self.request = request
+        self.user_id = user_id
+        self.version: Optional[int] = None
+        self.tag: Optional[str] = None
+
+    async def check(self) -> Optional[Response]:
+        """304 or the cached body when possible, None when the response has to be rendered."""
+        self.version = await current(self.user_id)
+        if self.version is None:
+            return None
+        self.tag = etag(self.user_id, self.version)
+        if not_modified(self.request, self.tag):
+            _stats["not_modified"] += 1
+            return Response(status_code=304, headers=_headers(self.tag))
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return None
+        try:
+            raw = await _client().get(_response_key(self.user_id, self.version, self.request))
+        except Exception as e:
+            _stats["errors"] += 1
+            logger.warning("Response cache read failed: %s", e)
+            return None
+        if raw is None:
+            _stats["misses"] += 1
+            return None
+        _stats["hits"] += 1
+        cached = json.loads(raw)
+        return Response(cached["body"], media_type="application/json", headers=_headers(self.tag, cached["headers"]))
+
+    async def store(self, body: bytes, headers: Optional[Dict[str, str]] = None) -> Response:
+        """Cache the rendered body under the version read by check() and return the response."""
+        if self.tag is None:
+            return Response(body, media_type="application/json", headers=headers)
+        if settings.RESPONSE_CACHE_ENABLED:
+            try:
+                await _client().set(
+                    _response_key(self.user_id, self.version, self.request),
+                    json.dumps({"body": body.decode(), "headers": headers or {}}, ensure_ascii=False),
+                    ex=settings.RESPONSE_CACHE_TTL,
+                )
+            except Exception as e:
+                _stats["errors"] += 1
+                logger.warning("Response cache write failed: %s", e)
+        return Response(body, media_type="application/json", headers=_headers(self.tag, headers))
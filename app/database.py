@@ -1,9 +1,12 @@
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from .core.config import settings
+from . import metrics
 
 # 使用 SQLAlchemy async engine
 engine = create_async_engine(settings.DATABASE_URL, future=True, echo=False, pool_pre_ping=True)
+metrics.instrument_engine(engine)
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 Base = declarative_base()
@@ -11,4 +14,39 @@ Base = declarative_base()
 # FastAPI 依赖
 async def get_db():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+def insert_ignore(db: AsyncSession, table):
+    """INSERT that silently skips rows violating a unique key, for the session's dialect."""
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(table).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return insert(table).prefix_with("OR IGNORE")
+    return insert(table).prefix_with("IGNORE")
+
+
+def upsert_increment(db: AsyncSession, table, rows, columns):
+    """One INSERT of `rows` that, for a row whose key already exists, adds the given `columns` to it instead.
+
+    MySQL: INSERT ... ON DUPLICATE KEY UPDATE c = c + VALUES(c); SQLite/PostgreSQL:
+    ON CONFLICT (primary key) DO UPDATE. Unlike INSERT IGNORE followed by UPDATE it
+    takes the row's exclusive lock directly, so concurrent writers don't deadlock
+    upgrading a shared lock, and it is one statement instead of two.
+    """
+    dialect = db.bind.dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table).values(rows)
+        return stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in columns})
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[c.name for c in table.primary_key.columns],
+        set_={c: table.c[c] + stmt.excluded[c] for c in columns},
+    )
@@ -0,0 +1,135 @@
+"""Streaming export of a user's knowledge base (GET /api/items/export).
+
+Rows are read in keyset batches of EXPORT_CHUNK_SIZE (WHERE user_id = ? AND
+id > last ORDER BY id LIMIT n, served by the user_id index). Each batch takes
+a pooled connection, reads the rows and then their tags with one IN query on
+that same connection, and gives the connection back before the rendered chunk
+is handed to the StreamingResponse. An export therefore holds at most one
+pool connection, and only while a batch is being read: a slow client never
+pins a connection or keeps an unbuffered cursor open (net_write_timeout).
+
+The generator opens its own connections: request-scoped sessions are closed
+before a streaming response body is sent.
+"""
+import csv
+import io
+import json
+import zlib
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List
+
+from sqlalchemy import select
+
+from . import models
+from .core.config import settings
+from .database import engine
+
+FORMATS = {
+    # format: (media type, file extension)
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "jsonl.gz": ("application/gzip", "jsonl.gz"),
+}
+
+FIELDS = ["id", "title", "description", "summary", "tags", "original_text", "confidence", "source", "status", "created_at", "updated_at"]
+
+
+def _columns(include_raw: bool):
+    t = models.KnowledgeItem.__table__
+    cols = [t.c.id, t.c.title, t.c.description, t.c.summary, t.c.original_text,
+            t.c.confidence, t.c.source, t.c.status, t.c.created_at, t.c.updated_at]
+    if include_raw:
+        cols.append(t.c.llm_raw)
+    return cols
+
+
+async def _tags_for(conn, item_ids: List[int]) -> Dict[int, List[str]]:
+    link = models.knowledge_tag_table
+    rows = await conn.execute(
+        select(link.c.knowledge_id, models.Tag.name)
+        .join(models.Tag, models.Tag.id == link.c.tag_id)
+        .where(link.c.knowledge_id.in_(item_ids))
+    )
+    tags = defaultdict(list)
+    for item_id, name in rows:
+        tags[item_id].append(name)
+    return tags
+
+
+def _record(row, tags: Dict[int, List[str]], include_raw: bool) -> dict:
+    record = {
+        "id": row.id,
+        "title": row.title,
+        "description": row.description,
+        "summary": row.summary,
+        "tags": sorted(tags.get(row.id, ())),
+        "original_text": row.original_text,
+        "confidence": row.confidence,
+        "source": row.source,
+        "status": row.status,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+    }
+    if include_raw:
+        record["llm_raw"] = row.llm_raw
+    return record
+
+
+async def iter_records(user_id: int, include_raw: bool = False) -> AsyncIterator[List[dict]]:
+    """Yield the user's items as lists of export records, one list per keyset batch."""
+    t = models.KnowledgeItem.__table__
+    last_id = 0
+    while True:
+        stmt = (
+            select(*_columns(include_raw))
+            .where(t.c.user_id == user_id, t.c.id > last_id)
+            .order_by(t.c.id)
+            .limit(settings.EXPORT_CHUNK_SIZE)
+        )
+        async with engine.connect() as conn:
+            rows = (await conn.execute(stmt)).all()
+            if not rows:
+                return
+            tags = await _tags_for(conn, [r.id for r in rows])
+        last_id = rows[-1].id
+        yield [_record(r, tags, include_raw) for r in rows]
+
+
+async def _ndjson(user_id: int, include_raw: bool) -> AsyncIterator[bytes]:
+    async for records in iter_records(user_id, include_raw):
+        yield "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+
+
+async def _csv(user_id: int, include_raw: bool) -> AsyncIterator[bytes]:
+    fields = FIELDS + (["llm_raw"] if include_raw else [])
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields)
+    # BOM so that Excel detects UTF-8
+    buf.write("\ufeff")
+    writer.writeheader()
+    async for records in iter_records(user_id, include_raw):
+        for r in records:
+            r["tags"] = ",".join(r["tags"])
+            writer.writerow(r)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+async def _gzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(user_id: int, fmt: str, include_raw: bool = False) -> AsyncIterator[bytes]:
+    if fmt == "csv":
+        return _csv(user_id, include_raw)
+    if fmt == "jsonl.gz":
+        return _gzip(_ndjson(user_id, include_raw))
+    return _ndjson(user_id, include_raw)
@@ -0,0 +1,215 @@
+"""Streaming bulk import of knowledge items (POST /api/items/import).
+
+The request body is NDJSON -- one item per line, either {"text": "..."} or a
+bare JSON string -- sent directly (application/x-ndjson) or as the file part of
+a multipart/form-data upload. It is parsed incrementally as it arrives: lines
+are cut from the byte stream, and every IMPORT_BATCH_SIZE valid lines (or
+IMPORT_BATCH_MAX_BYTES of them, whichever comes first) become one multi-row
+INSERT (plus the pending counter update) in their own commit.
+The ids of each batch are then queued in chunks of IMPORT_TASK_CHUNK on the
+bulk queue's per-user fair queue (app/celery_task/queues.py), so one large
+import does not hold up other users' imports.
+
+Progress is kept on the ImportJob row (GET /api/imports/{id}, which also
+reports the imported items by status) and published over the WebSocket as
+{"type": "import", ...} events after every batch.
+"""
+import json
+import logging
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional
+
+import redis.asyncio as aioredis
+from sqlalchemy import insert, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from . import counters, data_version, models
+from .celery_task import queues
+from .celery_task.celery import dispatch_bulk
+from .core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_redis = None
+
+
+def _client():
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+    return _redis
+
+
+async def iter_multipart_file(chunks: AsyncIterator[bytes], boundary: bytes) -> AsyncIterator[bytes]:
+    """Yield the content of the first file part of a multipart/form-data stream, chunk by chunk."""
+    delimiter = b"\r\n--" + boundary
+    buf = b""
+    state = "preamble"
+    async for chunk in chunks:
+        buf += chunk
+        while True:
+            if state == "preamble":
+                i = buf.find(b"--" + boundary)
+                if i < 0:
+                    buf = buf[-(len(boundary) + 2):]
+                    break
+                buf = buf[i + len(boundary) + 2:]
+                state = "headers"
+            elif state == "headers":
+                i = buf.find(b"\r\n\r\n")
+                if i < 0:
+                    if len(buf) > 16384:
+                        raise ValueError("multipart part headers too large")
+                    break
+                headers = buf[:i].decode("latin-1").lower()
+                buf = buf[i + 4:]
+                state = "file" if "filename=" in headers else "skip"
+            else:
+                i = buf.find(delimiter)
+                if i < 0:
+                    # keep a tail that may hold the start of the delimiter
+                    keep = len(delimiter)
+                    if state == "file" and len(buf) > keep:
+                        yield buf[:-keep]
+                    buf = buf[-keep:]
+                    break
+                if state == "file":
+                    yield buf[:i]
+                    return
+                buf = buf[i + len(delimiter):]
+                state = "headers"
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[Optional[bytes]]:
+    """Split a byte stream into lines; a line longer than max_bytes is yielded as None."""
+    buf = bytearray()
+    oversized = False
+    async for chunk in chunks:
+        buf += chunk
+        while True:
+            i = buf.find(b"\n")
+            if i < 0:
+                break
+            line = bytes(buf[:i])
+            del buf[:i + 1]
+            yield None if oversized or len(line) > max_bytes else line
+            oversized = False
+        if len(buf) > max_bytes:
+            buf.clear()
+            oversized = True
+    if buf or oversized:
+        yield None if oversized else bytes(buf)
+
+
+def parse_line(line: bytes) -> Optional[str]:
+    """Text of one NDJSON line, or None if the line is not a valid item."""
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return None
+    if isinstance(data, dict):
+        data = data.get("text")
+    if not isinstance(data, str) or not data.strip():
+        return None
+    return data
+
+
+async def _publish(job: models.ImportJob):
+    payload = {
+        "type": "import",
+        "user_id": job.user_id,
+        "job_id": job.id,
+        "status": job.status,
+        "received": job.received,
+        "inserted": job.inserted,
+        "rejected": job.rejected,
+    }
+    try:
+        await _client().publish(settings.REDIS_PUBSUB_CHANNEL, json.dumps(payload))
+    except Exception as e:
+        logger.warning("Failed to publish import progress: %s", e)
+
+
+async def _flush(db: AsyncSession, job: models.ImportJob, texts: List[str], last_id: int) -> int:
+    table = models.KnowledgeItem.__table__
+    if texts:
+        await db.execute(insert(table).values([
+            {"user_id": job.user_id, "original_text": t, "status": "pending", "source": "local", "import_job_id": job.id}
+            for t in texts
+        ]))
+        await counters.adjust(db, job.user_id, "pending", len(texts))
+        job.inserted += len(texts)
+    await db.commit()
+    if texts:
+        await data_version.bump(job.user_id)
+    ids = (await db.execute(
+        select(table.c.id)
+        .where(table.c.import_job_id == job.id, table.c.id > last_id)
+        .order_by(table.c.id)
+    )).scalars().all()
+    if ids:
+        await run_in_threadpool(
+            dispatch_bulk, job.user_id, list(ids), queues.FAIR_IMPORT, queues.PRIORITY_IMPORT, settings.IMPORT_TASK_CHUNK
+        )
+        last_id = ids[-1]
+    await _publish(job)
+    return last_id
+
+
+async def run_import(db: AsyncSession, user_id: int, chunks: AsyncIterator[bytes]) -> models.ImportJob:
+    """Consume an NDJSON byte stream into a new import job; returns the finished (or failed) job."""
+    job = models.ImportJob(user_id=user_id, status="running", received=0, inserted=0, rejected=0)
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    job_id = job.id
+
+    batch: List[str] = []
+    batch_bytes = 0
+    last_id = 0
+    try:
+        async for line in iter_lines(chunks, settings.IMPORT_MAX_LINE_BYTES):
+            if line is not None and not line.strip():
+                continue
+            job.received += 1
+            text = parse_line(line) if line is not None else None
+            if text is None:
+                job.rejected += 1
+                continue
+            batch.append(text)
+            batch_bytes += len(line)
+            # the byte budget keeps one INSERT of long texts within max_allowed_packet
+            if len(batch) >= settings.IMPORT_BATCH_SIZE or batch_bytes >= settings.IMPORT_BATCH_MAX_BYTES:
+                last_id = await _flush(db, job, batch, last_id)
+                batch = []
+                batch_bytes = 0
+        job.status = "done"
+        job.finished_at = datetime.now(timezone.utc)
+        await _flush(db, job, batch, last_id)
+    except Exception as e:
+        logger.exception("Import job %s failed", job_id)
+        await db.rollback()
+        job = await db.get(models.ImportJob, job_id, populate_existing=True)
+        job.status = "failed"
+        job.error = str(e)[:2000]
+        job.finished_at = datetime.now(timezone.utc)
+        await db.commit()
+        await _publish(job)
+    return job
+
+
+async def get_job(db: AsyncSession, job_id: int, user_id: int) -> Optional[Dict]:
+    job = await db.get(models.ImportJob, job_id)
+    if job is None or job.user_id != user_id:
+        return None
+    rows = (await db.execute(
+        select(models.KnowledgeItem.status, func.count())
+        .where(models.KnowledgeItem.import_job_id == job_id)
+        .group_by(models.KnowledgeItem.status)
+    )).all()
+    by_status = {s: 0 for s in counters.STATUSES}
+    by_status.update({status: n for status, n in rows})
+    data = {c.name: getattr(job, c.name) for c in models.ImportJob.__table__.columns}
+    data["by_status"] = by_status
+    return data
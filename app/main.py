@@ -1,15 +1,20 @@
 import os
-import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Header, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import PlainTextResponse
+import redis.asyncio as aioredis
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy import text
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from .core.config import settings
-from .database import Base, engine
+from .database import AsyncSessionLocal, Base, engine
 from .routers import items
 from .routers import auth
-import redis.asyncio as aioredis  # or redis.asyncio usage
+from .core.security import get_user_from_token
+from .core.hashing import hasher
+from .celery_task import queues
+from . import compression, data_version, metrics
+from .ws_hub import hub
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -22,58 +27,88 @@ async def lifespan(app: FastAPI):
         print("Database tables ensured/created.")
     except Exception as e:
         print("Warning: failed to create tables on startup:", e)
+    await hub.start()
     yield
+    await hub.stop()
 
 
 app = FastAPI(title="Knowledge Organizer", docs_url="/api/docs", openapi_url="/api/openapi.json", lifespan=lifespan)
 
+if settings.COMPRESSION_ENABLED:
+    # innermost: the request duration metrics include the compression time
+    app.add_middleware(
+        compression.CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
+app.add_middleware(metrics.MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # 1) 先注册 API 路由（/api/...）
 app.include_router(items.router, prefix="/api")
 app.include_router(auth.router, prefix="/api")
 
+# 运行指标（Prometheus 文本格式）：本进程的请求/SQL 耗时 + worker 经 Redis 汇总的任务/提取耗时
+metrics.register_collector(lambda: {"ws_connections": hub.connection_count})
+metrics.register_collector(lambda: {f"password_hasher_{k}": v for k, v in hasher.stats().items()})
+metrics.register_collector(lambda: {f"response_cache_{k}_total": v for k, v in data_version.stats().items()})
+metrics.register_collector(lambda: {f"compression_{k}_total": v for k, v in compression.stats().items()})
+_metrics_redis = aioredis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+
+
+@app.get("/api/metrics", include_in_schema=False)
+async def metrics_endpoint(authorization: str | None = Header(None)):
+    if settings.METRICS_TOKEN and authorization != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    try:
+        body = await metrics.render(_metrics_redis)
+        body += "\n".join(await run_in_threadpool(queues.prometheus_lines, queues.get_client())) + "\n"
+    except Exception as e:
+        # Redis down: still serve this process's own series
+        body = await metrics.render() + f"# worker metrics unavailable: {e}\n"
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
 # 2) 注册 WebSocket 路由（确保在 StaticFiles mount 之前）
 @app.websocket("/api/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, token: str | None = Query(None)):
+    # 浏览器无法给 WebSocket 设置 Authorization 头，token 通过查询参数传入
+    user = None
+    if token:
+        async with AsyncSessionLocal() as db:
+            user = await get_user_from_token(db, token)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
     await websocket.accept()
-    # 建立 redis 订阅并转发（同之前逻辑）
-    redis_client = await aioredis.from_url(settings.CELERY_BROKER_URL, encoding="utf-8", decode_responses=True)
-    pubsub = redis_client.pubsub()
-    channel = settings.REDIS_PUBSUB_CHANNEL
-    await pubsub.subscribe(channel)
+    # 只注册到本进程的 hub，由 hub 的单一 redis 订阅转发该用户的事件
+    conn = hub.register(user.id, websocket)
     try:
-        async def forward():
-            while True:
-                msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
-                if msg:
-                    data = msg.get("data")
-                    try:
-                        await websocket.send_text(data)
-                    except Exception:
-                        break
-                await asyncio.sleep(0.1)
-        forward_task = asyncio.create_task(forward())
         while True:
-            try:
-                await websocket.receive_text()
-            except Exception:
-                break
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
     finally:
-        forward_task.cancel()
-        await pubsub.unsubscribe(channel)
-        await redis_client.close()
+        hub.unregister(conn)
 
 # 3) 在最后挂载前端静态资源（占位）
 frontend_dir = settings.FRONTEND_DIST_DIR
 if os.path.isdir(frontend_dir):
     # 放在最后，避免拦截 /api/* 路由或 websocket
-    app.mount("/", StaticFiles(directory=frontend_dir, html=True), name="frontend")
+    # 构建产物的 .br/.gz 预压缩版本见 python -m app.compression precompress
+    app.mount(
+        "/",
+        compression.PrecompressedStaticFiles(
+            directory=frontend_dir, html=True, immutable_pattern=settings.STATIC_IMMUTABLE_PATTERN
+        ),
+        name="frontend",
+    )
 else:
     @app.get("/")
     async def home():
@@ -0,0 +1,283 @@
+"""Low-overhead in-process metrics rendered as Prometheus text at /api/metrics.
+
+Histograms live in plain dicts keyed by label values; observing is a lock, a
+bisect and a few additions. Sources:
+
+* MetricsMiddleware: request duration per method / route template / status
+* instrument_engine(): duration and count of every SQL statement, by
+  operation (SELECT/INSERT/...) and first table
+* timer("auth") etc.: named sections of a request
+* the Celery worker (app.celery_task.worker): task run time, extraction
+  timings by source (llm/local) and outcome
+
+Worker processes are separate from the web process, so after each task the
+worker pushes its increments to Redis (flush()); /api/metrics renders the web
+process's own series with role="web" and the workers' accumulated series
+from Redis with role="worker". Gauge snapshots (LLM scheduler, process RSS,
+...) are stored per worker process with a TTL. Queue wait per queue comes from
+the counters kept by app.celery_task.queues.
+
+With several uvicorn workers each web process reports its own series; scrape
+them individually or run one.
+"""
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+REDIS_PREFIX = "metrics:"
+GAUGE_PREFIX = "metrics_gauges:"
+GAUGE_TTL = 300
+
+_registry: List["_Metric"] = []
+_collectors: List[Callable[[], Dict[str, float]]] = []
+
+
+def _labelstr(names: Sequence[str], values: Sequence[str]) -> str:
+    return ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple, list] = {}  # increments not yet flushed to Redis
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, list] = {}  # key -> [bucket counts..., +Inf count, sum]
+
+    def _empty(self) -> list:
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            for store in (self._values, self._pending):
+                row = store.get(key)
+                if row is None:
+                    row = store[key] = self._empty()
+                row[i] += 1
+                row[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _fields_of(self, rows) -> Dict[str, float]:
+        fields = {}
+        for k, row in rows.items():
+            labels = _labelstr(self.labelnames, k)
+            for i, n in enumerate(row[:-1]):
+                if n:
+                    fields[f"{labels}\tb{i}"] = n
+            fields[f"{labels}\tsum"] = row[-1]
+        return fields
+
+    def _fields(self, pending) -> Dict[str, float]:
+        return self._fields_of(pending)
+
+    def _local_fields(self) -> Dict[str, float]:
+        with self._lock:
+            return self._fields_of({k: list(v) for k, v in self._values.items()})
+
+    def _samples(self, values: Dict[str, float], extra: str) -> List[str]:
+        rows: Dict[str, list] = {}
+        for (labels, field), v in _split(values).items():
+            row = rows.setdefault(labels, self._empty())
+            if field == "sum":
+                row[-1] = v
+            else:
+                row[int(field[1:])] = v
+        lines = []
+        bounds = [repr(float(b)) for b in self.buckets] + ["+Inf"]
+        for labels, row in rows.items():
+            base = _join(labels, extra)
+            cumulative = 0
+            for le, n in zip(bounds, row[:-1]):
+                cumulative += n
+                bucket_labels = _join(base, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {int(cumulative)}")
+            lines.append(f"{self.name}_sum{{{base}}} {row[-1]}")
+            lines.append(f"{self.name}_count{{{base}}} {int(cumulative)}")
+        return lines
+
+
+def _join(*parts: str) -> str:
+    return ",".join(p for p in parts if p)
+
+
+def _split(values: Dict[str, float]) -> Dict[Tuple[str, str], float]:
+    out = {}
+    for field, v in values.items():
+        labels, _, suffix = field.rpartition("\t")
+        out[(labels, suffix)] = float(v)
+    return out
+
+
+# ---- metrics ---------------------------------------------------------------
+
+http_request_seconds = Histogram(
+    "http_request_duration_seconds", "HTTP request duration by route template", ("method", "route", "status")
+)
+db_statement_seconds = Histogram(
+    "db_statement_duration_seconds", "SQL statement duration by operation and first table", ("operation", "table")
+)
+section_seconds = Histogram("app_section_duration_seconds", "Duration of named request sections", ("section",))
+task_run_seconds = Histogram(
+    "celery_task_run_seconds", "Celery task run time", ("task", "outcome"),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+extraction_seconds = Histogram(
+    "extraction_duration_seconds", "Extractor call duration by source and outcome", ("source", "outcome"),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+
+
+def timer(section: str):
+    """Context manager timing a named section (app_section_duration_seconds)."""
+    return section_seconds.time(section=section)
+
+
+def register_collector(fn: Callable[[], Dict[str, float]]):
+    """fn() returns {"metric_name{labels}": value} gauges, evaluated at scrape time."""
+    _collectors.append(fn)
+
+
+# ---- SQL ---------------------------------------------------------------------
+
+_SQL_KEYWORDS = {"FROM", "INTO", "UPDATE", "JOIN"}
+_SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH"}
+
+
+def _statement_labels(statement: str) -> Tuple[str, str]:
+    # only look at the head: multi-row INSERTs can be megabytes long
+    words = statement[:400].split()
+    if not words:
+        return "OTHER", ""
+    operation = words[0].upper()
+    if operation not in _SQL_OPERATIONS:
+        return "OTHER", ""
+    table = ""
+    for prev, word in zip(words, words[1:]):
+        if prev.upper() in _SQL_KEYWORDS and word[:1] != "(":
+            table = word.strip("`\"'(),;").split(".")[-1]
+            break
+    if operation == "UPDATE" and len(words) > 1:
+        table = words[1].strip("`\"")
+    return operation, table
+
+
+def instrument_engine(engine):
+    """Time every statement of an (async or sync) engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("_metrics_start")
+        if starts:
+            operation, table = _statement_labels(statement)
+            db_statement_seconds.observe(time.perf_counter() - starts.pop(), operation=operation, table=table)
+
+
+# ---- HTTP ----------------------------------------------------------------------
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording http_request_duration_seconds per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_request_seconds.observe(
+                time.perf_counter() - start, method=scope["method"], route=path, status=status["code"]
+            )
+
+
+# ---- cross-process -------------------------------------------------------------
+
+def flush(client, gauges: Optional[Dict[str, float]] = None, source: str = ""):
+    """Push this process's unflushed increments (and a gauge snapshot) to Redis. Sync redis client."""
+    pipe = client.pipeline(transaction=False)
+    for metric in _registry:
+        with metric._lock:
+            pending, metric._pending = metric._pending, {}
+        for field, value in metric._fields(pending).items():
+            if field.endswith("\tsum"):
+                pipe.hincrbyfloat(REDIS_PREFIX + metric.name, field, value)
+            else:
+                pipe.hincrby(REDIS_PREFIX + metric.name, field, int(value))
+    if gauges:
+        pipe.set(GAUGE_PREFIX + source, json.dumps(gauges), ex=GAUGE_TTL)
+    pipe.execute()
+
+
+async def render(client=None) -> str:
+    """Prometheus text exposition: local series (role="web") plus workers' series from Redis (async client)."""
+    shared: Dict[str, Dict[str, float]] = {}
+    gauges: List[Tuple[str, dict]] = []
+    if client is not None:
+        for metric in _registry:
+            shared[metric.name] = await client.hgetall(REDIS_PREFIX + metric.name)
+        async for key in client.scan_iter(match=GAUGE_PREFIX + "*", count=100):
+            raw = await client.get(key)
+            if raw:
+                gauges.append((key[len(GAUGE_PREFIX):], json.loads(raw)))
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric._samples(metric._local_fields(), 'role="web"'))
+        if shared.get(metric.name):
+            lines.extend(metric._samples(shared[metric.name], 'role="worker"'))
+    for fn in _collectors:
+        for name, value in fn().items():
+            lines.append(f"{name} {value}")
+    for source, values in gauges:
+        for name, value in values.items():
+            metric, _, labels = name.partition("{")
+            labels = _join(labels.rstrip("}"), 'process="%s"' % source)
+            lines.append(f"{metric}{{{labels}}} {value}")
+    return "\n".join(lines) + "\n"
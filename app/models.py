@@ -1,7 +1,14 @@
-from sqlalchemy import Column, Integer, String, Text, Table, ForeignKey, DateTime, func
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, Table, ForeignKey, DateTime, Index, func
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import relationship, deferred
 from .database import Base
 
+HEAVY_COLUMNS = "heavy"  # deferred column group of KnowledgeItem
+
+# SQLite（测试库）里 server_default=func.now() 存成 "YYYY-MM-DD HH:MM:SS"，而 DateTime 绑定参数默认带 ".ffffff"；
+# 两者按字符串比较会错位（游标分页的 created_at == :c 永不成立），故按秒级同一格式存取
+_SQLITE_SECONDS = sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d")
+
 # Many-to-many
 knowledge_tag_table = Table(
     "knowledge_tag",
@@ -17,17 +24,30 @@ class KnowledgeItem(Base):
     title = Column(String(255), index=True, nullable=True)
     description = Column(String(1024), nullable=True)
     summary = Column(Text, nullable=True)
-    original_text = Column(Text, nullable=False)
-    llm_raw = Column(Text, nullable=True)         # 原始 LLM 输出（JSON 或文本）
+    # 大字段默认延迟加载（列表不需要）；详情查询用 undefer_group(HEAVY_COLUMNS)
+    original_text = deferred(Column(Text, nullable=False), group=HEAVY_COLUMNS)
+    llm_raw = deferred(Column(Text, nullable=True), group=HEAVY_COLUMNS)         # 原始 LLM 输出（JSON 或文本）
     confidence = Column(String(64), nullable=True)  # 置信度或评分（可为空）
     source = Column(String(32), nullable=True, default="local")  # 'llm' 或 'local'
     status = Column(String(32), nullable=False, default="pending")  # pending/processing/done/failed
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    version = Column(Integer, nullable=False, default=0, server_default="0")  # bumped by every status transition (app/status.py)
+    processing_started_at = Column(DateTime(timezone=True), nullable=True)  # lease: set when entering processing
+    created_at = Column(DateTime(timezone=True).with_variant(_SQLITE_SECONDS, "sqlite"), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # 批量导入时所属的导入任务（见 app/importer.py），单条创建为空
+    import_job_id = Column(Integer, ForeignKey("import_jobs.id", ondelete="SET NULL"), nullable=True, index=True)
 
     tags = relationship("Tag", secondary=knowledge_tag_table, back_populates="items")
     owner = relationship("User", back_populates="items")
 
+    __table_args__ = (
+        # backs the per-user "newest first" listing and keyset (cursor) pagination
+        Index("ix_knowledge_items_user_created_id", "user_id", "created_at", "id"),
+        # batch claims: oldest pending items, per user or overall (crud.claim_pending_items)
+        Index("ix_knowledge_items_user_status_id", "user_id", "status", "id"),
+        Index("ix_knowledge_items_status_id", "status", "id"),
+    )
+
 class Tag(Base):
     __tablename__ = "tags"
     id = Column(Integer, primary_key=True, index=True)
@@ -46,4 +66,49 @@ class User(Base):
     email = Column(String(255), unique=True, nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    items = relationship("KnowledgeItem", back_populates="owner")
\ No newline at end of file
+    items = relationship("KnowledgeItem", back_populates="owner")
+
+
+# 全文检索倒排索引（见 app/search.py）
+class SearchPosting(Base):
+    __tablename__ = "search_postings"
+    user_id = Column(Integer, primary_key=True)
+    token = Column(String(64), primary_key=True)
+    item_id = Column(Integer, ForeignKey("knowledge_items.id", ondelete="CASCADE"), primary_key=True, index=True)
+    tf = Column(Integer, nullable=False)  # term frequency in the item
+
+
+class SearchDoc(Base):
+    __tablename__ = "search_docs"
+    item_id = Column(Integer, ForeignKey("knowledge_items.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    length = Column(Integer, nullable=False)  # number of tokens in the item
+
+
+class SearchStats(Base):
+    __tablename__ = "search_stats"
+    user_id = Column(Integer, primary_key=True)
+    doc_count = Column(Integer, nullable=False, default=0)
+    total_length = Column(Integer, nullable=False, default=0)
+
+
+# 每个用户的条目计数（总数 + 按状态），见 app/counters.py
+class ItemCounter(Base):
+    __tablename__ = "item_counters"
+    user_id = Column(Integer, primary_key=True)
+    status = Column(String(32), primary_key=True)
+    item_count = Column(Integer, nullable=False, default=0)
+
+
+# 批量导入任务（见 app/importer.py）
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(String(32), nullable=False, default="running")  # running/done/failed
+    received = Column(Integer, nullable=False, default=0)  # lines read from the upload
+    inserted = Column(Integer, nullable=False, default=0)
+    rejected = Column(Integer, nullable=False, default=0)  # blank/invalid/oversized lines
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
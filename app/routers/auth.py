@@ -7,12 +7,21 @@ from datetime import timedelta
 from .. import crud, schemas
 from ..database import get_db
 from ..core import security
+from ..core.hashing import hasher
 from ..schemas import PasswordChange
 from ..core.security import get_current_user
 
 router = APIRouter()
 
 
+async def _rehash_if_needed(db: AsyncSession, user, password: str):
+    """Transparently upgrade the stored hash to the configured scheme/cost after a successful login."""
+    if security.password_needs_rehash(user.hashed_password):
+        user.hashed_password = await hasher.hash(password)
+        await db.commit()
+        await security.invalidate_cached_user(user.id, user.username)
+
+
 @router.post("/auth/register", response_model=schemas.UserRead)
 async def register(user_in: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     # check username/email/phone uniqueness
@@ -22,7 +31,7 @@ async def register(user_in: schemas.UserCreate, db: AsyncSession = Depends(get_d
         raise HTTPException(status_code=400, detail="Email already registered")
     if user_in.phone and await crud.get_user_by_phone(db, user_in.phone):
         raise HTTPException(status_code=400, detail="Phone already registered")
-    hashed = security.get_password_hash(user_in.password)
+    hashed = await hasher.hash(user_in.password)
     user = await crud.create_user(db, username=user_in.username, hashed_password=hashed, name=user_in.name, phone=user_in.phone, email=user_in.email)
     return user
 
@@ -30,15 +39,15 @@ async def register(user_in: schemas.UserCreate, db: AsyncSession = Depends(get_d
 @router.post("/auth/token", response_model=schemas.Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     user = await crud.get_user_by_username(db, form_data.username)
-    print(form_data.password, user.hashed_password)
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    if not user or not await hasher.verify(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    await _rehash_if_needed(db, user, form_data.password)
     access_token_expires = timedelta(minutes=security.settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = security.create_access_token(data={"sub": user.username}, expires_delta=access_token_expires)
+    access_token = security.create_access_token(data={"sub": user.username, "uid": user.id}, expires_delta=access_token_expires)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
@@ -51,13 +60,14 @@ async def change_password(payload: PasswordChange, db: AsyncSession = Depends(ge
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     # verify old password
-    if not security.verify_password(payload.old_password, user.hashed_password):
+    if not await hasher.verify(payload.old_password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Old password incorrect")
     # set new password
-    new_hash = security.get_password_hash(payload.new_password)
+    new_hash = await hasher.hash(payload.new_password)
     user.hashed_password = new_hash
     db.add(user)
     await db.commit()
+    await security.invalidate_cached_user(user.id, user.username)
     return {"ok": True}
 
 
@@ -69,12 +79,13 @@ async def login_for_access_token_json(payload: dict = Body(...), db: AsyncSessio
     if not username or not password:
         raise HTTPException(status_code=400, detail="username and password required")
     user = await crud.get_user_by_username(db, username)
-    if not user or not security.verify_password(password, user.hashed_password):
+    if not user or not await hasher.verify(password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    await _rehash_if_needed(db, user, password)
     access_token_expires = timedelta(minutes=security.settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = security.create_access_token(data={"sub": user.username}, expires_delta=access_token_expires)
+    access_token = security.create_access_token(data={"sub": user.username, "uid": user.id}, expires_delta=access_token_expires)
     return {"access_token": access_token, "token_type": "bearer", "username": user.username}
@@ -1,61 +1,157 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from .. import crud, schemas
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from .. import crud, data_version, exporter, importer, schemas
 from ..database import get_db
-from ..celery_task.tasks import extract_and_update
+from ..celery_task import queues
+from ..celery_task.celery import celery, dispatch_bulk, EXTRACT_TASK
+from starlette.concurrency import run_in_threadpool
 from app.core.config import settings
 from ..core.security import get_current_user
 from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter()
 
+_list_adapter = TypeAdapter(List[schemas.KnowledgeListItem])
+
 @router.post("/items", response_model=schemas.KnowledgeListItem)
 async def create_item(payload: schemas.KnowledgeCreate, db: AsyncSession = Depends(get_db), current_user=Depends(get_current_user)):
     # 1. 创建记录（pending）
     item = await crud.create_knowledge(db, payload.text, user_id=current_user.id)
+    await data_version.bump(current_user.id)
     # 2. 入队 Celery 后台处理
-    extract_and_update.delay(item.id)
+    celery.send_task(EXTRACT_TASK, args=[item.id, current_user.id])
     # 3. 重新查询以带上 selectinload 的 tags 和最新字段（避免懒加载）
     item_fresh = await crud.get_knowledge(db, item.id, user_id=current_user.id)
     return item_fresh
 
+@router.post("/items/import", response_model=schemas.ImportJobRead)
+async def import_items(request: Request, db: AsyncSession = Depends(get_db), current_user=Depends(get_current_user)):
+    # 流式批量导入：NDJSON 请求体，或 multipart 上传的 NDJSON 文件；边接收边解析入库
+    content_type = request.headers.get("content-type", "")
+    chunks = request.stream()
+    if content_type.startswith("multipart/form-data"):
+        boundary = next((p.split("=", 1)[1].strip('"') for p in content_type.split(";") if p.strip().startswith("boundary=")), None)
+        if not boundary:
+            raise HTTPException(status_code=400, detail="Missing multipart boundary")
+        chunks = importer.iter_multipart_file(chunks, boundary.strip().encode("latin-1"))
+    job = await importer.run_import(db, current_user.id, chunks)
+    return await importer.get_job(db, job.id, current_user.id)
+
+@router.get("/imports/{job_id}", response_model=schemas.ImportJobRead)
+async def get_import(job_id: int, db: AsyncSession = Depends(get_db), current_user=Depends(get_current_user)):
+    job = await importer.get_job(db, job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Not found")
+    return job
+
 @router.get("/items", response_model=List[schemas.KnowledgeListItem])
 async def list_items(
+    request: Request,
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
     q: str | None = Query(None, description="search query to match title, description, summary or tags"),
+    cursor: str | None = Query(None, description="opaque cursor from the X-Next-Cursor header; takes precedence over page"),
     db: AsyncSession = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
     skip = (page - 1) * page_size
-    items = await crud.list_knowledge(db, skip=skip, limit=page_size, q=q, user_id=current_user.id)
-    return items
+    after = None
+    if cursor:
+        try:
+            after = crud.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    # 数据版本未变：304 或直接返回缓存的渲染结果，不查询 MySQL
+    conditional = data_version.Conditional(request, current_user.id)
+    cached = await conditional.check()
+    if cached is not None:
+        return cached
+    items = await crud.list_knowledge(db, skip=skip, limit=page_size, q=q, user_id=current_user.id, after=after)
+    headers = {}
+    # ranked (index) searches are not in created_at order, so they have no keyset cursor
+    ranked = bool(q) and settings.SEARCH_BACKEND == "index"
+    if len(items) == page_size and not ranked:
+        headers["X-Next-Cursor"] = crud.encode_cursor(items[-1])
+    return await conditional.store(_list_adapter.dump_json(_list_adapter.validate_python(items)), headers)
 
 @router.get("/items/count")
-async def items_count(db: AsyncSession = Depends(get_db)):
-    total = await crud.count_knowledge(db)
-    return {"count": total}
+async def items_count(db: AsyncSession = Depends(get_db), current_user=Depends(get_current_user)):
+    return await crud.count_knowledge(db, user_id=current_user.id)
+
+@router.get("/items/export")
+async def export_items(
+    format: str = Query("ndjson", pattern="^(ndjson|csv|jsonl\\.gz)$"),
+    include_raw: bool = Query(False, description="include the raw LLM output"),
+    current_user=Depends(get_current_user),
+):
+    # 流式导出：按 id 分批（keyset）读取，边查边写，内存占用与数据量无关
+    media_type, ext = exporter.FORMATS[format]
+    return StreamingResponse(
+        exporter.export_stream(current_user.id, format, include_raw),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="knowledge-export.{ext}"'},
+    )
+
+@router.post("/items/reprocess")
+async def reprocess_items(
+    status: List[str] = Query(["failed"], description="reprocess items with these statuses (done/failed, processing: only stuck ones)"),
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    # 重新提取：低优先级进入 bulk 队列，按用户公平调度，不影响交互式提取
+    if not set(status) <= {"done", "failed", "processing"}:
+        raise HTTPException(status_code=400, detail="status must be done, failed or processing")
+    ids = await crud.reset_for_reprocess(db, current_user.id, statuses=tuple(status))
+    if ids:
+        await data_version.bump(current_user.id)
+    await run_in_threadpool(
+        dispatch_bulk, current_user.id, ids, queues.FAIR_REPROCESS, queues.PRIORITY_REPROCESS, settings.IMPORT_TASK_CHUNK
+    )
+    return {"queued": len(ids)}
+
+@router.post("/items/{item_id}/reprocess")
+async def reprocess_item(item_id: int, db: AsyncSession = Depends(get_db), current_user=Depends(get_current_user)):
+    ids = await crud.reset_for_reprocess(db, current_user.id, item_ids=[item_id])
+    if not ids:
+        if not await crud.get_knowledge(db, item_id, user_id=current_user.id):
+            raise HTTPException(status_code=404, detail="Not found")
+        raise HTTPException(status_code=409, detail="Item is already queued")
+    await data_version.bump(current_user.id)
+    await run_in_threadpool(
+        dispatch_bulk, current_user.id, ids, queues.FAIR_REPROCESS, queues.PRIORITY_REPROCESS, settings.IMPORT_TASK_CHUNK
+    )
+    return {"queued": len(ids)}
 
 @router.get("/items/{item_id}", response_model=schemas.KnowledgeDetail)
-async def get_item(item_id: int, db: AsyncSession = Depends(get_db), current_user=Depends(get_current_user)):
-    item = await crud.get_knowledge(db, item_id, user_id=current_user.id)
+async def get_item(item_id: int, request: Request, db: AsyncSession = Depends(get_db), current_user=Depends(get_current_user)):
+    # existence/ownership first: the per-user ETag would otherwise answer 304 for a deleted or foreign item
+    if not await crud.knowledge_exists(db, item_id, user_id=current_user.id):
+        raise HTTPException(status_code=404, detail="Not found")
+    conditional = data_version.Conditional(request, current_user.id)
+    cached = await conditional.check()
+    if cached is not None:
+        return cached
+    item = await crud.get_knowledge(db, item_id, user_id=current_user.id, detail=True)
     if not item:
         raise HTTPException(status_code=404, detail="Not found")
-    return item
+    return await conditional.store(schemas.KnowledgeDetail.model_validate(item).model_dump_json().encode())
 
 @router.get("/items/{item_id}/original")
 async def get_original(item_id: int, db: AsyncSession = Depends(get_db), current_user=Depends(get_current_user)):
-    item = await crud.get_knowledge(db, item_id, user_id=current_user.id)
-    if not item:
+    original_text = await crud.get_original_text(db, item_id, user_id=current_user.id)
+    if original_text is None:
         raise HTTPException(status_code=404, detail="Not found")
-    return {"id": item.id, "original_text": item.original_text}
+    return {"id": item_id, "original_text": original_text}
 
 @router.delete("/items/{item_id}")
 async def delete_item(item_id: int, db: AsyncSession = Depends(get_db), current_user=Depends(get_current_user)):
     ok = await crud.delete_knowledge(db, item_id, user_id=current_user.id)
     if not ok:
         raise HTTPException(status_code=404, detail="Not found")
+    await data_version.bump(current_user.id)
     return {"ok": True}
 
 @router.put("/items/{item_id}", response_model=schemas.KnowledgeDetail)
@@ -64,7 +160,16 @@ async def update_item(item_id: int, payload: schemas.KnowledgeUpdate, db: AsyncS
     item_exists = await crud.get_knowledge(db, item_id, user_id=current_user.id)
     if not item_exists:
         raise HTTPException(status_code=404, detail="Not found")
-    item = await crud.update_after_extraction(db, item_id, payload.dict(exclude_unset=True))
+    data = payload.dict(exclude_unset=True)
+    # optimistic concurrency: only apply the edit if the item is unchanged since it was read
+    version = data.pop("version", None)
+    item = await crud.update_after_extraction(
+        db, item_id, data,
+        from_statuses=[item_exists.status],
+        version=item_exists.version if version is None else version,
+        user_id=current_user.id,
+    )
     if not item:
-        raise HTTPException(status_code=404, detail="Not found")
+        raise HTTPException(status_code=409, detail="Item was modified concurrently, reload and retry")
+    await data_version.bump(current_user.id)
     return item
\ No newline at end of file
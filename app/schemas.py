@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel, ConfigDict, EmailStr, Field
 from datetime import datetime
 from typing import Any
@@ -22,6 +22,7 @@ class KnowledgeUpdate(PydanticBase):
     description: Optional[str]
     summary: Optional[str]
     tags: Optional[List[str]]
+    version: Optional[int] = None  # the version that was edited; 409 if the item changed since
 
 class KnowledgeListItem(PydanticBase):
     id: int
@@ -37,6 +38,7 @@ class KnowledgeDetail(KnowledgeListItem):
     original_text: str
     llm_raw: Optional[str]
     confidence: Optional[str]
+    version: int = 0
 
 
 class UserCreate(PydanticBase):
@@ -70,4 +72,16 @@ class TokenData(BaseModel):
 class PasswordChange(PydanticBase):
     old_password: str
     new_password: str
-    confirm_password: str
\ No newline at end of file
+    confirm_password: str
+
+class ImportJobRead(PydanticBase):
+    id: int
+    status: str
+    received: int
+    inserted: int
+    rejected: int
+    error: Optional[str]
+    created_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    # extraction progress of the imported items, by item status
+    by_status: Dict[str, int] = {}
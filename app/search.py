@@ -0,0 +1,202 @@
+"""Per-user inverted index over knowledge items, ranked with BM25.
+
+Documents are the title, description, summary and tag names of an item,
+segmented with jieba's search mode. The index is kept up to date by
+crud.update_after_extraction / crud.delete_knowledge; existing rows can be
+backfilled with:
+
+    python -m app.search rebuild [--user-id ID]
+"""
+import argparse
+import asyncio
+import math
+import re
+from collections import Counter
+from typing import Iterable, List, Optional
+
+from sqlalchemy import select, insert, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from . import models
+from .core.config import settings
+from .database import insert_ignore, upsert_increment
+from .utils.jieba_preload import configure_jieba
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_TOKEN_LEN = 64  # matches SearchPosting.token
+MIN_DOCS_FOR_CUTOFF = 100  # smaller indexes are cheap to scan in full
+
+_word_re = re.compile(r"\w")
+
+
+def tokenize(text: str) -> Counter:
+    """Segment text into lower-cased search tokens with their frequencies."""
+    if not text:
+        return Counter()
+    jieba = configure_jieba()  # deferred: keeps jieba out of web-process startup
+    tokens = (t.strip().lower() for t in jieba.lcut_for_search(text))
+    return Counter(t[:MAX_TOKEN_LEN] for t in tokens if t and _word_re.search(t))
+
+
+async def tokenize_async(text: str) -> Counter:
+    """tokenize() in a worker thread: the first call in a process builds jieba's
+    dictionary (about a second of CPU), which must not stall the event loop."""
+    if not text:
+        return Counter()
+    return await asyncio.to_thread(tokenize, text)
+
+
+def document_text(title: Optional[str], description: Optional[str], summary: Optional[str], tags: Iterable[str]) -> str:
+    # tag names differing only in case are one tag (case-insensitive collation)
+    tags = {t.lower(): t for t in tags}.values()
+    return "\n".join(part for part in (title, description, summary, " ".join(tags)) if part)
+
+
+async def _adjust_stats(db: AsyncSession, user_id: int, doc_delta: int, length_delta: int):
+    await db.execute(upsert_increment(
+        db, models.SearchStats.__table__,
+        [{"user_id": user_id, "doc_count": doc_delta, "total_length": length_delta}],
+        ["doc_count", "total_length"],
+    ))
+
+
+async def remove_item(db: AsyncSession, item_id: int):
+    """Drop an item from the index. Does not commit."""
+    doc = (await db.execute(
+        select(models.SearchDoc.user_id, models.SearchDoc.length).where(models.SearchDoc.item_id == item_id)
+    )).first()
+    if doc is None:
+        return
+    await db.execute(delete(models.SearchPosting).where(models.SearchPosting.item_id == item_id))
+    await db.execute(delete(models.SearchDoc).where(models.SearchDoc.item_id == item_id))
+    await _adjust_stats(db, doc.user_id, -1, -doc.length)
+
+
+async def index_item(db: AsyncSession, item_id: int, user_id: int, text: str):
+    """(Re)index one item from its document text. Does not commit."""
+    await remove_item(db, item_id)
+    counts = await tokenize_async(text)
+    if not counts:
+        return
+    await db.execute(
+        insert_ignore(db, models.SearchPosting.__table__),
+        [{"user_id": user_id, "token": token, "item_id": item_id, "tf": tf} for token, tf in counts.items()],
+    )
+    length = sum(counts.values())
+    await db.execute(insert(models.SearchDoc), [{"item_id": item_id, "user_id": user_id, "length": length}])
+    await _adjust_stats(db, user_id, 1, length)
+
+
+async def search(db: AsyncSession, user_id: int, q: str, skip: int = 0, limit: int = 10) -> List[int]:
+    """Return item ids of the user's items matching q, best BM25 score first."""
+    terms = list(await tokenize_async(q))
+    if not terms:
+        return []
+    stats = (await db.execute(
+        select(models.SearchStats.doc_count, models.SearchStats.total_length).where(models.SearchStats.user_id == user_id)
+    )).first()
+    if not stats or stats.doc_count <= 0:
+        return []
+    n_docs = stats.doc_count
+    avgdl = stats.total_length / n_docs or 1.0
+
+    P, D = models.SearchPosting, models.SearchDoc
+    # document frequencies first: a count over the primary key, no postings are read
+    df = dict((await db.execute(
+        select(P.token, func.count()).where(P.user_id == user_id, P.token.in_(terms)).group_by(P.token)
+    )).all())
+    if not df:
+        return []
+    # terms in more than SEARCH_MAX_DF_RATIO of the documents barely move BM25 but
+    # cost the most postings: skip them, unless every term is that common
+    by_df = sorted(df, key=lambda t: (df[t], t))
+    kept = by_df
+    if n_docs >= MIN_DOCS_FOR_CUTOFF:
+        kept = [t for t in by_df if df[t] <= n_docs * settings.SEARCH_MAX_DF_RATIO] or by_df[:1]
+    # rarest first, within SEARCH_MAX_POSTINGS postings per query
+    budget = settings.SEARCH_MAX_POSTINGS
+    selected = []
+    for t in kept:
+        if selected and df[t] > budget:
+            break
+        selected.append(t)
+        budget -= df[t]
+
+    stmt = (
+        select(P.item_id, P.token, P.tf, D.length)
+        .join(D, D.item_id == P.item_id)
+        .where(P.user_id == user_id, P.token.in_(selected))
+    )
+    if budget < 0:
+        # a single term with more postings than the budget: its highest tf only
+        stmt = stmt.order_by(P.tf.desc()).limit(settings.SEARCH_MAX_POSTINGS)
+    rows = (await db.execute(stmt)).all()
+
+    idf = {t: math.log(1 + (n_docs - df[t] + 0.5) / (df[t] + 0.5)) for t in selected}
+    scores = Counter()
+    for r in rows:
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * r.length / avgdl)
+        scores[r.item_id] += idf[r.token] * r.tf * (BM25_K1 + 1) / (r.tf + norm)
+    ranked = sorted(scores.items(), key=lambda kv: (-kv[1], -kv[0]))
+    return [item_id for item_id, _ in ranked[skip:skip + limit]]
+
+
+async def rebuild(db: AsyncSession, user_id: Optional[int] = None, batch_size: int = 500) -> int:
+    """Rebuild the index from knowledge_items (all users, or one). Returns the number of items indexed."""
+    for model in (models.SearchPosting, models.SearchDoc, models.SearchStats):
+        stmt = delete(model)
+        if user_id is not None:
+            stmt = stmt.where(model.user_id == user_id)
+        await db.execute(stmt)
+    await db.commit()
+
+    indexed = 0
+    last_id = 0
+    while True:
+        stmt = (
+            select(models.KnowledgeItem)
+            .options(selectinload(models.KnowledgeItem.tags))
+            .where(models.KnowledgeItem.id > last_id)
+            .order_by(models.KnowledgeItem.id)
+            .limit(batch_size)
+        )
+        if user_id is not None:
+            stmt = stmt.where(models.KnowledgeItem.user_id == user_id)
+        items = (await db.execute(stmt)).scalars().all()
+        if not items:
+            break
+        for item in items:
+            text = document_text(item.title, item.description, item.summary, (t.name for t in item.tags))
+            await index_item(db, item.id, item.user_id, text)
+        await db.commit()
+        db.expunge_all()
+        indexed += len(items)
+        last_id = items[-1].id
+    return indexed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the knowledge search index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_rebuild = sub.add_parser("rebuild", help="backfill the index from existing items")
+    p_rebuild.add_argument("--user-id", type=int, default=None)
+    p_rebuild.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    from .database import AsyncSessionLocal, Base, engine
+
+    async def _run():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with AsyncSessionLocal() as db:
+            count = await rebuild(db, user_id=args.user_id, batch_size=args.batch_size)
+        await engine.dispose()
+        print(f"Indexed {count} items.")
+
+    asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Status state machine for knowledge items.
+
+Every transition is one guarded UPDATE:
+
+    UPDATE knowledge_items SET status=:to, version=version+1, ...
+    WHERE id=:id AND status=:from [AND version=:expected]
+
+so of two workers (or a worker and a user edit) racing on the same item exactly
+one wins, and the loser finds out from the row count without loading the row.
+A redelivered extraction task, for example, fails the pending -> processing
+transition and returns immediately. When several source statuses are allowed,
+the row's status is read under its row lock first (the counters need to know
+which one it left), then the same single UPDATE runs.
+
+Callers pass the owner's user_id when they know it; otherwise it costs one
+more SELECT. Entering processing stamps processing_started_at: an item left in
+processing longer than PROCESSING_TIMEOUT (its worker died) is reclaimed by
+crud.reclaim_stale_processing or a reprocess request.
+
+`version` is bumped by every transition; callers that read an item and want
+to write it back only if nothing changed in between pass it as `version`.
+
+transition() adjusts the per-user counters in the same transaction and does
+not commit.
+"""
+from datetime import datetime, timezone
+from typing import Dict, NamedTuple, Optional, Sequence
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import counters, models
+
+# target status -> statuses it may be entered from
+ALLOWED: Dict[str, Sequence[str]] = {
+    "pending": ("done", "failed"),
+    "processing": ("pending",),
+    "done": ("processing",),
+    "failed": ("processing", "pending"),
+}
+
+
+class Transition(NamedTuple):
+    item_id: int
+    user_id: int
+    previous: str
+    status: str
+
+
+async def transition(
+    db: AsyncSession,
+    item_id: int,
+    to_status: str,
+    from_statuses: Optional[Sequence[str]] = None,
+    *,
+    user_id: Optional[int] = None,
+    version: Optional[int] = None,
+    values: Optional[dict] = None,
+) -> Optional[Transition]:
+    """Move the item to to_status if it is in one of from_statuses (default ALLOWED[to_status]).
+
+    `values` are extra columns written by the same UPDATE. Returns the Transition
+    if this call won, None if the item is missing, in another status or (with
+    `version`) was changed since that version was read.
+    """
+    table = models.KnowledgeItem.__table__
+    sources = list(from_statuses or ALLOWED[to_status])
+    values = dict(values or {})
+    if to_status == "processing":
+        values.setdefault("processing_started_at", datetime.now(timezone.utc))
+    if len(sources) == 1:
+        previous = sources[0]
+    else:
+        row = (await db.execute(
+            select(table.c.status, table.c.user_id)
+            .where(table.c.id == item_id, table.c.status.in_(sources))
+            .with_for_update()
+        )).first()
+        if row is None:
+            return None
+        previous = row.status
+        user_id = row.user_id if user_id is None else user_id
+    stmt = (
+        update(table)
+        .where(table.c.id == item_id, table.c.status == previous)
+        .values(status=to_status, version=table.c.version + 1, **values)
+    )
+    if version is not None:
+        stmt = stmt.where(table.c.version == version)
+    if (await db.execute(stmt)).rowcount != 1:
+        return None
+    if user_id is None:
+        user_id = (await db.execute(select(table.c.user_id).where(table.c.id == item_id))).scalar_one()
+    await counters.move(db, user_id, previous, to_status)
+    return Transition(item_id, user_id, previous, to_status)
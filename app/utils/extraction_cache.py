@@ -0,0 +1,137 @@
+"""Content-addressed cache of LLM extraction results.
+
+Key: sha256 of the normalized text + OPENAI_MODEL + prompt version, where the
+prompt version combines EXTRACT_PROMPT_VERSION with a hash of the system
+prompts, so editing the prompt (or bumping the setting) invalidates old entries.
+
+Two levels: a small in-process LRU (L1) in front of Redis (L2, entries expire
+after EXTRACTION_CACHE_TTL). Only LLM results are cached; local fallbacks are
+cheap and should be retried with the LLM next time. Redis errors count as misses.
+
+    python -m app.utils.extraction_cache stats
+    python -m app.utils.extraction_cache clear
+"""
+import argparse
+import hashlib
+import json
+import logging
+import unicodedata
+
+import redis
+
+from app.core.config import settings
+from app.utils.cache import LRUCache
+from app.utils.extractor_async import PROMPTS
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "extract_cache:"
+STATS_KEY = "extract_cache_stats"
+
+_l1 = LRUCache(maxsize=settings.EXTRACTION_CACHE_L1_SIZE)
+_redis = None
+# in-process counters; Redis keeps the cluster-wide totals under STATS_KEY
+local_stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0}
+
+
+def _client():
+    global _redis
+    if _redis is None:
+        _redis = redis.from_url(settings.EXTRACTION_CACHE_REDIS_URL or settings.CELERY_BROKER_URL, decode_responses=True)
+    return _redis
+
+
+def prompt_version() -> str:
+    digest = hashlib.sha1("".join(PROMPTS).encode("utf-8")).hexdigest()[:8]
+    return f"{settings.EXTRACT_PROMPT_VERSION}-{digest}"
+
+
+def normalize(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text or "").split())
+
+
+def cache_key(text: str) -> str:
+    digest = hashlib.sha256(normalize(text).encode("utf-8")).hexdigest()
+    return f"{KEY_PREFIX}{settings.OPENAI_MODEL}:{prompt_version()}:{digest}"
+
+
+def _count(field: str):
+    local_stats[field] += 1
+    try:
+        _client().hincrby(STATS_KEY, field, 1)
+    except redis.RedisError:
+        pass
+
+
+def get(text: str):
+    """Return the cached extraction dict for text, or None."""
+    if not settings.EXTRACTION_CACHE_ENABLED:
+        return None
+    key = cache_key(text)
+    result = _l1.get(key)
+    if result is not None:
+        _count("l1_hits")
+        return dict(result)
+    try:
+        raw = _client().get(key)
+    except redis.RedisError as e:
+        logger.warning("Extraction cache read failed: %s", e)
+        raw = None
+    if raw is None:
+        _count("misses")
+        return None
+    result = json.loads(raw)
+    _l1.set(key, result)
+    _count("l2_hits")
+    return dict(result)
+
+
+def put(text: str, result: dict):
+    """Store an extraction result (LLM results only)."""
+    if not settings.EXTRACTION_CACHE_ENABLED or not result or result.get("source") != "llm":
+        return
+    key = cache_key(text)
+    _l1.set(key, result)
+    try:
+        _client().set(key, json.dumps(result, ensure_ascii=False), ex=settings.EXTRACTION_CACHE_TTL)
+    except redis.RedisError as e:
+        logger.warning("Extraction cache write failed: %s", e)
+
+
+def invalidate(all_versions: bool = True) -> int:
+    """Delete cached entries (all of them, or only the current model/prompt version). Returns keys removed."""
+    _l1.clear()
+    pattern = f"{KEY_PREFIX}*" if all_versions else f"{KEY_PREFIX}{settings.OPENAI_MODEL}:{prompt_version()}:*"
+    client = _client()
+    removed = 0
+    batch = []
+    for key in client.scan_iter(match=pattern, count=1000):
+        batch.append(key)
+        if len(batch) >= 1000:
+            removed += client.delete(*batch)
+            batch = []
+    if batch:
+        removed += client.delete(*batch)
+    return removed
+
+
+def stats() -> dict:
+    totals = {k: int(v) for k, v in _client().hgetall(STATS_KEY).items()}
+    return {"process": dict(local_stats), "total": totals, "prompt_version": prompt_version()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the extraction result cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="show hit/miss counters")
+    p_clear = sub.add_parser("clear", help="delete cached results")
+    p_clear.add_argument("--current-only", action="store_true", help="only the current model/prompt version")
+    args = parser.parse_args()
+    if args.command == "stats":
+        print(json.dumps(stats(), indent=2))
+    else:
+        print(f"Removed {invalidate(all_versions=not args.current_only)} entries.")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,20 +3,67 @@ import re
 import logging
 import traceback
 import asyncio
+import functools
+import time
 
 import jieba.analyse
 import openai
 
+from app import metrics
 from app.core.config import settings
+from app.utils.jieba_preload import configure_jieba
+from app.utils.llm_scheduler import get_scheduler
+
+configure_jieba()
 
 logger = logging.getLogger(__name__)
 
 
-asyncClient = openai.AsyncOpenAI(
-    api_key = settings.OPENAI_API_KEY,
-    base_url = settings.OPENAI_BASE_URL
-)
-# configure openai
+# The AsyncOpenAI client (and its HTTP connection pool) is created lazily so
+# that each Celery worker process builds its own after fork and reuses it
+# across tasks; see app.celery_task.worker.
+_async_client = None
+
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = openai.AsyncOpenAI(
+            api_key = settings.OPENAI_API_KEY,
+            base_url = settings.OPENAI_BASE_URL,
+            max_retries = 0,  # retries/backoff are done by the LLM scheduler
+        )
+    return _async_client
+
+
+async def _chat(system_prompt: str, user_prompt: str, max_tokens: int):
+    """One chat completion through the shared LLM scheduler; returns the message content."""
+    async def _call():
+        return await get_async_client().chat.completions.create(
+            model=settings.OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            temperature=0.0,
+            max_tokens=max_tokens,
+        )
+    tokens = estimate_tokens(system_prompt) + estimate_tokens(user_prompt) + max_tokens
+    resp = await get_scheduler().run(_call, tokens=tokens)
+    return resp.choices[0].message.content
+
+
+def reset_async_client():
+    """Forget the current client without closing it (used after fork)."""
+    global _async_client
+    _async_client = None
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        client, _async_client = _async_client, None
+        await client.close()
 
 def split_sentences(text):
     sentences = re.split(r'(?<=[。！？\?\!\n])\s*', text.strip())
@@ -49,6 +96,48 @@ def local_extract(text: str):
         "status": "done",
     }
 
+def _timed(source: str, outcome):
+    """Record extraction_duration_seconds{source, outcome} around an async extractor.
+
+    outcome(result) names the outcome; returning None skips the observation
+    (e.g. the LLM is not configured). Exceptions count as "error".
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            label = "error"
+            try:
+                result = await fn(*args, **kwargs)
+                label = outcome(result)
+                return result
+            finally:
+                if label is not None:
+                    metrics.extraction_seconds.observe(time.perf_counter() - start, source=source, outcome=label)
+        return wrapper
+    return decorator
+
+
+def _llm_outcome(result):
+    if not settings.OPENAI_API_KEY:
+        return None
+    if result is None:
+        return "error"
+    return "unparsed" if result.get("parsed", True) is None else "ok"
+
+
+def _batch_outcome(result):
+    if not settings.OPENAI_API_KEY:
+        return None
+    return "ok" if result else "error"
+
+
+@_timed("local", lambda result: "ok")
+async def local_extract_async(text: str):
+    """local_extract via the local extraction engine, without blocking the event loop."""
+    from app.utils.local_engine import get_engine
+    return (await get_engine().extract_many_async([text]))[0]
+
 def _extract_json_from_text(text):
     m = re.search(r'(\{.*\})', text, flags=re.DOTALL)
     if not m:
@@ -63,6 +152,76 @@ def _extract_json_from_text(text):
         except Exception:
             return None
 
+SYSTEM_PROMPT = (
+    "You are a helpful assistant that extracts structured metadata from a user-provided text. "
+    "Given an input text, produce a JSON object with exactly these keys: title, tags, description, summary, confidence (optional). "
+    "title: a concise title (string). "
+    "tags: an array of short tag strings (can be empty). "
+    "description: a one-sentence short description (<=120 chars). "
+    "summary: a short summary (a few sentences). "
+    "confidence: optional string or number representing confidence. "
+    "Output ONLY a valid JSON object and nothing else."
+)
+
+BATCH_SYSTEM_PROMPT = (
+    "You are a helpful assistant that extracts structured metadata from several user-provided texts. "
+    "Each text is given with its numeric id. For every text produce one JSON object with exactly these keys: "
+    "id, title, tags, description, summary, confidence (optional). "
+    "id: the id of the text (integer). "
+    "title: a concise title (string). "
+    "tags: an array of short tag strings (can be empty). "
+    "description: a one-sentence short description (<=120 chars). "
+    "summary: a short summary (a few sentences). "
+    "confidence: optional string or number representing confidence. "
+    "Output ONLY a valid JSON array of these objects and nothing else."
+)
+
+
+REDUCE_SYSTEM_PROMPT = (
+    "You are a helpful assistant that merges partial metadata extracted from consecutive chunks of one long document. "
+    "Given the per-chunk titles, tags and summaries in order, produce a JSON object for the whole document with exactly these keys: "
+    "title, tags, description, summary, confidence (optional). "
+    "title: a concise title (string). "
+    "tags: an array of at most 8 short tag strings, the most representative ones. "
+    "description: a one-sentence short description (<=120 chars). "
+    "summary: a short summary of the whole document (a few sentences). "
+    "confidence: optional string or number representing confidence. "
+    "Output ONLY a valid JSON object and nothing else."
+)
+
+# every prompt whose wording affects results (see app/utils/extraction_cache.py)
+PROMPTS = (SYSTEM_PROMPT, BATCH_SYSTEM_PROMPT, REDUCE_SYSTEM_PROMPT)
+
+def _normalize_llm_result(data: dict, content: str):
+    title = data.get("title", "").strip()
+    tags = data.get("tags", []) or []
+    if isinstance(tags, str):
+        tags = [t.strip() for t in re.split(r'[,\s;，；]+', tags) if t.strip()]
+    tags = [str(t) for t in tags if str(t).strip()]
+    description = data.get("description", "").strip()
+    summary = data.get("summary", "").strip()
+    confidence = data.get("confidence")
+    return {
+        "title": title,
+        "tags": tags,
+        "description": description,
+        "summary": summary,
+        "llm_raw": content,
+        "confidence": str(confidence) if confidence is not None else None,
+        "source": "llm",
+        "status": "done",
+    }
+
+def _extract_json_array_from_text(text):
+    m = re.search(r'(\[.*\])', text, flags=re.DOTALL)
+    if not m:
+        return None
+    try:
+        return json.loads(m.group(1))
+    except Exception:
+        return None
+
+@_timed("llm", _llm_outcome)
 async def call_openai_async(text: str):
     """
     异步调用 OpenAI ChatCompletion（acreate），期望返回可解析 JSON：
@@ -78,34 +237,10 @@ async def call_openai_async(text: str):
     if not settings.OPENAI_API_KEY:
         return None
 
-    system_prompt = (
-        "You are a helpful assistant that extracts structured metadata from a user-provided text. "
-        "Given an input text, produce a JSON object with exactly these keys: title, tags, description, summary, confidence (optional). "
-        "title: a concise title (string). "
-        "tags: an array of short tag strings (can be empty). "
-        "description: a one-sentence short description (<=120 chars). "
-        "summary: a short summary (a few sentences). "
-        "confidence: optional string or number representing confidence. "
-        "Output ONLY a valid JSON object and nothing else."
-    )
-
     user_prompt = f"Text:\n\"\"\"\n{text}\n\"\"\"\n\nReturn the JSON."
 
     try:
-        # use the async create method
-        resp = await asyncClient.chat.completions.create(
-            model=settings.OPENAI_MODEL,  # 或其他支持的模型
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-           temperature=0.0,
-           max_tokens=800
-        )
-        # obtain content
-        choice = resp.choices[0]
-        # Chat API returns message content
-        content = choice.message.content
+        content = await _chat(SYSTEM_PROMPT, user_prompt, 800)
 
         if not content:
             return None
@@ -120,42 +255,194 @@ async def call_openai_async(text: str):
             logger.warning("OpenAI response could not be parsed as JSON: %s", content[:500])
             return {"llm_raw": content, "parsed": None}
 
-        # Normalize fields
-        title = data.get("title", "").strip()
-        tags = data.get("tags", []) or []
-        if isinstance(tags, str):
-            tags = [t.strip() for t in re.split(r'[,\s;，；]+', tags) if t.strip()]
-        tags = [str(t) for t in tags if str(t).strip()]
-        description = data.get("description", "").strip()
-        summary = data.get("summary", "").strip()
-        confidence = data.get("confidence")
-        return {
-            "title": title,
-            "tags": tags,
-            "description": description,
-            "summary": summary,
-            "llm_raw": content,
-            "confidence": str(confidence) if confidence is not None else None,
-            "source": "llm",
-            "status": "done",
-        }
+        return _normalize_llm_result(data, content)
     except Exception as e:
         logger.error("OpenAI async call failed: %s\n%s", e, traceback.format_exc())
         return None
 
+_cjk_re = re.compile(r'[\u3000-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~1 token per CJK character, ~4 characters per token otherwise."""
+    cjk = len(_cjk_re.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def chunk_text(text: str, max_tokens: int, max_chunks: int = 0):
+    """Split text into chunks of whole sentences (split_sentences), each within max_tokens.
+
+    A single sentence over the budget is cut into pieces of max_tokens characters.
+    With max_chunks > 0 a longer text is sampled down to max_chunks chunks spread
+    evenly over it, always keeping the first and the last.
+    """
+    chunks, current, current_tokens = [], [], 0
+    for sent in split_sentences(text):
+        n = estimate_tokens(sent)
+        if n > max_tokens:
+            pieces = [sent[i:i + max_tokens] for i in range(0, len(sent), max_tokens)]
+        else:
+            pieces = [sent]
+        for piece in pieces:
+            n = estimate_tokens(piece)
+            if current and current_tokens + n > max_tokens:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += n
+    if current:
+        chunks.append(" ".join(current))
+    if 0 < max_chunks < len(chunks):
+        if max_chunks == 1:
+            return chunks[:1]
+        step = (len(chunks) - 1) / (max_chunks - 1)
+        chunks = [chunks[round(i * step)] for i in range(max_chunks)]
+    return chunks
+
+def _merge_chunk_results(parts):
+    """Local reduce used when the reduce call fails: first title, most frequent tags, joined summaries."""
+    tag_counts = {}
+    for p in parts:
+        for t in p["tags"]:
+            tag_counts[t] = tag_counts.get(t, 0) + 1
+    tags = sorted(tag_counts, key=lambda t: -tag_counts[t])[:8]
+    summary = " ".join(p["summary"] for p in parts if p["summary"])
+    return {
+        "title": parts[0]["title"],
+        "tags": tags,
+        "description": parts[0]["description"],
+        "summary": summary[:2000],
+        "confidence": None,
+    }
+
+@_timed("llm_long", lambda result: "error" if result is None else "ok")
+async def extract_long_document_async(text: str):
+    """
+    长文档 map-reduce 提取：按句子切分为不超过 LONG_DOC_CHUNK_TOKENS 的块，
+    超过 LONG_DOC_MAX_CHUNKS 块时均匀抽样（保留首尾），
+    在 LONG_DOC_CONCURRENCY 限制下并发提取每块，再合并为整篇的 title/tags/summary。
+    所有块都失败时返回 None（由调用方回退到本地提取）。
+    """
+    chunks = chunk_text(text, settings.LONG_DOC_CHUNK_TOKENS, settings.LONG_DOC_MAX_CHUNKS)
+    sem = asyncio.Semaphore(settings.LONG_DOC_CONCURRENCY)
+
+    async def _map(chunk):
+        async with sem:
+            return await call_openai_async(chunk)
+
+    mapped = await asyncio.gather(*(_map(c) for c in chunks))
+    parts = [m for m in mapped if m and m.get("parsed", True) is not None and "title" in m]
+    if not parts:
+        return None
+
+    digest = "\n\n".join(
+        f"Chunk {i + 1}:\ntitle: {p['title']}\ntags: {', '.join(p['tags'])}\nsummary: {p['summary']}"
+        for i, p in enumerate(parts)
+    )
+    content = None
+    try:
+        content = await _chat(REDUCE_SYSTEM_PROMPT, f"{digest}\n\nReturn the JSON.", 800)
+        data = None
+        if content:
+            try:
+                data = json.loads(content)
+            except Exception:
+                data = _extract_json_from_text(content)
+        merged = _normalize_llm_result(data, content) if data else None
+    except Exception as e:
+        logger.error("OpenAI reduce call failed: %s\n%s", e, traceback.format_exc())
+        merged = None
+    if merged is None:
+        merged = dict(_merge_chunk_results(parts), source="llm", status="done")
+    merged["llm_raw"] = json.dumps(
+        {"chunks": [p["llm_raw"] for p in parts], "reduce": content}, ensure_ascii=False
+    )
+    return merged
+
 async def extract_from_text_async(text: str):
     """
     异步提取入口，优先调用 OpenAI 异步接口，失败回退到本地。
+    超过 LONG_DOC_THRESHOLD_TOKENS 的长文档走 map-reduce（extract_long_document_async）。
     """
     text = (text or "").strip()
     if not text:
         return local_extract(text)
 
+    if settings.OPENAI_API_KEY and estimate_tokens(text) > settings.LONG_DOC_THRESHOLD_TOKENS:
+        result = await extract_long_document_async(text)
+        return result if result is not None else await local_extract_async(text)
+
     result = await call_openai_async(text)
     if result is None:
         # openai call failed entirely
-        return local_extract(text)
+        return await local_extract_async(text)
     # If result contains parsed==None but llm_raw exists, treat as failure -> fallback
     if "parsed" in result and result.get("parsed") is None:
-        return local_extract(text)
-    return result
\ No newline at end of file
+        return await local_extract_async(text)
+    return result
+
+@_timed("llm_batch", _batch_outcome)
+async def call_openai_batch_async(texts: dict):
+    """
+    一次请求提取多条文本。texts 为 {item_id: text}，期望模型返回 JSON 数组：
+    [{"id": 1, "title": "...", "tags": [...], "description": "...", "summary": "..."}, ...]
+    返回 {item_id: result}，只包含成功解析的条目；整体失败时返回空 dict。
+    """
+    if not settings.OPENAI_API_KEY or not texts:
+        return {}
+
+    parts = [f"Item id={item_id}:\n\"\"\"\n{text}\n\"\"\"" for item_id, text in texts.items()]
+    user_prompt = "\n\n".join(parts) + "\n\nReturn the JSON array."
+
+    # ~800 output tokens per item, within the model's output limit (a reply cut
+    # short does not parse and the items fall back to single extraction)
+    max_tokens = min(800 * len(texts), settings.LLM_MAX_OUTPUT_TOKENS)
+    try:
+        content = await _chat(BATCH_SYSTEM_PROMPT, user_prompt, max_tokens)
+    except Exception as e:
+        logger.error("OpenAI async batch call failed: %s\n%s", e, traceback.format_exc())
+        return {}
+    if not content:
+        return {}
+
+    try:
+        data = json.loads(content)
+    except Exception:
+        data = _extract_json_array_from_text(content)
+    # some models wrap the array in an object, e.g. {"items": [...]}
+    if isinstance(data, dict):
+        data = next((v for v in data.values() if isinstance(v, list)), None)
+    if not isinstance(data, list):
+        logger.warning("OpenAI batch response could not be parsed as a JSON array: %s", content[:500])
+        return {}
+
+    results = {}
+    for entry in data:
+        try:
+            item_id = int(entry.get("id"))
+            if item_id not in texts:
+                continue
+            results[item_id] = _normalize_llm_result(entry, json.dumps(entry, ensure_ascii=False))
+        except Exception:
+            # 单条解析失败：交给逐条回退
+            continue
+    return results
+
+async def extract_batch_async(texts: dict):
+    """
+    批量提取入口：一次模型调用处理多条文本，缺失或解析失败的条目逐条回退到
+    extract_from_text_async。超过 LONG_DOC_THRESHOLD_TOKENS 的长文档不进批量请求，
+    直接逐条走 map-reduce。返回 {item_id: result}，顺序与 texts 一致。
+    """
+    texts = {item_id: (text or "").strip() for item_id, text in texts.items()}
+    if not settings.OPENAI_API_KEY:
+        # no LLM configured: extract the whole batch locally across the process pool
+        from app.utils.local_engine import get_engine
+        local = await get_engine().extract_many_async(list(texts.values()))
+        return dict(zip(texts, local))
+    batch = {k: v for k, v in texts.items() if v and estimate_tokens(v) <= settings.LONG_DOC_THRESHOLD_TOKENS}
+    results = await call_openai_batch_async(batch)
+    # long documents and whatever the batch reply missed: one by one (long ones map-reduce)
+    missing = [item_id for item_id in texts if item_id not in results]
+    if missing:
+        fallbacks = await asyncio.gather(*(extract_from_text_async(texts[i]) for i in missing))
+        results.update(zip(missing, fallbacks))
+    return {item_id: results[item_id] for item_id in texts}
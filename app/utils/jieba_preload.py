@@ -0,0 +1,59 @@
+"""jieba loading: persistent dictionary cache and pre-fork warm-up.
+
+Building jieba's prefix dictionary takes about a second and tens of MB. jieba
+already serializes the built dictionary (marshal) to a cache file and reloads it
+on later starts; configure_jieba() points that cache at JIEBA_CACHE_DIR so it
+survives restarts and can be baked into the image:
+
+    python -m app.utils.jieba_preload
+
+preload() loads the dictionary and the TF-IDF model and then freezes the
+garbage collector's view of them, so that prefork children created afterwards
+share those pages copy-on-write instead of each rebuilding them.
+"""
+import gc
+import logging
+import os
+import time
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = "jieba.cache"
+
+_configured = False
+
+
+def configure_jieba():
+    """Import jieba with the dictionary cache pointed at JIEBA_CACHE_DIR; returns the module."""
+    global _configured
+    import jieba
+    if not _configured:
+        if settings.JIEBA_CACHE_DIR:
+            os.makedirs(settings.JIEBA_CACHE_DIR, exist_ok=True)
+            jieba.dt.tmp_dir = settings.JIEBA_CACHE_DIR
+            jieba.dt.cache_file = CACHE_FILE
+        jieba.setLogLevel(logging.WARNING)
+        _configured = True
+    return jieba
+
+
+def preload() -> float:
+    """Load the jieba dictionary and TF-IDF model now. Returns seconds spent."""
+    start = time.perf_counter()
+    jieba = configure_jieba()
+    jieba.initialize()
+    import jieba.analyse  # builds the default TF-IDF model (IDF table)
+    jieba.analyse.extract_tags("预热", topK=1)
+    elapsed = time.perf_counter() - start
+    # move everything allocated so far out of GC tracking, so collections in the
+    # children don't write to (and un-share) these pages
+    gc.freeze()
+    logger.info("jieba preloaded in %.2fs", elapsed)
+    return elapsed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"jieba dictionary built/loaded in {preload():.2f}s (cache dir: {settings.JIEBA_CACHE_DIR or 'system temp'})")
@@ -0,0 +1,209 @@
+"""Shared scheduler for LLM calls: rate limits, adaptive concurrency and retries.
+
+Every chat completion in a worker process goes through one LLMScheduler:
+
+* token buckets on requests/minute and tokens/minute (LLM_REQUESTS_PER_MINUTE,
+  LLM_TOKENS_PER_MINUTE); with LLM_RATE_LIMIT_REDIS the buckets live in Redis
+  so all workers share one budget;
+* an AIMD concurrency limit: +1/limit per fast success, halved on a 429 or
+  when latency exceeds LLM_LATENCY_TARGET;
+* retries of 429 / timeouts / connection errors / 5xx with exponential backoff
+  and jitter, honouring the provider's Retry-After header.
+
+benchmarks/llm_stub.py is an OpenAI-compatible stub that injects 429s and
+latency, for exercising this against OPENAI_BASE_URL.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Optional
+
+import openai
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Reserve `cost` from a bucket refilled at `rate` per second up to `capacity`.
+# The balance may go negative; the caller waits until it would be back at zero.
+# Returns the wait in seconds (as a string, Lua numbers are truncated otherwise).
+_REDIS_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or capacity
+local ts = tonumber(data[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate) - cost
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], 3600)
+if tokens >= 0 then return '0' end
+return tostring(-tokens / rate)
+"""
+
+
+class TokenBucket:
+    """In-process bucket with the same reserve-then-wait semantics as the Redis one."""
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.ts = time.monotonic()
+
+    async def reserve(self, cost: float) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate) - cost
+        self.ts = now
+        return max(0.0, -self.tokens / self.rate)
+
+
+class RedisTokenBucket:
+    def __init__(self, key: str, per_minute: int):
+        self.key = key
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self._script = None
+
+    async def reserve(self, cost: float) -> float:
+        if self._script is None:
+            import redis.asyncio as aioredis
+            client = aioredis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+            self._script = client.register_script(_REDIS_BUCKET_LUA)
+        try:
+            return float(await self._script(keys=[self.key], args=[self.rate, self.capacity, cost]))
+        except Exception as e:
+            logger.warning("Shared LLM rate limiter unavailable, not limiting: %s", e)
+            return 0.0
+
+
+class AIMDLimiter:
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_target: float):
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._cond: Optional[asyncio.Condition] = None
+
+    def _condition(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self):
+        cond = self._condition()
+        async with cond:
+            while self.in_flight >= int(self.limit):
+                await cond.wait()
+            self.in_flight += 1
+
+    async def release(self, latency: Optional[float], throttled: bool = False):
+        cond = self._condition()
+        async with cond:
+            self.in_flight -= 1
+            if throttled or (latency is not None and latency > self.latency_target):
+                self.limit = max(self.minimum, self.limit / 2)
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            cond.notify_all()
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code >= 500
+
+
+class LLMScheduler:
+    def __init__(self):
+        if settings.LLM_RATE_LIMIT_REDIS:
+            make = lambda name, n: RedisTokenBucket(f"llm_bucket:{settings.OPENAI_MODEL}:{name}", n)
+        else:
+            make = lambda name, n: TokenBucket(n)
+        self.request_bucket = make("requests", settings.LLM_REQUESTS_PER_MINUTE) if settings.LLM_REQUESTS_PER_MINUTE > 0 else None
+        self.token_bucket = make("tokens", settings.LLM_TOKENS_PER_MINUTE) if settings.LLM_TOKENS_PER_MINUTE > 0 else None
+        self.limiter = AIMDLimiter(
+            settings.LLM_INITIAL_CONCURRENCY, 1, settings.LLM_MAX_CONCURRENCY, settings.LLM_LATENCY_TARGET
+        )
+        self.counters = {"requests": 0, "throttled": 0, "retries": 0, "failures": 0, "rate_limited_wait_seconds": 0.0}
+
+    def stats(self) -> dict:
+        return dict(self.counters, concurrency_limit=self.limiter.limit, in_flight=self.limiter.in_flight)
+
+    async def _wait_for_budget(self, tokens: int):
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = max(wait, await self.request_bucket.reserve(1))
+        if self.token_bucket is not None:
+            wait = max(wait, await self.token_bucket.reserve(tokens))
+        if wait > 0:
+            self.counters["rate_limited_wait_seconds"] += wait
+            await asyncio.sleep(wait)
+
+    async def run(self, call: Callable[[], Awaitable], tokens: int = 0):
+        """Run `call` (a zero-argument coroutine factory) under the limits, retrying transient errors."""
+        attempt = 0
+        while True:
+            await self._wait_for_budget(tokens)
+            await self.limiter.acquire()
+            self.counters["requests"] += 1
+            start = time.perf_counter()
+            latency, throttled, error = None, False, None
+            try:
+                result = await call()
+                latency = time.perf_counter() - start
+            except Exception as e:
+                error = e
+                throttled = isinstance(e, openai.RateLimitError)
+                if throttled:
+                    latency = time.perf_counter() - start
+            finally:
+                # also on cancellation (no latency: not an AIMD signal), so the slot is never leaked
+                await self.limiter.release(latency, throttled)
+            if error is None:
+                return result
+            self.counters["throttled"] += throttled
+            if not _is_retryable(error) or attempt >= settings.LLM_MAX_RETRIES:
+                self.counters["failures"] += 1
+                raise error
+            delay = _retry_after(error)
+            if delay is None:
+                delay = settings.LLM_BACKOFF_BASE * (2 ** attempt)
+            delay = min(settings.LLM_BACKOFF_MAX, delay) * random.uniform(1.0, 1.25)
+            attempt += 1
+            self.counters["retries"] += 1
+            logger.info("LLM call failed (%s), retry %s in %.1fs", type(error).__name__, attempt, delay)
+            await asyncio.sleep(delay)
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler()
+    return _scheduler
+
+
+def reset_scheduler():
+    """Drop the per-process scheduler (after fork, or to pick up changed settings)."""
+    global _scheduler
+    _scheduler = None
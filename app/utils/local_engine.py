@@ -0,0 +1,87 @@
+"""Process-pool engine for local (jieba) extraction.
+
+local_extract is pure-Python CPU work; run inline it blocks the event loop
+and caps throughput at one core per worker process. LocalExtractionEngine
+spreads a batch of texts over a ProcessPoolExecutor in chunks and returns
+the results in input order. With LOCAL_EXTRACT_WORKERS=0 it runs in a
+thread instead, which keeps the loop responsive without extra processes.
+
+The pool is created lazily; on Linux its processes are forked from the
+current one and so inherit an already-loaded jieba dictionary.
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from app.core.config import settings
+from app.utils.extractor_async import local_extract
+
+
+def _extract_chunk(texts: List[str]) -> List[dict]:
+    return [local_extract(text) for text in texts]
+
+
+class LocalExtractionEngine:
+    def __init__(self, workers: int, chunksize: int = 16):
+        self.workers = workers
+        self.chunksize = max(1, chunksize)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _chunks(self, texts: List[str]) -> List[List[str]]:
+        return [texts[i:i + self.chunksize] for i in range(0, len(texts), self.chunksize)]
+
+    def extract_many(self, texts: List[str]) -> List[dict]:
+        """Blocking variant, for scripts and benchmarks."""
+        texts = list(texts)
+        if self.workers <= 0:
+            return _extract_chunk(texts)
+        results = []
+        for chunk in self._pool().map(_extract_chunk, self._chunks(texts)):
+            results.extend(chunk)
+        return results
+
+    async def extract_many_async(self, texts: List[str]) -> List[dict]:
+        """Extract a batch without blocking the running event loop; results are in input order."""
+        texts = list(texts)
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        if self.workers <= 0:
+            return await loop.run_in_executor(None, _extract_chunk, texts)
+        chunks = await asyncio.gather(*(
+            loop.run_in_executor(self._pool(), _extract_chunk, chunk) for chunk in self._chunks(texts)
+        ))
+        return [result for chunk in chunks for result in chunk]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+_engine: Optional[LocalExtractionEngine] = None
+
+
+def get_engine() -> LocalExtractionEngine:
+    global _engine
+    if _engine is None:
+        _engine = LocalExtractionEngine(settings.LOCAL_EXTRACT_WORKERS, settings.LOCAL_EXTRACT_CHUNKSIZE)
+    return _engine
+
+
+def reset_engine():
+    """Forget the engine without shutting its pool down (used after fork)."""
+    global _engine
+    _engine = None
+
+
+def shutdown_engine():
+    global _engine
+    if _engine is not None:
+        _engine.shutdown()
+        _engine = None
@@ -0,0 +1,121 @@
+"""Per-process WebSocket fan-out of Redis pub/sub events.
+
+One subscriber task per web process reads REDIS_PUBSUB_CHANNEL with a blocking
+``listen()`` and hands each event to the sockets of the user it belongs to
+(the ``user_id`` field of the payload; events without one are dropped). Each
+socket has a bounded queue drained by its own sender task; when a client is
+too slow to keep up, the oldest queued events are dropped instead of letting
+the queue (or the subscriber) back up.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, Optional, Set
+
+import redis.asyncio as aioredis
+from fastapi import WebSocket
+
+from .core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Connection:
+    def __init__(self, user_id: int, websocket: WebSocket, queue_size: int):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._sender: Optional[asyncio.Task] = None
+
+    def offer(self, data: str):
+        if self.queue.full():
+            # slow consumer: drop the oldest event to make room
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(data)
+
+    async def _send_loop(self):
+        while True:
+            data = await self.queue.get()
+            try:
+                await self.websocket.send_text(data)
+            except Exception:
+                break
+
+
+class WebSocketHub:
+    def __init__(self, url: str, channel: str, queue_size: int = 100):
+        self.url = url
+        self.channel = channel
+        self.queue_size = queue_size
+        self._connections: Dict[int, Set[Connection]] = defaultdict(set)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(conns) for conns in self._connections.values())
+
+    def register(self, user_id: int, websocket: WebSocket) -> Connection:
+        conn = Connection(user_id, websocket, self.queue_size)
+        conn._sender = asyncio.create_task(conn._send_loop())
+        self._connections[user_id].add(conn)
+        return conn
+
+    def unregister(self, conn: Connection):
+        if conn._sender is not None:
+            conn._sender.cancel()
+        conns = self._connections.get(conn.user_id)
+        if conns is not None:
+            conns.discard(conn)
+            if not conns:
+                del self._connections[conn.user_id]
+
+    def dispatch(self, data: str):
+        try:
+            user_id = json.loads(data).get("user_id")
+        except (ValueError, AttributeError):
+            return
+        for conn in self._connections.get(user_id, ()):
+            conn.offer(data)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        delay = 1.0
+        while True:
+            client = aioredis.from_url(self.url, encoding="utf-8", decode_responses=True)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                delay = 1.0
+                async for msg in pubsub.listen():
+                    if msg.get("type") == "message":
+                        self.dispatch(msg["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("WebSocket hub subscriber error, retrying in %.0fs: %s", delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+            finally:
+                try:
+                    await pubsub.close()
+                    await client.close()
+                except Exception:
+                    pass
+
+
+hub = WebSocketHub(settings.CELERY_BROKER_URL, settings.REDIS_PUBSUB_CHANNEL, settings.WS_QUEUE_SIZE)
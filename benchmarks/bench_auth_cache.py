@@ -0,0 +1,70 @@
+"""Benchmark: GET /api/items requests/sec with the authenticated-user cache on and off.
+
+Drives the ASGI app in-process (httpx + ASGITransport, no network) with
+--concurrency parallel clients for --seconds per mode, against the configured
+DATABASE_URL.
+
+    python -m benchmarks.bench_auth_cache --seconds 10 --concurrency 20
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.core.config import settings
+from app.database import Base, engine
+from app.main import app
+
+BENCH_USER = "__bench_auth__"
+BENCH_PASSWORD = "bench-password"
+
+
+async def _token(client: httpx.AsyncClient) -> str:
+    await client.post("/api/auth/register", json={
+        "username": BENCH_USER, "password": BENCH_PASSWORD,
+        "phone": "00000000000", "email": "bench-auth@example.com",
+    })
+    resp = await client.post("/api/auth/token_json", json={"username": BENCH_USER, "password": BENCH_PASSWORD})
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+
+async def _run_mode(client, headers, seconds, concurrency):
+    deadline = time.perf_counter() + seconds
+    done = 0
+
+    async def _loop():
+        nonlocal done
+        while time.perf_counter() < deadline:
+            resp = await client.get("/api/items", params={"page_size": 10}, headers=headers)
+            resp.raise_for_status()
+            done += 1
+
+    await asyncio.gather(*(_loop() for _ in range(concurrency)))
+    return done / seconds
+
+
+async def main_async(seconds, concurrency):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = {"Authorization": f"Bearer {await _token(client)}"}
+        for enabled in (False, True):
+            settings.AUTH_USER_CACHE_ENABLED = enabled
+            rps = await _run_mode(client, headers, seconds, concurrency)
+            print(f"user cache {'on ' if enabled else 'off'}: {rps:8.1f} req/s")
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.seconds, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Benchmark: bytes saved and CPU cost of response compression.
+
+Drives app.compression.CompressionMiddleware in-process (plain ASGI, no
+server or database) with payloads shaped like the API's: list pages of 10 /
+100 items with summaries, /items/{id}/original bodies of 10k / 100k / 1M
+characters and a streamed NDJSON export. For each payload and encoding
+(identity, gzip and br) it reports
+the bytes on the wire, the saving and the CPU time spent per request over
+identity; every compressed body is decoded once to check it round-trips.
+
+With --static-dir it also totals the build-time .gz / .br variants of a
+frontend bundle (python -m app.compression precompress) against the originals.
+
+    python -m benchmarks.bench_compression --requests 200
+    python -m benchmarks.bench_compression --static-dir frontend_dist --out bench-results/compression.json
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import time
+
+from app import compression
+from app.core.config import settings
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _text(chars, seed):
+    rng = random.Random(seed)
+    sentences = []
+    for lang in ("zh", "en"):
+        with open(os.path.join(HERE, "corpus", f"{lang}.txt"), encoding="utf-8") as f:
+            sentences += [line.strip() for line in f if line.strip()]
+    parts, size = [], 0
+    while size < chars:
+        s = rng.choice(sentences)
+        parts.append(s)
+        size += len(s)
+    return "".join(parts)[:chars]
+
+
+def _item(i):
+    return {
+        "id": i,
+        "title": _text(20, f"title{i}"),
+        "description": _text(100, f"description{i}"),
+        "summary": _text(300, f"summary{i}"),
+        "tags": [{"id": i * 3 + k, "name": _text(4, f"tag{i}:{k}")} for k in range(4)],
+        "status": "done",
+        "version": 3,
+        "created_at": "2024-05-01T12:00:00",
+    }
+
+
+def payloads():
+    """name -> list of body chunks (one chunk: a plain response, several: a stream)."""
+    out = {}
+    for n in (10, 100):
+        out[f"list_page/{n}"] = [json.dumps([_item(i) for i in range(n)], ensure_ascii=False).encode()]
+    for chars in (10_000, 100_000, 1_000_000):
+        out[f"original/{chars}"] = [json.dumps({"id": 1, "original_text": _text(chars, chars)}, ensure_ascii=False).encode()]
+    out["export_stream/10000"] = [
+        "".join(json.dumps(_item(i), ensure_ascii=False) + "\n" for i in range(start, start + 1000)).encode()
+        for start in range(0, 10_000, 1000)
+    ]
+    return out
+
+
+def _app(chunks, media_type):
+    async def app(scope, receive, send):
+        headers = [(b"content-type", media_type.encode())]
+        if len(chunks) == 1:
+            headers.append((b"content-length", str(len(chunks[0])).encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return app
+
+
+async def _request(app, accept_encoding):
+    scope = {
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(b"accept-encoding", accept_encoding.encode())] if accept_encoding else [],
+    }
+    received = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        received.append(message)
+
+    await app(scope, receive, send)
+    headers = dict(received[0]["headers"])
+    body = b"".join(m.get("body", b"") for m in received[1:])
+    return headers.get(b"content-encoding", b"identity").decode(), body
+
+
+def _decode(coding, body):
+    if coding == "gzip":
+        return gzip.decompress(body)
+    if coding == "br":
+        return compression.brotli.decompress(body)
+    return body
+
+
+async def run(args):
+    encodings = ["identity", "gzip", "br"]
+    results = {}
+    for name, chunks in payloads().items():
+        media_type = "application/x-ndjson" if name.startswith("export") else "application/json"
+        app = compression.CompressionMiddleware(
+            _app(chunks, media_type), minimum_size=args.min_size,
+            gzip_level=args.gzip_level, brotli_quality=args.brotli_quality,
+        )
+        original = b"".join(chunks)
+        row = {"bytes": len(original)}
+        for accept in encodings:
+            coding, body = await _request(app, "" if accept == "identity" else accept)
+            assert _decode(coding, body) == original, f"{name}: {coding} does not round-trip"
+            cpu = time.process_time()
+            for _ in range(args.requests):
+                await _request(app, "" if accept == "identity" else accept)
+            cpu = (time.process_time() - cpu) / args.requests
+            row[accept] = {"wire_bytes": len(body), "saved": round(1 - len(body) / len(original), 3), "cpu_ms": cpu * 1000}
+        for accept in encodings[1:]:
+            row[accept]["cpu_ms_over_identity"] = round(row[accept]["cpu_ms"] - row["identity"]["cpu_ms"], 3)
+        for accept in encodings:
+            row[accept]["cpu_ms"] = round(row[accept]["cpu_ms"], 3)
+        results[name] = row
+    return results
+
+
+def static_totals(directory):
+    totals = {"files": 0, "bytes": 0, "gzip": 0, "br": 0}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if os.path.splitext(name)[1].lower() not in compression.COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            size = os.path.getsize(path)
+            totals["files"] += 1
+            totals["bytes"] += size
+            for coding, suffix in (("gzip", ".gz"), ("br", ".br")):
+                totals[coding] += os.path.getsize(path + suffix) if os.path.exists(path + suffix) else size
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response compression benchmark")
+    parser.add_argument("--requests", type=int, default=50, help="requests per payload and encoding")
+    parser.add_argument("--min-size", type=int, default=settings.COMPRESSION_MIN_SIZE)
+    parser.add_argument("--gzip-level", type=int, default=settings.COMPRESSION_GZIP_LEVEL)
+    parser.add_argument("--brotli-quality", type=int, default=settings.COMPRESSION_BROTLI_QUALITY)
+    parser.add_argument("--static-dir", default=None, help="also total the precompressed frontend bundle")
+    parser.add_argument("--out", default=None, help="write the JSON result here")
+    args = parser.parse_args()
+
+    results = {"config": vars(args).copy(), "payloads": asyncio.run(run(args))}
+    for name, row in results["payloads"].items():
+        line = f"{name:<22} {row['bytes']:>10,} B"
+        for coding in ("identity", "gzip", "br"):
+            r = row[coding]
+            line += f" | {coding} {r['wire_bytes']:>9,} B {r['saved']:>6.1%} {r['cpu_ms']:>8.3f} ms"
+        print(line)
+    if args.static_dir:
+        results["static"] = static_totals(args.static_dir)
+        s = results["static"]
+        print(f"static: {s['files']} files {s['bytes']:,} B -> gzip {s['gzip']:,} B, br {s['br']:,} B")
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
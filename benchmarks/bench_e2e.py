@@ -0,0 +1,245 @@
+"""Benchmark: end-to-end ingest-to-done throughput of the whole pipeline.
+
+POST /api/items -> Celery extract_and_update -> update_after_extraction ->
+Redis publish -> WebSocket. The harness starts (as subprocesses) the
+OpenAI-compatible stub (benchmarks/llm_stub.py, selected via OPENAI_BASE_URL),
+the web app and a Celery worker, registers a throwaway user, listens on the
+WebSocket and submits items open-loop at --rate per second for --duration
+seconds. It reports sustained items/sec, submit-to-done latency percentiles
+and DB statements per item (from the db_statement_duration_seconds counts of
+/api/metrics, web + workers), and writes everything as JSON to --out so runs
+can be compared across commits.
+
+    python -m benchmarks.bench_e2e --rate 20 --duration 60 --concurrency 4 \\
+        --latency 0.5 --jitter 0.2 --out bench-results/e2e.json
+
+Point --database-url / --redis-url at stand-ins (a throwaway MySQL and Redis,
+or sqlite+aiosqlite:///bench.db when aiosqlite is installed). With --no-start
+the services are expected to be running already at --base-url.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+import websockets
+
+from app.core.config import settings
+
+SENTENCES = [
+    "知识整理系统会自动为每段文字生成标题、标签和摘要。",
+    "The worker keeps one event loop and one connection pool per process.",
+    "分布式缓存可以减少重复调用模型的成本。",
+    "Latency percentiles are reported for every run.",
+]
+STATEMENTS_RE = re.compile(r'^db_statement_duration_seconds_count\{[^}]*role="(\w+)"[^}]*\} (\S+)$', re.M)
+
+
+def _pct(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _spawn(cmd, env, log_dir, name):
+    log = open(os.path.join(log_dir, f"{name}.log"), "w")
+    return subprocess.Popen(cmd, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def _wait_http(client, url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.get(url)
+            return
+        except httpx.HTTPError:
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+async def _db_statements(client, base_url):
+    text = (await client.get(f"{base_url}/api/metrics")).text
+    totals = {}
+    for role, value in STATEMENTS_RE.findall(text):
+        totals[role] = totals.get(role, 0) + float(value)
+    return totals
+
+
+async def _login(client, base_url):
+    username = f"bench_{uuid.uuid4().hex[:10]}"
+    password = uuid.uuid4().hex
+    digits = "".join(random.choice("0123456789") for _ in range(11))
+    r = await client.post(f"{base_url}/api/auth/register", json={
+        "username": username, "password": password, "phone": digits, "email": f"{username}@example.com",
+    })
+    r.raise_for_status()
+    r = await client.post(f"{base_url}/api/auth/token_json", json={"username": username, "password": password})
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+async def _listen(ws_url, token, done, connected):
+    async with websockets.connect(f"{ws_url}?token={token}", ping_interval=None) as ws:
+        connected.set_result(True)
+        # events may arrive before the POST response: record every id, match later
+        async for message in ws:
+            data = json.loads(message)
+            if data.get("status") in ("done", "failed") and "id" in data:
+                done.setdefault(data["id"], (time.perf_counter(), data["status"]))
+
+
+async def run(args):
+    results = {"config": vars(args).copy(), "commit": _git_commit(), "started_at": time.time()}
+    async with httpx.AsyncClient(timeout=30) as client:
+        await _wait_http(client, f"{args.base_url}/api/openapi.json")
+        token = await _login(client, args.base_url)
+        headers = {"Authorization": f"Bearer {token}"}
+        statements_before = await _db_statements(client, args.base_url)
+
+        done = {}
+        connected = asyncio.get_running_loop().create_future()
+        ws_url = args.base_url.replace("http", "ws", 1) + "/api/ws"
+        listener = asyncio.create_task(_listen(ws_url, token, done, connected))
+        await asyncio.wait_for(connected, 30)
+
+        submitted = {}
+        submit_latency = []
+        errors = 0
+        rng = random.Random(0)
+
+        async def _submit():
+            nonlocal errors
+            text = f"[{uuid.uuid4().hex}] " + "".join(rng.choice(SENTENCES) for _ in range(args.sentences))
+            start = time.perf_counter()
+            try:
+                r = await client.post(f"{args.base_url}/api/items", json={"text": text}, headers=headers)
+                r.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                return
+            submit_latency.append(time.perf_counter() - start)
+            submitted[r.json()["id"]] = start
+
+        # open loop: submissions don't wait for earlier ones
+        tasks = []
+        first_submit = time.perf_counter()
+        total = int(args.rate * args.duration)
+        for n in range(total):
+            delay = first_submit + n / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(_submit()))
+        await asyncio.gather(*tasks)
+
+        deadline = time.perf_counter() + args.drain_timeout
+        while time.perf_counter() < deadline and not set(submitted) <= set(done):
+            await asyncio.sleep(0.2)
+        listener.cancel()
+        statements_after = await _db_statements(client, args.base_url)
+
+    latencies = [done[i][0] - t for i, t in submitted.items() if i in done]
+    completed = [done[i] for i in submitted if i in done]
+    finished_at = max((t for t, _ in completed), default=first_submit)
+    statements = {role: statements_after.get(role, 0) - statements_before.get(role, 0) for role in statements_after}
+    results.update({
+        "submitted": len(submitted),
+        "submit_errors": errors,
+        "completed": len(completed),
+        "failed": sum(1 for _, status in completed if status == "failed"),
+        "timed_out": len(set(submitted) - set(done)),
+        "offered_rate": args.rate,
+        "items_per_sec": round(len(completed) / max(finished_at - first_submit, 1e-9), 2),
+        "submit_http_ms": {p: _ms(_pct(submit_latency, p)) for p in (50, 95, 99)},
+        "submit_to_done_ms": {p: _ms(_pct(latencies, p)) for p in (50, 90, 95, 99, 100)},
+        "db_statements": statements,
+        "db_statements_per_item": round(sum(statements.values()) / len(completed), 2) if completed else None,
+    })
+    return results
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def _start_services(args, log_dir):
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": args.database_url,
+        "CELERY_BROKER_URL": args.redis_url,
+        "CELERY_RESULT_BACKEND": args.redis_url,
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.stub_port}/v1",
+        "EXTRACTION_CACHE_ENABLED": "true" if args.cache else "false",
+    })
+    env.pop("METRICS_TOKEN", None)
+    port = args.base_url.rsplit(":", 1)[-1]
+    return [
+        _spawn([sys.executable, "-m", "benchmarks.llm_stub", "--port", str(args.stub_port),
+                "--latency", str(args.latency), "--jitter", str(args.jitter)], env, log_dir, "llm_stub"),
+        _spawn([sys.executable, "-m", "uvicorn", "app.main:app", "--port", port, "--log-level", "warning"],
+               env, log_dir, "web"),
+        _spawn([sys.executable, "-m", "celery", "-A", "app.celery_task.celery", "worker",
+                "-Q", "interactive,bulk,maintenance", "-c", str(args.concurrency), "--loglevel", "warning"],
+               env, log_dir, "worker"),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end ingest-to-done benchmark")
+    parser.add_argument("--rate", type=float, default=10, help="items submitted per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of submissions")
+    parser.add_argument("--sentences", type=int, default=8, help="sentences per item text")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="seconds to wait for stragglers")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8765")
+    parser.add_argument("--no-start", action="store_true", help="use services already running at --base-url")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--redis-url", default=settings.CELERY_BROKER_URL)
+    parser.add_argument("--concurrency", type=int, default=4, help="Celery worker processes")
+    parser.add_argument("--stub-port", type=int, default=9765)
+    parser.add_argument("--latency", type=float, default=0.5, help="LLM stub latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="LLM stub jitter (s)")
+    parser.add_argument("--cache", action="store_true", help="keep the extraction cache enabled")
+    parser.add_argument("--out", default=None, help="write the JSON result here")
+    args = parser.parse_args()
+
+    procs = []
+    log_dir = tempfile.mkdtemp(prefix="bench_e2e_")
+    try:
+        if not args.no_start:
+            procs = _start_services(args, log_dir)
+        results = asyncio.run(run(args))
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                p.kill()
+    results["logs"] = log_dir
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    print(output)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
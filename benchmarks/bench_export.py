@@ -0,0 +1,102 @@
+"""Benchmark: memory and throughput of the streaming export.
+
+Seeds --rows items (with two tags each) for a throwaway user, unless they are
+already there from a previous run, then consumes exporter.export_stream() the
+way the StreamingResponse does, sampling RSS after every chunk. Flat memory
+shows up as the RSS at 10% / 50% / 100% of the rows staying roughly equal.
+
+    python -m benchmarks.bench_export --rows 1000000 --format ndjson
+    python -m benchmarks.bench_export --rows 1000000 --cleanup
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from sqlalchemy import delete, func, insert, select
+
+from app import crud, exporter, models
+from app.database import AsyncSessionLocal, Base, engine
+
+BENCH_USER = "__bench_export__"
+TEXT = "知识整理系统导出基准测试文本。" * 20
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+async def _seed(db, user_id, rows):
+    have = (await db.execute(
+        select(func.count()).select_from(models.KnowledgeItem).where(models.KnowledgeItem.user_id == user_id)
+    )).scalar_one()
+    if have >= rows:
+        return
+    tag_ids = await crud.resolve_tag_ids(db, ["bench-a", "bench-b"])
+    table = models.KnowledgeItem.__table__
+    link = models.knowledge_tag_table
+    for start in range(have, rows, 5000):
+        n = min(5000, rows - start)
+        await db.execute(insert(table).values([
+            {"user_id": user_id, "title": f"item {start + i}", "summary": TEXT[:100], "original_text": TEXT,
+             "status": "done", "source": "local"}
+            for i in range(n)
+        ]))
+        ids = (await db.execute(
+            select(table.c.id).where(table.c.user_id == user_id).order_by(table.c.id.desc()).limit(n)
+        )).scalars().all()
+        await db.execute(insert(link), [{"knowledge_id": i, "tag_id": t} for i in ids for t in tag_ids.values()])
+        await db.commit()
+        print(f"seeded {start + n}/{rows}", end="\r")
+    print()
+
+
+async def main_async(rows, fmt, cleanup):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        user = await crud.get_user_by_username(db, BENCH_USER)
+        if not user:
+            user = await crud.create_user(db, username=BENCH_USER, hashed_password="-")
+        user_id = user.id
+        if cleanup:
+            await db.execute(delete(models.KnowledgeItem).where(models.KnowledgeItem.user_id == user_id))
+            await db.commit()
+            await engine.dispose()
+            return
+        await _seed(db, user_id, rows)
+
+    rss_start = _rss_mb()
+    marks = {}
+    n_bytes = chunks = 0
+    start = time.perf_counter()
+    peak = rss_start
+    async for chunk in exporter.export_stream(user_id, fmt):
+        n_bytes += len(chunk)
+        chunks += 1
+        rss = _rss_mb()
+        peak = max(peak, rss)
+        done = chunks * exporter.settings.EXPORT_CHUNK_SIZE
+        for pct in (10, 50):
+            if pct not in marks and done >= rows * pct / 100:
+                marks[pct] = rss
+    elapsed = time.perf_counter() - start
+    marks[100] = _rss_mb()
+    print(f"format {fmt}: {rows} rows, {n_bytes / 2 ** 20:.1f} MB in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+    print(f"RSS start {rss_start:.1f} MB, " + ", ".join(f"{p}% {m:.1f} MB" for p, m in sorted(marks.items()))
+          + f", peak {peak:.1f} MB")
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=sorted(exporter.FORMATS), default="ndjson")
+    parser.add_argument("--cleanup", action="store_true", help="delete the benchmark user's items and exit")
+    args = parser.parse_args()
+    asyncio.run(main_async(args.rows, args.format, args.cleanup))
+
+
+if __name__ == "__main__":
+    main()
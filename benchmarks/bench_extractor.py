@@ -0,0 +1,322 @@
+"""Benchmark: micro-benchmarks of the pure-Python extractor pieces, with a regression gate.
+
+Two groups of cases, over inputs built deterministically from the checked-in
+corpus (benchmarks/corpus/{zh,en}.txt) for zh / en / mixed text of 100
+characters to 1 MB:
+
+* local path: split_sentences, local_extract (jieba keywords included)
+* LLM-response parsing path: _extract_json_from_text and _normalize_llm_result
+  on replies of the same sizes in the shapes models actually produce (clean,
+  fenced, wrapped in prose, single-quoted, tags as one string, no JSON), plus
+  call_openai_async / call_openai_batch_async with the network call (_chat)
+  replaced by the canned reply, i.e. everything that runs after the model
+  answers
+
+Each case reports ops/sec (best of --repeat runs, timeit style) and the peak
+traced memory of one call (tracemalloc). With a baseline present the run is
+compared against it and exits 1 when a case is slower than the baseline by
+more than --tolerance or its peak memory grew by more than --mem-tolerance.
+Throughput is scaled by a fixed calibration workload measured in both runs,
+so a baseline recorded on another machine still gives a usable comparison;
+record it on the machine that runs the check anyway. The baseline is checked
+in (benchmarks/extractor_baseline.json); --check, for CI, also fails (exit 2)
+when it is missing instead of only printing a note.
+
+    python -m benchmarks.bench_extractor                    # run, compare with the baseline
+    python -m benchmarks.bench_extractor --check            # same, a missing baseline is an error
+    python -m benchmarks.bench_extractor --update-baseline  # record a new baseline
+    python -m benchmarks.bench_extractor --filter parse --max-size 10000
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import platform
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+from app.core.config import settings
+from app.utils import extractor_async
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(HERE, "corpus")
+DEFAULT_BASELINE = os.path.join(HERE, "extractor_baseline.json")
+SIZES = (100, 1_000, 10_000, 100_000, 1_000_000)
+LANGS = ("zh", "en", "mixed")
+REPLY_SHAPES = ("clean", "fenced", "prose", "single_quoted", "string_tags", "no_json")
+MEM_SLACK = 64 * 1024  # peaks below this are allocator noise
+
+
+# ---- corpus ------------------------------------------------------------------
+
+def _sentences(lang):
+    if lang == "mixed":
+        return _sentences("zh") + _sentences("en")
+    with open(os.path.join(CORPUS_DIR, f"{lang}.txt"), encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def document(lang, size):
+    """`size` characters of `lang` text: a short first line, then paragraphs of 3-8 sentences."""
+    rng = random.Random(f"{lang}:{size}")
+    sentences = _sentences(lang)
+    parts = [rng.choice(sentences).rstrip("。.!！?？") + "\n"]
+    length = len(parts[0])
+    while length < size:
+        paragraph = [rng.choice(sentences) for _ in range(rng.randint(3, 8))]
+        chunk = (" " if lang == "en" else "").join(paragraph) + "\n"
+        parts.append(chunk)
+        length += len(chunk)
+    return "".join(parts)[:size]
+
+
+def _payload(lang, size):
+    """An extraction result whose summary makes the serialized reply about `size` characters."""
+    text = document(lang, size)
+    words = [w for w in re.split(r"[\s，。,.!！?？]+", text[:400]) if w][:6]
+    return {
+        "title": text.splitlines()[0][:60],
+        "tags": words,
+        "description": text[:120].replace("\n", " "),
+        "summary": text[: max(size - 300, 0)].replace("\n", " "),
+        "confidence": 0.87,
+    }
+
+
+def reply(shape, lang, size):
+    data = _payload(lang, size)
+    if shape == "string_tags":
+        data["tags"] = "，".join(data["tags"][:3]) + "; " + ", ".join(data["tags"][3:])
+    body = json.dumps(data, ensure_ascii=False)
+    if shape == "fenced":
+        return f"```json\n{body}\n```"
+    if shape == "prose":
+        return f"Sure, here is the extracted metadata:\n\n{body}\n\nLet me know if anything should change."
+    if shape == "single_quoted":
+        return body.replace('"', "'")
+    if shape == "no_json":
+        return data["summary"] or data["description"]
+    return body
+
+
+def batch_reply(lang, size, items=10):
+    per_item = max(size // items, 100)
+    entries = [dict(_payload(lang, per_item), id=i) for i in range(items)]
+    return "Here are the results:\n" + json.dumps(entries, ensure_ascii=False)
+
+
+# ---- cases -------------------------------------------------------------------
+
+_loop = asyncio.new_event_loop()
+
+
+def _stub_chat(content):
+    async def _chat(system_prompt, user_prompt, max_tokens):
+        return content
+    return _chat
+
+
+def _llm_call(fn, arg, content):
+    """Run fn(arg) with the model call answered by `content`."""
+    chat = _stub_chat(content)
+
+    def _run():
+        extractor_async._chat = chat
+        return _loop.run_until_complete(fn(arg))
+    return _run
+
+
+def cases(sizes):
+    """Yield (name, group, callable) for every case; inputs are built before timing."""
+    for lang in LANGS:
+        for size in sizes:
+            text = document(lang, size)
+            yield f"split_sentences/{lang}/{size}", "local", lambda t=text: extractor_async.split_sentences(t)
+            yield f"local_extract/{lang}/{size}", "local", lambda t=text: extractor_async.local_extract(t)
+
+    for shape in REPLY_SHAPES:
+        for size in sizes:
+            content = reply(shape, "mixed", size)
+            yield (f"extract_json/{shape}/{size}", "parse",
+                   lambda c=content: extractor_async._extract_json_from_text(c))
+            if shape != "no_json":
+                data = extractor_async._extract_json_from_text(content)
+                yield (f"normalize/{shape}/{size}", "parse",
+                       lambda d=data, c=content: extractor_async._normalize_llm_result(d, c))
+            yield (f"parse_reply/{shape}/{size}", "parse",
+                   _llm_call(extractor_async.call_openai_async, "x", content))
+
+    texts = {i: "x" for i in range(10)}
+    for size in sizes:
+        if size >= 1_000:
+            yield (f"parse_batch_reply/10/{size}", "parse",
+                   _llm_call(extractor_async.call_openai_batch_async, texts, batch_reply("mixed", size)))
+
+
+def corpus_digest():
+    """Fingerprint of every generated input, so a baseline is only compared with the same corpus."""
+    h = hashlib.sha256()
+    for lang in LANGS:
+        for size in SIZES:
+            h.update(document(lang, size).encode())
+    for shape in REPLY_SHAPES:
+        for size in SIZES:
+            h.update(reply(shape, "mixed", size).encode())
+    return h.hexdigest()[:16]
+
+
+# ---- measurement -------------------------------------------------------------
+
+def _calibration():
+    # fixed pure-Python work comparable to the cases: regex, json and str methods
+    sample = document("mixed", 2_000)
+    encoded = json.dumps({"summary": sample}, ensure_ascii=False)
+
+    def _run():
+        re.split(r"(?<=[。！？\?\!\n])\s*", sample)
+        json.loads(encoded)
+        sample.strip().splitlines()
+    return _run
+
+
+def measure(fn, repeat, min_time, max_time):
+    fn()  # warm-up: jieba dictionary, regex cache, ...
+    loops, elapsed = 1, 0.0
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed * 10 > min_time else 10
+    runs = [elapsed]
+    repeat = max(1, min(repeat, int(max_time / max(elapsed, 1e-9))))
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        runs.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return {"ops_per_sec": round(loops / min(runs), 3), "peak_bytes": peak}
+
+
+# ---- baseline ----------------------------------------------------------------
+
+def compare(results, baseline, tolerance, mem_tolerance):
+    """Annotate results with the change against the baseline; return the names of regressed cases."""
+    speed = results["calibration_ops_per_sec"] / baseline["calibration_ops_per_sec"]
+    regressed = []
+    for name, current in results["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None:
+            current["vs_baseline"] = "new"
+            continue
+        expected = base["ops_per_sec"] * speed
+        current["ops_change"] = round(current["ops_per_sec"] / expected - 1, 3)
+        current["peak_change"] = round(current["peak_bytes"] / max(base["peak_bytes"], 1) - 1, 3)
+        slower = current["ops_per_sec"] < expected * (1 - tolerance)
+        bigger = current["peak_bytes"] > base["peak_bytes"] * (1 + mem_tolerance) + MEM_SLACK
+        if slower or bigger:
+            current["vs_baseline"] = "REGRESSED"
+            regressed.append(name)
+        else:
+            current["vs_baseline"] = "ok"
+    return regressed
+
+
+def _print(results):
+    print(f"{'case':<40} {'ops/sec':>12} {'peak KiB':>10} {'ops Δ':>8} {'peak Δ':>8}")
+    for name, r in results["cases"].items():
+        ops_change = f"{r['ops_change']:+.0%}" if "ops_change" in r else ""
+        peak_change = f"{r['peak_change']:+.0%}" if "peak_change" in r else ""
+        flag = r.get("vs_baseline", "")
+        print(f"{name:<40} {r['ops_per_sec']:>12,.1f} {r['peak_bytes'] / 1024:>10,.1f} "
+              f"{ops_change:>8} {peak_change:>8}  {flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extractor micro-benchmarks with a regression gate")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="input sizes in characters")
+    parser.add_argument("--max-size", type=int, default=None, help="skip sizes above this")
+    parser.add_argument("--filter", nargs="+", default=None, help="only cases containing one of these")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per case (best is kept)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing run")
+    parser.add_argument("--max-time", type=float, default=5.0, help="cap on the timing of a slow case (s)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="fail when there is no baseline to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed ops/sec drop (fraction)")
+    parser.add_argument("--mem-tolerance", type=float, default=0.1, help="allowed peak memory growth (fraction)")
+    parser.add_argument("--out", default=None, help="write the JSON result here")
+    args = parser.parse_args()
+    if args.check and args.update_baseline:
+        parser.error("--check and --update-baseline are mutually exclusive")
+    if args.check and not os.path.exists(args.baseline):
+        # fail before spending minutes on the run
+        print(f"no baseline at {args.baseline}; record one with --update-baseline", file=sys.stderr)
+        sys.exit(2)
+
+    sizes = [s for s in args.sizes if args.max_size is None or s <= args.max_size]
+    # the parse cases go through call_openai_async, which needs a key; the model call itself is stubbed
+    settings.OPENAI_API_KEY = settings.OPENAI_API_KEY or "bench"
+    # the no_json shape logs a warning per call
+    logging.getLogger(extractor_async.__name__).setLevel(logging.ERROR)
+
+    results = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "corpus": corpus_digest(),
+        "calibration_ops_per_sec": measure(_calibration(), args.repeat, args.min_time, args.max_time)["ops_per_sec"],
+        "cases": {},
+    }
+    for name, group, fn in cases(sizes):
+        if args.filter and not any(f in name for f in args.filter):
+            continue
+        results["cases"][name] = dict(measure(fn, args.repeat, args.min_time, args.max_time), group=group)
+
+    exit_code = 0
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("corpus") != results["corpus"]:
+            print("corpus differs from the baseline's (corpus files or generator changed): "
+                  "re-record it with --update-baseline", file=sys.stderr)
+            exit_code = 2
+        else:
+            if baseline.get("python") != results["python"]:
+                print(f"note: baseline recorded on Python {baseline.get('python')}", file=sys.stderr)
+            regressed = compare(results, baseline, args.tolerance, args.mem_tolerance)
+            if regressed:
+                print(f"{len(regressed)} case(s) regressed past the baseline: {', '.join(regressed)}",
+                      file=sys.stderr)
+                exit_code = 1
+    else:
+        print(f"no baseline at {args.baseline}; record one with --update-baseline", file=sys.stderr)
+
+    _print(results)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Benchmark: LLM scheduler behaviour under provider rate limiting.
+
+Fires --items concurrent extract_from_text_async calls at an OpenAI-compatible
+endpoint (start benchmarks/llm_stub.py first, e.g. with --max-concurrency 8
+--error-rate 0.05) and reports throughput, how many items fell back to local
+extraction, and the scheduler's counters (429s seen, retries, final AIMD limit).
+
+    python -m benchmarks.llm_stub --port 9000 --max-concurrency 8 &
+    OPENAI_API_KEY=x OPENAI_BASE_URL=http://127.0.0.1:9000/v1 \\
+        python -m benchmarks.bench_llm_scheduler --items 200
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.utils import extractor_async
+from app.utils.llm_scheduler import get_scheduler
+
+
+async def main_async(items):
+    texts = [f"第 {i} 条测试文本：调度器需要在限流时退避并自动调整并发。" for i in range(items)]
+    start = time.perf_counter()
+    results = await asyncio.gather(*(extractor_async.extract_from_text_async(t) for t in texts))
+    elapsed = time.perf_counter() - start
+    await extractor_async.close_async_client()
+    llm = sum(1 for r in results if r.get("source") == "llm")
+    print(json.dumps({
+        "items": items,
+        "seconds": round(elapsed, 2),
+        "items_per_sec": round(items / elapsed, 1),
+        "llm_results": llm,
+        "local_fallbacks": items - llm,
+        "scheduler": get_scheduler().stats(),
+    }, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.items))
+
+
+if __name__ == "__main__":
+    main()
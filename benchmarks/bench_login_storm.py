@@ -0,0 +1,88 @@
+"""Benchmark: GET /api/items latency during a bcrypt login storm.
+
+Drives the ASGI app in-process (httpx + ASGITransport). One group of clients
+hammers /api/auth/token_json while another measures GET /api/items latency.
+Runs once with hashing inline on the event loop (PASSWORD_HASH_WORKERS=0,
+the old behaviour) and once through the hashing thread pool, printing p50/p99
+of the list requests for both.
+
+    python -m benchmarks.bench_login_storm --seconds 10 --logins 32
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.core import hashing
+from app.core.config import settings
+from app.database import Base, engine
+from app.main import app
+
+BENCH_USER = "__bench_login__"
+BENCH_PASSWORD = "bench-password"
+
+
+async def _setup(client):
+    settings.PASSWORD_HASH_SCHEME = "bcrypt"
+    await client.post("/api/auth/register", json={
+        "username": BENCH_USER, "password": BENCH_PASSWORD,
+        "phone": "00000000001", "email": "bench-login@example.com",
+    })
+    resp = await client.post("/api/auth/token_json", json={"username": BENCH_USER, "password": BENCH_PASSWORD})
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+async def _storm(client, deadline):
+    while time.perf_counter() < deadline:
+        await client.post("/api/auth/token_json", json={"username": BENCH_USER, "password": BENCH_PASSWORD})
+
+
+async def _reader(client, headers, deadline, latencies):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await client.get("/api/items", headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def _run_mode(client, headers, workers, seconds, logins, readers):
+    hashing.hasher = hashing.PasswordHasher(workers, settings.PASSWORD_HASH_MAX_PENDING)
+    from app.routers import auth
+    auth.hasher = hashing.hasher
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(
+        *(_storm(client, deadline) for _ in range(logins)),
+        *(_reader(client, headers, deadline, latencies) for _ in range(readers)),
+    )
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    label = "inline" if workers == 0 else f"pool({workers})"
+    print(f"{label:>8}: GET /api/items p50 {p50:7.1f} ms   p99 {p99:7.1f} ms   ({len(latencies)} requests)")
+    print(f"          hasher {hashing.hasher.stats()}")
+
+
+async def main_async(args):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        headers = await _setup(client)
+        for workers in (0, args.workers):
+            await _run_mode(client, headers, workers, args.seconds, args.logins, args.readers)
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--logins", type=int, default=32, help="concurrent login clients")
+    parser.add_argument("--readers", type=int, default=4, help="concurrent list clients")
+    parser.add_argument("--workers", type=int, default=settings.PASSWORD_HASH_WORKERS)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
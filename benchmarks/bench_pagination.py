@@ -0,0 +1,80 @@
+"""Benchmark: latency of page N, OFFSET/LIMIT vs keyset cursor.
+
+Fills one throwaway user with --rows items, then times
+crud.list_knowledge for pages at increasing depth both ways. Cursor latency
+should stay flat; OFFSET grows with depth.
+
+    python -m benchmarks.bench_pagination --rows 200000
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select
+
+from app import crud, models
+from app.database import AsyncSessionLocal, Base, engine
+
+BENCH_USER = "__bench_pagination__"
+PAGE_SIZE = 20
+CHUNK = 5000
+
+
+async def _fill(db, user_id: int, n: int):
+    await db.execute(delete(models.KnowledgeItem).where(models.KnowledgeItem.user_id == user_id))
+    base = datetime(2024, 1, 1)
+    for start in range(0, n, CHUNK):
+        await db.execute(insert(models.KnowledgeItem), [
+            {"user_id": user_id, "title": f"item {i}", "original_text": "x", "status": "done",
+             "created_at": base + timedelta(seconds=i // 3)}  # some created_at ties on purpose
+            for i in range(start, min(n, start + CHUNK))
+        ])
+    await db.commit()
+
+
+async def _timed(coro):
+    start = time.perf_counter()
+    await coro
+    return (time.perf_counter() - start) * 1000
+
+
+async def main_async(rows: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        user = await crud.get_user_by_username(db, BENCH_USER)
+        if not user:
+            user = await crud.create_user(db, username=BENCH_USER, hashed_password="-")
+        await _fill(db, user.id, rows)
+        depth = 1
+        while depth * PAGE_SIZE < rows:
+            skip = (depth - 1) * PAGE_SIZE
+            # the row just before the page, as a client would have it from the previous page
+            prev = (await db.execute(
+                select(models.KnowledgeItem.created_at, models.KnowledgeItem.id)
+                .where(models.KnowledgeItem.user_id == user.id)
+                .order_by(models.KnowledgeItem.created_at.desc(), models.KnowledgeItem.id.desc())
+                .offset(max(skip - 1, 0)).limit(1)
+            )).first()
+            after = (prev.created_at, prev.id) if skip else None
+            t_offset = await _timed(crud.list_knowledge(db, skip=skip, limit=PAGE_SIZE, user_id=user.id))
+            db.expunge_all()
+            t_cursor = await _timed(crud.list_knowledge(db, limit=PAGE_SIZE, user_id=user.id, after=after))
+            db.expunge_all()
+            print(f"page {depth:>7}: offset {t_offset:8.1f} ms   cursor {t_cursor:8.1f} ms")
+            depth *= 10
+        await db.execute(delete(models.KnowledgeItem).where(models.KnowledgeItem.user_id == user.id))
+        await db.commit()
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark: list page cost with and without the heavy TEXT columns.
+
+Creates --items items with ~100 KB original_text/llm_raw for a throwaway
+user and times one list page loaded as full rows (original_text and llm_raw
+undeferred, as before) vs the projected list query, reporting approximate
+bytes fetched from MySQL and the serialized response size.
+
+    python -m benchmarks.bench_projection --items 100 --page-size 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import selectinload, undefer_group
+
+from app import crud, models, schemas
+from app.database import AsyncSessionLocal, Base, engine
+
+BENCH_USER = "__bench_projection__"
+ORIGINAL = ("知识整理系统基准测试文本。" * 8 + "\n") * 1000  # ~100 KB utf-8
+
+
+def _fetched_bytes(items, heavy: bool) -> int:
+    cols = ["title", "description", "summary", "confidence", "source", "status"]
+    if heavy:
+        cols += ["original_text", "llm_raw"]
+    return sum(len((getattr(i, c) or "").encode()) for i in items for c in cols)
+
+
+async def _full_rows(db, user_id, limit):
+    stmt = (
+        select(models.KnowledgeItem)
+        .options(selectinload(models.KnowledgeItem.tags), undefer_group(models.HEAVY_COLUMNS))
+        .where(models.KnowledgeItem.user_id == user_id)
+        .order_by(models.KnowledgeItem.created_at.desc(), models.KnowledgeItem.id.desc())
+        .limit(limit)
+    )
+    return (await db.execute(stmt)).scalars().all()
+
+
+async def _measure(db, label, load, heavy, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = await load()
+        body = "[" + ",".join(schemas.KnowledgeListItem.model_validate(i).model_dump_json() for i in items) + "]"
+        timings.append((time.perf_counter() - start) * 1000)
+        fetched = _fetched_bytes(items, heavy)
+        db.expunge_all()
+    print(f"{label:>9}: p50 {statistics.median(timings):7.1f} ms   fetched ~{fetched / 1024:9.1f} KB   response {len(body) / 1024:7.1f} KB")
+
+
+async def main_async(n_items, page_size, repeat):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        user = await crud.get_user_by_username(db, BENCH_USER)
+        if not user:
+            user = await crud.create_user(db, username=BENCH_USER, hashed_password="-")
+        await db.execute(delete(models.KnowledgeItem).where(models.KnowledgeItem.user_id == user.id))
+        await db.execute(insert(models.KnowledgeItem), [
+            {"user_id": user.id, "title": f"item {i}", "summary": ORIGINAL[:300], "original_text": ORIGINAL,
+             "llm_raw": ORIGINAL, "status": "done"}
+            for i in range(n_items)
+        ])
+        await db.commit()
+        await _measure(db, "full rows", lambda: _full_rows(db, user.id, page_size), True, repeat)
+        await _measure(db, "projected", lambda: crud.list_knowledge(db, limit=page_size, user_id=user.id), False, repeat)
+        await db.execute(delete(models.KnowledgeItem).where(models.KnowledgeItem.user_id == user.id))
+        await db.commit()
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.items, args.page_size, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
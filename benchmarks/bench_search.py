@@ -0,0 +1,107 @@
+"""Benchmark: list search latency, inverted index (BM25) vs ILIKE scan.
+
+Fills one throwaway user with N synthetic items per size, builds the index
+for them in bulk, then times crud.list_knowledge(q=...) with
+SEARCH_BACKEND=index and SEARCH_BACKEND=like.
+
+    python -m benchmarks.bench_search --sizes 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from sqlalchemy import delete, insert, select
+
+from app import crud, models, search
+from app.core.config import settings
+from app.database import AsyncSessionLocal, Base, engine
+
+BENCH_USER = "__bench_search__"
+VOCAB = (
+    "机器学习 深度学习 数据库 索引 知识 管理 搜索 排序 分布式 缓存 网络 安全 性能 优化 前端 后端 "
+    "python mysql redis celery fastapi vue docker kubernetes linux algorithm pipeline tokenizer"
+).split()
+QUERIES = ["数据库 索引", "python", "分布式 缓存", "kubernetes docker", "性能优化"]
+CHUNK = 2000
+
+
+def _doc(rng):
+    words = rng.choices(VOCAB, k=rng.randint(8, 40))
+    title = " ".join(words[:4])
+    return title, " ".join(words[4:12]), " ".join(words[12:])
+
+
+async def _fill(db, user_id: int, n: int):
+    rng = random.Random(n)
+    await db.execute(delete(models.KnowledgeItem).where(models.KnowledgeItem.user_id == user_id))
+    for model in (models.SearchPosting, models.SearchDoc, models.SearchStats):
+        await db.execute(delete(model).where(model.user_id == user_id))
+    await db.commit()
+    total_len = 0
+    for start in range(0, n, CHUNK):
+        docs = [_doc(rng) for _ in range(min(CHUNK, n - start))]
+        await db.execute(insert(models.KnowledgeItem), [
+            {"user_id": user_id, "title": t, "description": d, "summary": s, "original_text": s, "status": "done"}
+            for t, d, s in docs
+        ])
+        rows = (await db.execute(
+            select(models.KnowledgeItem.id, models.KnowledgeItem.title, models.KnowledgeItem.description, models.KnowledgeItem.summary)
+            .where(models.KnowledgeItem.user_id == user_id)
+            .order_by(models.KnowledgeItem.id.desc())
+            .limit(len(docs))
+        )).all()
+        postings, search_docs = [], []
+        for r in rows:
+            counts = search.tokenize(search.document_text(r.title, r.description, r.summary, []))
+            postings += [{"user_id": user_id, "token": t, "item_id": r.id, "tf": tf} for t, tf in counts.items()]
+            length = sum(counts.values())
+            search_docs.append({"item_id": r.id, "user_id": user_id, "length": length})
+            total_len += length
+        await db.execute(insert(models.SearchPosting), postings)
+        await db.execute(insert(models.SearchDoc), search_docs)
+        await db.commit()
+    await db.execute(insert(models.SearchStats), [{"user_id": user_id, "doc_count": n, "total_length": total_len}])
+    await db.commit()
+
+
+async def _time_backend(db, user_id: int, backend: str, repeat: int):
+    settings.SEARCH_BACKEND = backend
+    timings = []
+    for _ in range(repeat):
+        for q in QUERIES:
+            start = time.perf_counter()
+            await crud.list_knowledge(db, skip=0, limit=10, q=q, user_id=user_id)
+            timings.append((time.perf_counter() - start) * 1000)
+            db.expunge_all()
+    return statistics.median(timings), max(timings)
+
+
+async def main_async(sizes, repeat):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        user = await crud.get_user_by_username(db, BENCH_USER)
+        if not user:
+            user = await crud.create_user(db, username=BENCH_USER, hashed_password="-")
+        for n in sizes:
+            await _fill(db, user.id, n)
+            for backend in ("like", "index"):
+                p50, worst = await _time_backend(db, user.id, backend, repeat)
+                print(f"{n:>8} rows  {backend:>5}: p50 {p50:8.1f} ms   max {worst:8.1f} ms")
+        await db.execute(delete(models.KnowledgeItem).where(models.KnowledgeItem.user_id == user.id))
+        await db.commit()
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.sizes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
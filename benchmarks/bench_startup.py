@@ -0,0 +1,91 @@
+"""Benchmark: cold-start cost of the web entry point (app.main:app).
+
+1. ``python -X importtime -c "import app.main"``: total import time and the
+   slowest top-level imports, plus a check that worker-only modules (jieba,
+   openai, app.celery_task.tasks) are not imported by the web process.
+2. Time-to-first-200: start uvicorn on a free port and poll /api/openapi.json.
+
+Prints one JSON object so results can be compared across commits.
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+WORKER_ONLY = ["jieba", "openai", "app.celery_task.tasks", "app.utils.extractor_async"]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _importtime():
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         "import sys, json, app.main; print(json.dumps([m for m in %r if m in sys.modules]))" % (WORKER_ONLY,)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    entries = []
+    for line in proc.stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", line)
+        if m:
+            entries.append((int(m.group(2)), len(m.group(3)), m.group(4)))
+    top_level = [e for e in entries if e[1] == 1]
+    total_us = sum(e[0] for e in top_level)
+    slowest = sorted(top_level, reverse=True)[:10]
+    return {
+        "import_ms": total_us / 1000,
+        "slowest": [{"module": name, "ms": us / 1000} for us, _, name in slowest],
+        "worker_only_modules_loaded": json.loads(proc.stdout.strip().splitlines()[-1]),
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _time_to_first_200(timeout=60.0):
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/openapi.json", timeout=1) as resp:
+                    if resp.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.02)
+        return None
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    imports = [_importtime() for _ in range(args.runs)]
+    first_200 = [t for t in (_time_to_first_200() for _ in range(args.runs)) if t is not None]
+    result = {
+        "import_ms_median": statistics.median(r["import_ms"] for r in imports),
+        "time_to_first_200_ms_median": statistics.median(first_200) if first_200 else None,
+        "slowest_imports": imports[-1]["slowest"],
+        "worker_only_modules_loaded": imports[-1]["worker_only_modules_loaded"],
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
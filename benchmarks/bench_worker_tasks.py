@@ -0,0 +1,90 @@
+"""Benchmark: extraction tasks/sec with per-task vs per-process resources.
+
+Runs the body of ``extract_and_update`` in-process (no broker) against the
+configured DATABASE_URL, twice:
+
+  before  -- asyncio.run() + a fresh engine/sessionmaker per task, disposed after
+  after   -- app.celery_task.worker: one loop + engine pool reused by every task
+
+Leave OPENAI_API_KEY unset to measure the infrastructure overhead only
+(extraction falls back to local_extract).
+
+    python -m benchmarks.bench_worker_tasks -n 200
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.celery_task import tasks, worker
+from app.core.config import settings
+
+BENCH_USER = "__bench_worker__"
+SAMPLE = "知识整理系统的后台任务基准测试。每个任务都会读取条目、提取标签并写回数据库。\n" * 5
+
+
+async def _prepare(n: int):
+    engine = create_async_engine(settings.DATABASE_URL, future=True)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    async with Session() as db:
+        from app import crud
+        user = await crud.get_user_by_username(db, BENCH_USER)
+        if not user:
+            user = await crud.create_user(db, username=BENCH_USER, hashed_password="-")
+        await db.execute(delete(models.KnowledgeItem).where(models.KnowledgeItem.user_id == user.id))
+        items = [models.KnowledgeItem(original_text=SAMPLE, status="pending", user_id=user.id) for _ in range(n)]
+        db.add_all(items)
+        await db.commit()
+        ids = [i.id for i in items]
+    await engine.dispose()
+    return ids
+
+
+async def _old_task_body(item_id: int):
+    engine = create_async_engine(settings.DATABASE_URL, future=True, echo=False, pool_pre_ping=True)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    worker._session_factory = Session
+    try:
+        await tasks._run_extraction_and_update(item_id)
+    finally:
+        await engine.dispose()
+
+
+def bench_before(ids):
+    worker._ensure_initialized()  # only for the redis client
+    start = time.perf_counter()
+    for item_id in ids:
+        asyncio.run(_old_task_body(item_id))
+    elapsed = time.perf_counter() - start
+    worker.shutdown()
+    return elapsed
+
+
+def bench_after(ids):
+    start = time.perf_counter()
+    for item_id in ids:
+        worker.run(tasks._run_extraction_and_update(item_id))
+    elapsed = time.perf_counter() - start
+    worker.shutdown()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=100, help="tasks per mode")
+    args = parser.parse_args()
+
+    for name, fn in (("before", bench_before), ("after", bench_after)):
+        ids = asyncio.run(_prepare(args.n))
+        elapsed = fn(ids)
+        print(f"{name:>6}: {args.n} tasks in {elapsed:.2f}s -> {args.n / elapsed:.1f} tasks/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""OpenAI-compatible stub server for load tests of the extraction pipeline.
+
+Serves POST /v1/chat/completions with canned extraction JSON (a JSON array for
+batch prompts) after a configurable latency, and injects rate limiting: a
+random fraction of requests (--error-rate) and every request above
+--max-concurrency in flight get a 429 with a Retry-After header.
+
+    python -m benchmarks.llm_stub --port 9000 --latency 0.5 --jitter 0.2 --max-concurrency 8
+    OPENAI_API_KEY=x OPENAI_BASE_URL=http://127.0.0.1:9000/v1 ...
+
+GET /stats returns request / 429 counters and peak concurrency.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+ITEM_ID_RE = re.compile(r"Item id=(\d+):")
+
+config = {"latency": 0.2, "jitter": 0.0, "error_rate": 0.0, "max_concurrency": 0, "retry_after": 1.0}
+stats = {"requests": 0, "ok": 0, "throttled": 0, "in_flight": 0, "peak_in_flight": 0}
+
+app = FastAPI()
+
+
+def _result(n):
+    return {
+        "title": f"Stub title {n}",
+        "tags": ["stub", "benchmark", f"t{n % 50}"],
+        "description": "Generated by the benchmark stub.",
+        "summary": "This is a synthetic summary produced by the stub server.",
+        "confidence": 0.9,
+    }
+
+
+def _content(messages):
+    user = next((m["content"] for m in messages if m.get("role") == "user"), "")
+    ids = ITEM_ID_RE.findall(user)
+    if ids:
+        return json.dumps([dict(_result(int(i)), id=int(i)) for i in ids], ensure_ascii=False)
+    return json.dumps(_result(len(user)), ensure_ascii=False)
+
+
+def _throttle():
+    stats["throttled"] += 1
+    return JSONResponse(
+        {"error": {"message": "Rate limit reached", "type": "rate_limit_error", "code": "rate_limit_exceeded"}},
+        status_code=429,
+        headers={"retry-after": str(config["retry_after"])},
+    )
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    if random.random() < config["error_rate"]:
+        return _throttle()
+    if config["max_concurrency"] and stats["in_flight"] >= config["max_concurrency"]:
+        return _throttle()
+    stats["in_flight"] += 1
+    stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+    try:
+        await asyncio.sleep(max(0.0, config["latency"] + random.uniform(-config["jitter"], config["jitter"])))
+    finally:
+        stats["in_flight"] -= 1
+    stats["ok"] += 1
+    content = _content(body.get("messages", []))
+    return {
+        "id": f"chatcmpl-stub-{stats['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of uniform jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="429 above this many in flight (0 = off)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    args = parser.parse_args()
+    config.update(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                  max_concurrency=args.max_concurrency, retry_after=args.retry_after)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Load test: hold many idle WebSocket connections and measure event fan-out.
+
+Opens --sockets connections to /api/ws for one user, keeps them idle, then
+publishes an event for that user on REDIS_PUBSUB_CHANNEL and reports how long
+it takes until every socket has received it. Raise the open-files limit first
+(e.g. ``ulimit -n 65536``) for 10k sockets.
+
+    python -m benchmarks.ws_load --url ws://127.0.0.1:8000/api/ws \\
+        --token <access_token> --user-id <id> --sockets 10000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import redis.asyncio as aioredis
+import websockets
+
+from app.core.config import settings
+
+
+async def _open(url, sem):
+    async with sem:
+        return await websockets.connect(url, open_timeout=30, ping_interval=None)
+
+
+async def main_async(args):
+    url = f"{args.url}?token={args.token}"
+    sem = asyncio.Semaphore(args.connect_concurrency)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(_open(url, sem) for _ in range(args.sockets)), return_exceptions=True)
+    sockets = [r for r in results if not isinstance(r, Exception)]
+    print(f"connected {len(sockets)}/{args.sockets} sockets in {time.perf_counter() - start:.1f}s")
+
+    await asyncio.sleep(args.idle)
+
+    client = aioredis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+    for round_no in range(args.rounds):
+        event = json.dumps({"id": -1, "user_id": args.user_id, "status": "done", "round": round_no})
+        start = time.perf_counter()
+        await client.publish(settings.REDIS_PUBSUB_CHANNEL, event)
+        latencies = []
+
+        async def _recv(ws):
+            await asyncio.wait_for(ws.recv(), timeout=30)
+            latencies.append(time.perf_counter() - start)
+
+        done = await asyncio.gather(*(_recv(ws) for ws in sockets), return_exceptions=True)
+        received = sum(1 for d in done if not isinstance(d, Exception))
+        latencies.sort()
+        if latencies:
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+            print(f"round {round_no}: {received}/{len(sockets)} received   p50 {p50:.1f} ms   p99 {p99:.1f} ms   last {latencies[-1] * 1000:.1f} ms")
+    await client.close()
+    await asyncio.gather(*(ws.close() for ws in sockets), return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/api/ws")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--sockets", type=int, default=10000)
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--idle", type=float, default=5.0, help="seconds to hold sockets idle before publishing")
+    parser.add_argument("--rounds", type=int, default=3)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 // 简单的 WebSocket 管理器，连接到 /api/ws 并触发回调
 export default function createWS(onMessage) {
-  const ws = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/api/ws');
+  // 浏览器 WebSocket 不能带 Authorization 头，token 通过查询参数传递
+  const token = localStorage.getItem('access_token') || '';
+  const ws = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/api/ws?token=' + encodeURIComponent(token));
   ws.onopen = () => {
     console.log('ws opened');
   };
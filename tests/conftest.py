@@ -0,0 +1,26 @@
+"""Test setup: run against a throwaway SQLite database (aiosqlite) instead of MySQL.
+
+DATABASE_URL must be set before app.database creates its engine on import.
+"""
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+_db_dir = tempfile.mkdtemp(prefix="ko_tests_")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_db_dir}/test.db")
+os.environ.setdefault("OPENAI_API_KEY", "")
+
+from app.database import Base, engine  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _schema():
+    async def _create():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+    asyncio.run(_create())
+    yield
+    asyncio.run(engine.dispose())
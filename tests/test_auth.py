@@ -0,0 +1,24 @@
+"""Login with an unknown username is a plain 401, not a server error."""
+import asyncio
+import uuid
+
+import httpx
+from fastapi import FastAPI
+
+from app.routers import auth
+
+app = FastAPI()
+app.include_router(auth.router, prefix="/api")
+
+
+def test_unknown_username_is_401(capsys):
+    async def _run():
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/api/auth/token", data={"username": f"nobody_{uuid.uuid4().hex[:8]}", "password": "secret-pw"}
+            )
+
+    response = asyncio.run(_run())
+    assert response.status_code == 401
+    assert "secret-pw" not in capsys.readouterr().out
@@ -0,0 +1,59 @@
+"""Batch mode: a failed batch call fails its items; interactive batches skip imported items."""
+import asyncio
+import uuid
+
+from sqlalchemy import update
+
+from app import crud, models
+from app.celery_task import tasks, worker
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+
+
+async def _pending_items(n, import_job=False):
+    async with AsyncSessionLocal() as db:
+        user = await crud.create_user(db, username=f"u_{uuid.uuid4().hex[:12]}", hashed_password="-")
+        job_id = None
+        if import_job:
+            job = models.ImportJob(user_id=user.id, status="done", received=n, inserted=n, rejected=0)
+            db.add(job)
+            await db.commit()
+            job_id = job.id
+        ids = [(await crud.create_knowledge(db, f"批量提取测试 {i}", user_id=user.id)).id for i in range(n)]
+        if job_id is not None:
+            await db.execute(update(models.KnowledgeItem).where(models.KnowledgeItem.id.in_(ids)).values(import_job_id=job_id))
+            await db.commit()
+        return user.id, ids
+
+
+async def _statuses(ids):
+    async with AsyncSessionLocal() as db:
+        return [(await crud.get_knowledge(db, i, refresh=True)).status for i in ids]
+
+
+def test_failed_batch_call_marks_items_failed(monkeypatch):
+    async def _boom(texts):
+        raise RuntimeError("model unavailable")
+
+    published = []
+    monkeypatch.setattr(tasks, "extract_batch_async", _boom)
+    monkeypatch.setattr(tasks, "_publish", lambda client, item_id, user_id, status, error=None: published.append((item_id, status)))
+    monkeypatch.setattr(settings, "EXTRACT_BATCH_SIZE", 4)
+    monkeypatch.setattr(settings, "EXTRACT_BATCH_WINDOW", 0)
+
+    _, ids = asyncio.run(_pending_items(3))
+    worker.run(tasks._run_batch_extraction_and_update(ids[0]))
+    assert asyncio.run(_statuses(ids)) == ["failed"] * 3
+    assert sorted(published) == [(i, "failed") for i in ids]
+
+
+def test_interactive_claim_skips_imported_items():
+    async def _run():
+        user_id, imported = await _pending_items(2, import_job=True)
+        async with AsyncSessionLocal() as db:
+            item = await crud.create_knowledge(db, "交互式提交", user_id=user_id)
+            claimed = await crud.claim_pending_items(db, 4, 10_000, item_id=item.id, include_imports=False)
+        assert [c[0] for c in claimed] == [item.id]
+        assert await _statuses(imported) == ["pending", "pending"]
+
+    asyncio.run(_run())
@@ -0,0 +1,26 @@
+"""reconcile() corrects drift as deltas and leaves correct counters alone."""
+import asyncio
+import uuid
+
+from app import counters, crud
+from app.database import AsyncSessionLocal
+
+
+def test_reconcile_corrects_drift():
+    async def _run():
+        async with AsyncSessionLocal() as db:
+            user = await crud.create_user(db, username=f"u_{uuid.uuid4().hex[:12]}", hashed_password="-")
+            for _ in range(3):
+                await crud.create_knowledge(db, "计数测试", user_id=user.id)
+            assert await counters.reconcile(db, user.id) == 0
+
+            # drift: a pending row too many, a stray failed row
+            await counters.adjust(db, user.id, "pending", 2)
+            await counters.adjust(db, user.id, "failed", 1)
+            await db.commit()
+            assert await counters.reconcile(db, user.id) == 2
+            counts = await counters.get_counts(db, user.id)
+            assert counts["count"] == 3
+            assert counts["by_status"]["pending"] == 3 and counts["by_status"]["failed"] == 0
+
+    asyncio.run(_run())
@@ -0,0 +1,23 @@
+"""Keyset pagination: the second page continues after the first, with no repeats."""
+import asyncio
+import uuid
+
+from app import crud
+from app.database import AsyncSessionLocal
+
+
+def test_two_pages_by_cursor():
+    async def _run():
+        async with AsyncSessionLocal() as db:
+            user = await crud.create_user(db, username=f"u_{uuid.uuid4().hex[:12]}", hashed_password="-")
+            # created within the same second: the id breaks the created_at tie
+            ids = [(await crud.create_knowledge(db, f"分页 {i}", user_id=user.id)).id for i in range(5)]
+
+            first = await crud.list_knowledge(db, limit=3, user_id=user.id)
+            after = crud.decode_cursor(crud.encode_cursor(first[-1]))
+            second = await crud.list_knowledge(db, limit=3, user_id=user.id, after=after)
+
+            assert [item.id for item in first] == ids[::-1][:3]
+            assert [item.id for item in second] == ids[::-1][3:]
+
+    asyncio.run(_run())
@@ -0,0 +1,24 @@
+"""A bulk chunk popped from a fair queue but never acknowledged must come back."""
+import pytest
+
+from app.celery_task import queues
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def test_unacked_chunk_is_requeued():
+    client = fakeredis.FakeRedis()
+    queues.fair_push(client, queues.FAIR_IMPORT, 7, [[1, 2], [3]])
+
+    assert queues.fair_pop(client, queues.FAIR_IMPORT) == (7, [1, 2])
+    # the tick died before fair_ack: nothing is requeued until the timeout passes
+    assert queues.fair_requeue_stale(client, queues.FAIR_IMPORT, 3600) == 0
+    assert queues.fair_requeue_stale(client, queues.FAIR_IMPORT, -1) == 1
+
+    assert queues.fair_pop(client, queues.FAIR_IMPORT) == (7, [1, 2])
+    queues.fair_ack(client, queues.FAIR_IMPORT, 7, [1, 2])
+    assert queues.fair_pop(client, queues.FAIR_IMPORT) == (7, [3])
+    queues.fair_ack(client, queues.FAIR_IMPORT, 7, [3])
+
+    assert queues.fair_pop(client, queues.FAIR_IMPORT) is None
+    assert queues.fair_requeue_stale(client, queues.FAIR_IMPORT, -1) == 0
@@ -0,0 +1,38 @@
+"""A conditional GET of a missing item is a 404, not a 304 from the user's ETag."""
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI
+
+from app import crud, data_version
+from app.core.security import get_current_user
+from app.database import AsyncSessionLocal
+from app.routers import items
+
+app = FastAPI()
+app.include_router(items.router, prefix="/api")
+
+
+def test_if_none_match_on_missing_item_is_404(monkeypatch):
+    async def _version(user_id):
+        return 1
+
+    monkeypatch.setattr(data_version, "current", _version)
+
+    async def _run():
+        async with AsyncSessionLocal() as db:
+            user = await crud.create_user(db, username=f"u_{uuid.uuid4().hex[:12]}", hashed_password="-")
+            item = await crud.create_knowledge(db, "条件请求", user_id=user.id)
+        app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=user.id)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            missing = await client.get(f"/api/items/{item.id + 1000}", headers={"If-None-Match": "*"})
+            present = await client.get(f"/api/items/{item.id}", headers={"If-None-Match": "*"})
+        return missing.status_code, present.status_code
+
+    try:
+        assert asyncio.run(_run()) == (404, 304)
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,26 @@
+"""A cancelled LLM call must give its concurrency slot back."""
+import asyncio
+
+from app.utils.llm_scheduler import LLMScheduler
+
+
+def test_cancelled_call_releases_slot():
+    async def _run():
+        scheduler = LLMScheduler()
+        started = asyncio.Event()
+
+        async def _slow():
+            started.set()
+            await asyncio.sleep(60)
+
+        task = asyncio.create_task(scheduler.run(_slow))
+        await started.wait()
+        assert scheduler.limiter.in_flight == 1
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        assert scheduler.limiter.in_flight == 0
+
+    asyncio.run(_run())
@@ -0,0 +1,50 @@
+"""Items left in processing past PROCESSING_TIMEOUT go back to pending; live ones stay."""
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update
+
+from app import counters, crud, models
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+
+
+async def _processing_items(started_ago):
+    async with AsyncSessionLocal() as db:
+        user = await crud.create_user(db, username=f"u_{uuid.uuid4().hex[:12]}", hashed_password="-")
+        ids = []
+        for seconds in started_ago:
+            item = await crud.create_knowledge(db, "租约测试", user_id=user.id)
+            assert await crud.mark_processing(db, item.id, user_id=user.id)
+            started = datetime.now(timezone.utc) - timedelta(seconds=seconds)
+            await db.execute(
+                update(models.KnowledgeItem).where(models.KnowledgeItem.id == item.id).values(processing_started_at=started)
+            )
+            ids.append(item.id)
+        await db.commit()
+        return user.id, ids
+
+
+def test_reclaim_stale_processing():
+    async def _run():
+        user_id, (stale, live) = await _processing_items([settings.PROCESSING_TIMEOUT + 60, 10])
+        async with AsyncSessionLocal() as db:
+            reclaimed = await crud.reclaim_stale_processing(db)
+            assert reclaimed.get(user_id) == [stale]
+            assert (await crud.get_knowledge(db, stale)).status == "pending"
+            assert (await crud.get_knowledge(db, live)).status == "processing"
+            by_status = (await counters.get_counts(db, user_id))["by_status"]
+            assert by_status["pending"] == 1 and by_status["processing"] == 1
+
+    asyncio.run(_run())
+
+
+def test_reprocess_takes_only_stale_processing():
+    async def _run():
+        user_id, (stale, live) = await _processing_items([settings.PROCESSING_TIMEOUT + 60, 10])
+        async with AsyncSessionLocal() as db:
+            assert await crud.reset_for_reprocess(db, user_id, item_ids=[live]) == []
+            assert await crud.reset_for_reprocess(db, user_id, statuses=("processing",)) == [stale]
+
+    asyncio.run(_run())
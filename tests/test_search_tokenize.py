@@ -0,0 +1,24 @@
+"""Tokenization (and so jieba's first dictionary load) must not run on the event loop thread."""
+import asyncio
+import threading
+from collections import Counter
+
+from app import search
+
+
+def test_tokenize_runs_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def _tokenize(text):
+        threads.append(threading.get_ident())
+        return Counter(text.split())
+
+    monkeypatch.setattr(search, "tokenize", _tokenize)
+
+    async def _run():
+        counts = await search.tokenize_async("a b a")
+        return counts, threading.get_ident()
+
+    counts, loop_thread = asyncio.run(_run())
+    assert counts == Counter({"a": 2, "b": 1})
+    assert threads and threads[0] != loop_thread
@@ -0,0 +1,69 @@
+"""SQL round trips of crud.update_after_extraction must not grow with the number of tags."""
+import asyncio
+import uuid
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app import crud
+from app.database import AsyncSessionLocal, engine
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", _count)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", _count)
+
+
+async def _processing_item():
+    async with AsyncSessionLocal() as db:
+        user = await crud.create_user(db, username=f"u_{uuid.uuid4().hex[:12]}", hashed_password="-")
+        item = await crud.create_knowledge(db, "知识整理系统会自动生成标题、标签和摘要。", user_id=user.id)
+        assert await crud.mark_processing(db, item.id, user_id=user.id)
+        return item.id, user.id
+
+
+async def _extraction_statements(tags):
+    item_id, user_id = await _processing_item()
+    extracted = {"title": "标题", "description": "描述", "summary": "摘要", "tags": tags, "source": "llm"}
+    async with AsyncSessionLocal() as db:
+        with count_statements() as statements:
+            item = await crud.update_after_extraction(
+                db, item_id, extracted, from_statuses=["processing"], user_id=user_id
+            )
+    assert item is not None and item.status == "done"
+    assert sorted(t.name for t in item.tags) == sorted(set(tags))
+    return statements
+
+
+def _new_tags(n):
+    prefix = uuid.uuid4().hex[:8]
+    return [f"{prefix}-{i}" for i in range(n)]
+
+
+def test_statements_independent_of_tag_count():
+    one = asyncio.run(_extraction_statements(_new_tags(1)))
+    many = asyncio.run(_extraction_statements(_new_tags(30)))
+    assert len(many) == len(one), many
+
+
+def test_cached_tags_skip_tag_lookups():
+    tags = _new_tags(10)
+    cold = asyncio.run(_extraction_statements(tags))
+    warm = asyncio.run(_extraction_statements(tags))
+    # the second item resolves every tag from the per-process cache: no INSERT IGNORE / SELECT on tags
+    assert len(warm) == len(cold) - 2
+    assert not [s for s in warm if "INTO tags" in s or "FROM tags" in s]
+
+
+def test_statement_budget():
+    statements = asyncio.run(_extraction_statements(_new_tags(5)))
+    assert len(statements) <= 12, "\n".join(statements)